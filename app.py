@@ -1,21 +1,35 @@
-import os
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor
 
 import streamlit as st
 
-os.environ["OPENAI_API_KEY"] = st.secrets['API_KEY']
-client = OpenAI(
-    api_key=os.environ.get("OPENAI_API_KEY"),
-)
+import instrumentation
+from llm import get_client, stream_chat
+
+instrumentation.begin_rerun('app')
 
 st.title('홍보 포스터 만들기 😆')
 
 keyword = st.text_input('키워드를 입력하세요: ')
 
-if st.button('생성하기'):
-    with st.spinner('생성중입니다.'):
-        chat_completion = client.chat.completions.create(
-            messages=[
+generate = st.button('생성하기')
+regenerate = st.button('다시 생성하기')
+
+if generate or regenerate:
+    # 이미지 저장소(PIL)와 OpenAI 클라이언트는 생성할 때 처음 불러온다
+    import image_store
+
+    client = get_client()
+
+    # 이미지 생성은 문구 생성과 독립적이므로 동시에 진행한다 (이미 만든 이미지는 로컬 저장소에서 바로 사용)
+    with st.spinner('생성중입니다.'), ThreadPoolExecutor(max_workers=1) as pool:
+        image_future = pool.submit(
+            image_store.get_or_generate, client, f'{keyword}, 수채화 풍으로 그려줘', refresh=regenerate,
+        )
+
+        # 홍보 문구는 생성되는 대로 화면에 보여준다
+        result = stream_chat(
+            client,
+            [
                 {
                     "role": "user",
                     "content": keyword,
@@ -25,16 +39,11 @@ if st.button('생성하기'):
                     "content": "입력 받은 키워드에 대해서 150자 이내의 제품 홍보 문구를 작성해줘.",
                 }
             ],
-            model="gpt-4o",
+            "gpt-4o",
+            container=st,
+            refresh=regenerate,
         )
-        response = client.images.generate(
-            model="dall-e-3",
-            prompt=f'{keyword}, 수채화 풍으로 그려줘',
-            size="1024x1024",
-            quality="standard",
-            n=1,
-        )
-    result = chat_completion.choices[0].message.content
-    image_url = response.data[0].url
-    st.write(result)
-    st.image(image_url)
+        image_path = image_future.result()
+    st.image(image_path)
+
+instrumentation.end_rerun()
@@ -1,92 +1,118 @@
 import streamlit as st
-from pytube import Playlist, YouTube
-import csv
-import os
-from openai import OpenAI
-import pandas as pd
-from collections import defaultdict
-from PIL import Image
-
-os.environ["OPENAI_API_KEY"] = st.secrets['API_KEY']
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-
-CSV_FILENAME = 'videos1.csv'
-
-def is_duplicate(video_id, csv_filename):
-    try:
-        with open(csv_filename, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['video_id'] == video_id:
-                    return True
-    except FileNotFoundError:
-        return False
-    return False
-
-def get_videos_by_user(user_id, csv_filename):
-    videos = []
-    try:
-        with open(csv_filename, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['user_id'] == user_id:
-                    row['categories'] = row['category'].split(',')
-                    videos.append(row)
-    except FileNotFoundError:
-        pass
-    return videos
+from datetime import datetime, timedelta
+
+import category_index
+import day_planner
+import incremental_plan
+import ingest_jobs
+import instrumentation
+import llm_scheduler
+import schedule_store
+import similar_index
+import thumbnail_cache
+import video_store
+from categorizer import Categorizer
+from day_planner import format_time
+from local_categorizer import LocalCategorizer
+from llm import get_client, stream_chat
+
+instrumentation.begin_rerun('app_f')
+
+# 동영상 카탈로그 DB 준비 (기존 videos1.csv 가 있으면 최초 한 번 가져옴)
+video_store.init_db()
+ingest_jobs.init_db()
+schedule_store.init_db()
+incremental_plan.init_db()
+thumbnail_cache.init_db()
+
+def is_duplicate(video_id):
+    return video_id in video_store.existing_video_ids([video_id])
+
+# 사용자 동영상 목록 + 카테고리 색인 (동영상이 추가될 때만 다시 만들고, 그 사이에는 모든 세션이 함께 쓴다)
+def get_catalog(user_id):
+    return category_index.get_catalog(user_id)
+
+# 로컬 분류기는 프로세스당 한 번만 만든다
+@st.cache_resource
+def get_local_categorizer():
+    return LocalCategorizer(video_store.get_labelled_rows())
+
+# 카테고리 분류기 (카테고리 목록은 한 번만 읽고, 분류 결과는 제목별로 캐시됨)
+# 키워드로 확실히 분류되는 제목은 LLM 을 부르지 않는다
+# 동영상을 저장할 때 처음 만들고, 이후에는 프로세스 안에서 함께 쓴다
+@st.cache_resource
+def get_categorizer():
+    # 동영상 분류는 화면 요청보다 뒤에 보낸다
+    return Categorizer(get_client(llm_scheduler.INGEST), local=get_local_categorizer())
 
 def categorize_video(title):
-    categories_df = pd.read_csv('home_training_categories.csv', header=None, names=['카테고리1', '카테고리2', '카테고리3'])
-    categories_df['카테고리'] = categories_df.apply(lambda x: ','.join(x.dropna()), axis=1)
-    category_list = categories_df['카테고리'].tolist()
-
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {
-                "role": "user",
-                "content": title
-            },
-            {
-                "role": "system",
-                "content":  f"다음 유저가 입력한 동영상의 제목과 설명을 기반으로 가장 적절한 카테고리를 선택하세요 부위가 있으면 부위와 가장 유사한 값을 찾으세요 응답값은 카테고리를 ,으로 구분해서만 응답하세요 응답형식 '카테고리1, 카테고리2..' :\n제목: {title}🔥\n설명: \n카테고리 후보: {category_list} "
-            }
-        ],
-        model="gpt-4",
-    )
-    return chat_completion.choices[0].message.content.strip()
-
-def load_videos(csv_filename, user_id):
-    try:
-        videos = pd.read_csv(csv_filename)
-        videos = videos[videos['user_id'] == user_id]
-        videos['categories'] = videos['category'].apply(lambda x: x.split(','))
-        return videos
-    except FileNotFoundError:
-        return pd.DataFrame()
-    
-# 시간을 'NN분 NN초' 형식으로 변환하는 함수
-def format_time(seconds):
-    seconds = int(seconds)  # 초 값을 정수로 변환
-    minutes = seconds // 60
-    seconds = seconds % 60
-    return f"{minutes}분 {seconds}초"
-
-def AL_video(output_string):
-    chat_completion = client.chat.completions.create(
-        messages=[
+    return get_categorizer().categorize(title)
+
+# 새로 저장된 동영상: 썸네일을 미리 받아둔다 (화면 목록은 카탈로그가 바뀌면 다시 만들어짐)
+def on_videos_saved(new_videos):
+    # 썸네일은 저장할 때 한 번만 받아서 로컬에 둔다
+    thumbnail_cache.prefetch([video_data['video_id'] for video_data in new_videos])
+
+# 재생목록 가져오기는 프로세스의 백그라운드 워커가 처리한다 (이미 떠 있으면 그대로 씀)
+def start_ingest_worker():
+    return ingest_jobs.start_worker(get_categorizer(), on_saved=on_videos_saved)
+
+INGEST_STATUS = {
+    ingest_jobs.QUEUED: '대기 중',
+    ingest_jobs.RUNNING: '가져오는 중',
+    ingest_jobs.DONE: '완료',
+    ingest_jobs.FAILED: '실패',
+    ingest_jobs.CANCELLED: '취소됨',
+}
+
+def show_ingest_jobs(jobs):
+    for job in jobs:
+        total = job['total']
+        text = (f"#{job['id']} {INGEST_STATUS[job['status']]} | {job['processed']}/{total or '?'} "
+                f"(새로 저장 {job['saved']}, 이미 있음 {job['skipped']}, 실패 {job['failed']}) | {job['playlist_url']}")
+        left, right = st.columns([5, 1])
+        with left:
+            st.progress(job['processed'] / total if total else 0.0, text=text)
+            if job['error']:
+                st.caption(f"오류: {job['error']}")
+        with right:
+            if job['status'] in ingest_jobs.ACTIVE:
+                if st.button('취소', key=f"ingest_cancel_{job['id']}"):
+                    ingest_jobs.cancel_job(job['id'])
+                    st.rerun()
+            elif job['status'] in (ingest_jobs.FAILED, ingest_jobs.CANCELLED) or job['failed']:
+                if st.button('다시 시도', key=f"ingest_retry_{job['id']}"):
+                    ingest_jobs.retry_job(job['id'])
+                    start_ingest_worker()
+                    st.rerun()
+
+# 진행 중인 작업이 있을 때만 이 부분만 POLL_SECONDS 마다 다시 그린다
+# 모두 끝나면 페이지 전체를 다시 실행해서 새 동영상이 목록에 나오게 한다
+@st.experimental_fragment(run_every=ingest_jobs.POLL_SECONDS)
+def poll_ingest_jobs(user_id):
+    jobs = ingest_jobs.get_jobs(user_id)
+    show_ingest_jobs(jobs)
+    if not any(job['status'] in ingest_jobs.ACTIVE for job in jobs):
+        st.rerun()
+
+# 분석 결과를 container 에 스트리밍으로 보여주고 최종 텍스트를 돌려준다 (refresh=True 면 캐시 무시)
+def AL_video(output_string, container=None, refresh=False):
+    return stream_chat(
+        get_client(),
+        [
             {
                 "role": "user",
                 "content": output_string
             },
             {
                 "role": "system",
-                "content":  f"다음 유저가 입력한 조건에 맞춰 추천된 유튜브 홈트레이닝 영상목록이다 영상은 day별로 나열되어있으며 'Day1 '동영상제목 (시간) - 카테고리', ...' 형식이다 입력된 영상 정보를 보고 day별로 영상 종합 설명을 해주고 조언을 해줘라"
+                "content":  f"다음 유저가 입력한 조건에 맞춰 추천된 유튜브 홈트레이닝 영상목록이다 영상은 day별로 나열되어있으며 'Day1 '동영상제목 (시간) - 카테고리', ...' 형식이다 입력된 영상 정보를 보고 day별로 영상 종합 설명을 해주고 조언을 해줘라 각 day 의 설명은 'Day N' 으로 시작하는 줄로 시작해라"
             }
         ],
-        model="gpt-4",
+        "gpt-4",
+        container=container,
+        refresh=refresh,
     )
-    return chat_completion.choices[0].message.content
 
 def main():
     st.title('유튜브 동영상 관리 및 운동 계획 생성기')
@@ -94,33 +120,52 @@ def main():
     user_id = st.text_input('사용자 ID를 입력하세요')
 
     if user_id:
-        if 'videos' not in st.session_state:
-            st.session_state.videos = get_videos_by_user(user_id, CSV_FILENAME)
+        catalog = get_catalog(user_id)
 
-        if st.session_state.videos:
+        if catalog.videos:
             st.subheader(f'{user_id}의 동영상 리스트')
 
-            all_categories = sorted({category for video in st.session_state.videos for category in video['categories']})
+            all_categories = catalog.categories
             selected_categories = st.multiselect('카테고리를 선택하세요', all_categories, default=all_categories)
 
-            filtered_videos = [video for video in st.session_state.videos if any(category in selected_categories for category in video['categories'])]
+            # 선택한 카테고리 비트셋의 합집합으로 바로 고른다
+            filtered_videos = catalog.select(selected_categories)
+            thumbnails = thumbnail_cache.thumbnail_paths([video['video_id'] for video in filtered_videos])
 
             for i, video in enumerate(filtered_videos):
                 if i % 3 == 0:
                     cols = st.columns(3)
 
                 video_id = video['video_id']
-                thumbnail_url = f"https://img.youtube.com/vi/{video_id}/0.jpg"
+                thumbnail_path = thumbnails[video_id]
                 video_title = video['title']
                 video_url = video['url']
                 video_category = video['category']
                 video_length = format_time(video['length'])
 
                 with cols[i % 3]:
-                    st.image(thumbnail_url, use_column_width=True)
+                    st.image(thumbnail_path, use_column_width=True)
                     st.caption(f"[{video_title}]({video_url})")
                     st.write(f"{video_length} | {video_category}")
 
+            # 제목 n-gram 벡터의 근사 최근접 이웃 (색인은 처음 고를 때 한 번 만들고, 새 동영상만 더한다)
+            titles = {video['video_id']: video['title'] for video in catalog.videos}
+            similar_video_id = st.selectbox('비슷한 동영상 / 나오는 운동 찾기', list(titles), index=None,
+                                            format_func=titles.get, placeholder='동영상을 고르세요')
+            if similar_video_id:
+                with st.spinner('색인을 준비하는 중...'):
+                    index = similar_index.get_index()
+                left, right = st.columns(2)
+                with left:
+                    st.caption('비슷한 동영상')
+                    for video, score in index.similar_videos(similar_video_id, user_id=user_id):
+                        st.write(f"[{video['title']}]({video['url']}) | {format_time(video['length'])} | {score:.2f}")
+                with right:
+                    st.caption('이 동영상에 나오는 운동 (exercises.csv)')
+                    for label, score in index.exercises_for_video(similar_video_id):
+                        exercise = index.exercises.loc[label]
+                        st.write(f"{exercise['Title']} | {exercise['BodyPart']} | {exercise['Equipment']} | {score:.2f}")
+
 
         else:
             st.warning('동영상이 없어요. 추가하세요!')
@@ -134,98 +179,58 @@ def main():
             if playlist_url == '':
                 st.error('재생목록 URL을 입력해주세요.')
             else:
-                try:
-                    playlist = Playlist(playlist_url)
-
-                    if not os.path.exists(CSV_FILENAME):
-                        with open(CSV_FILENAME, 'w', newline='', encoding='utf-8') as f:
-                            writer = csv.DictWriter(f, fieldnames=['user_id', 'video_id', 'title', 'url', 'length', 'author', 'channel_url', 'views', 'category'])
-                            writer.writeheader()
-
-                    new_videos_count = 0
-
-                    with open(CSV_FILENAME, 'a', newline='', encoding='utf-8') as f:
-                        writer = csv.DictWriter(f, fieldnames=['user_id', 'video_id', 'title', 'url', 'length', 'author', 'channel_url', 'views', 'category'])
-
-                        for video in playlist.videos:
-                            if not is_duplicate(video.video_id, CSV_FILENAME):
-                                categorized_video = categorize_video(video.title)
-                                video_data = {
-                                    'user_id': user_id,
-                                    'video_id': video.video_id,
-                                    'title': video.title,
-                                    'url': video.watch_url,
-                                    'length': video.length,
-                                    'author': video.author,
-                                    'channel_url': video.channel_url,
-                                    'views': video.views,
-                                    'category': categorized_video.replace("'", "")
-                                }
-                                writer.writerow(video_data)
-                                video_data['categories'] = categorized_video.split(',')
-                                st.session_state.videos.append(video_data)
-                                new_videos_count += 1
-
-                    if new_videos_count > 0:
-                        st.success(f'{new_videos_count}개의 새로운 동영상 정보를 저장했습니다.')
-                    else:
-                        st.warning('새로 저장된 동영상이 없습니다.')
-                    st.experimental_rerun()
-                except Exception as e:
-                    st.error(f'오류 발생: {str(e)}')
+                # 작업만 등록하고 돌아온다 (탭을 닫아도 워커가 계속 처리하고, 여러 재생목록을 이어서 등록할 수 있음)
+                job_id = ingest_jobs.submit(user_id, playlist_url)
+                start_ingest_worker()
+                st.success(f'재생목록을 작업 #{job_id} 로 등록했습니다. 가져오는 동안 다른 작업을 계속하세요.')
+
+        # 이전 프로세스가 끝내지 못한 작업은 페이지를 열 때 이어서 처리한다
+        if ingest_jobs.has_unfinished():
+            start_ingest_worker()
+        ingest_job_list = ingest_jobs.get_jobs(user_id)
+        if any(job['status'] in ingest_jobs.ACTIVE for job in ingest_job_list):
+            poll_ingest_jobs(user_id)
+        else:
+            show_ingest_jobs(ingest_job_list)
 
         st.write('---')
         st.subheader('운동 계획 생성')
 
-        videos = load_videos(CSV_FILENAME, user_id)
+        catalog = get_catalog(user_id)
 
-        if videos.empty:
+        if not catalog.videos:
             st.warning('해당 사용자 ID의 동영상이 없습니다.')
             return
 
-        all_categories = sorted({category for categories in videos['categories'] for category in categories})
+        all_categories = catalog.categories
         user_categories = st.multiselect('카테고리를 선택하세요', all_categories)
         daily_duration = st.number_input('하루 운동 시간 (분)', min_value=1, value=30)
         num_days = st.number_input('운동 기간 (일)', min_value=1, value=7)
+        no_repeat_days = st.number_input('같은 동영상을 다시 넣지 않을 기간 (일)', min_value=0,
+                                         value=day_planner.NO_REPEAT_DAYS)
+        start_date = st.date_input('시작 날짜', datetime.today())
+        refresh_analysis = st.checkbox('AI 분석 새로 받기')
 
         if st.button('운동 계획 생성'):
             if not user_categories:
                 st.error('적어도 하나의 카테고리를 선택해주세요.')
             else:
-                filtered_videos = videos[videos['categories'].apply(lambda x: any(category in user_categories for category in x))]
+                filtered_videos = catalog.select(user_categories)
 
-                if filtered_videos.empty:
+                if not filtered_videos:
                     st.warning('선택한 카테고리의 동영상이 없습니다.')
                 else:
                     daily_duration_seconds = daily_duration * 60
-                    min_daily_duration = daily_duration_seconds - 600
-                    max_daily_duration = daily_duration_seconds + 600
-
-                    total_time_seconds = daily_duration_seconds * num_days
 
-                    all_videos = []
-                    video_index = 0
-                    num_videos = len(filtered_videos)
-                    day_outputs = []
+                    # 날마다 목표 시간 ±10분 안에서 카테고리를 돌려가며 고른 계획 (DayPlan 목록)
+                    day_plans = day_planner.plan_days(filtered_videos, num_days, daily_duration_seconds,
+                                                      no_repeat_days=no_repeat_days)
+                    day_outputs = day_planner.format_day_outputs(day_plans)
+                    total_time_seconds = sum(plan.total_seconds for plan in day_plans)
 
-                    for day in range(1, num_days + 1):
-                        selected_videos = []
-                        accumulated_time = 0
-
-                        while accumulated_time < min_daily_duration or (accumulated_time < max_daily_duration and accumulated_time + filtered_videos.iloc[video_index]['length'] <= max_daily_duration):
-                            video = filtered_videos.iloc[video_index]
-                            selected_videos.append(video)
-                            accumulated_time += video['length']
-                            video_index = (video_index + 1) % num_videos
-
-                        all_videos.append((day, selected_videos))
-
-                        
-                        day_output = (
-                            f"Day {day}\n" + 
-                            "\n".join([f"{video['title']} ({video['length'] // 60}분) - {video['category']}" for video in selected_videos])
-                        )
-                        day_outputs.append(day_output)
+                    # 달력에서 볼 수 있도록 날짜별로 저장
+                    schedule_store.save_plan(user_id, schedule_store.VIDEO_PLAN,
+                                             day_planner.schedule_entries(day_plans, start_date))
 
                     st.success(f'총 {total_time_seconds // 60}분의 운동 계획이 생성되었습니다.')
                     # for day, videos in all_videos:
@@ -239,35 +244,44 @@ def main():
                     # CSS 스타일 정의
                     # CSS 스타일 정의
                     # 동영상 리스트 출력
-                    for day, videos in all_videos:
-                        st.subheader(f'Day {day}')
-                        for i, video in enumerate(videos):
+                    thumbnails = thumbnail_cache.thumbnail_paths(
+                        [video['video_id'] for plan in day_plans for video in plan.videos])
+                    for plan in day_plans:
+                        st.subheader(f'Day {plan.day}')
+                        st.caption(f"{format_time(plan.total_seconds)} | {', '.join(plan.categories)}")
+                        for i, video in enumerate(plan.videos):
                             if i % 3 == 0:
                                 cols = st.columns(3)
 
                             video_id = video['video_id']
-                            thumbnail_url = f"https://img.youtube.com/vi/{video_id}/0.jpg"
+                            thumbnail_path = thumbnails[video_id]
                             video_title = video['title']
                             video_url = video['url']
                             # video_category = video['category']
                             video_length = format_time(video['length'])
 
                             with cols[i % 3]:
-                                st.image(thumbnail_url, use_column_width=True)
+                                st.image(thumbnail_path, use_column_width=True)
                                 st.caption(f"[{video_title}]({video_url})")
                                 st.write(f"{video_length}")
 
-                    output_string = ",".join(day_outputs)
-
-                    # AI 아이콘 이미지 불러오기
-                    ai_icon = Image.open('img.png')  # 'ai_icon.png'는 AI 아이콘 이미지 파일의 경로입니다.
+                    # 날짜별 분석을 저장해 두고, 동영상 목록이 바뀐 날만 AL_video 에 보낸다
+                    day_summaries = [
+                        ((start_date + timedelta(days=plan.day - 1)).isoformat(), plan.day, output)
+                        for plan, output in zip(day_plans, day_outputs)
+                    ]
 
                     # AI 아이콘 출력
-                    st.image(ai_icon, width=100)
+                    st.image('img.png', width=100)  # 'ai_icon.png'는 AI 아이콘 이미지 파일의 경로입니다.
+                    ai_placeholder = st.empty()
                     with st.spinner('나는 당신의 운동비서 플랜을 분석 중이니 잠시만 기다려 주세요'):
-                      abc = AL_video(output_string)
+                      abc, _ = incremental_plan.analyze_video_plan(
+                          user_id, day_summaries,
+                          lambda outputs: AL_video(",".join(outputs), container=ai_placeholder, refresh=refresh_analysis),
+                          refresh_all=refresh_analysis,
+                      )
                     
-                    st.markdown("""
+                    ai_placeholder.markdown("""
                     <div style="border: 2px solid pink; padding: 10px; border-radius: 10px;">
                         <p>안녕하세요, AI 비서입니다.</p>
                         <p>아래는 제가 분석한 홈트 일정입니다:</p>
@@ -277,5 +291,6 @@ def main():
 
 if __name__ == '__main__':
     main()
+    instrumentation.end_rerun()
 
                            
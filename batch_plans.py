@@ -0,0 +1,258 @@
+import argparse
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, timedelta
+
+import day_planner
+import exercise_catalog
+import llm_scheduler
+import plan_prompt
+import schedule_store
+import user_store
+import video_store
+from db import connect, transaction
+from llm import FakeOpenAI, get_client
+
+# 전체 사용자의 운동 계획을 Streamlit 없이 한꺼번에 다시 만드는 CLI (주간 갱신용)
+# 사용법: python batch_plans.py --start 2024-06-03 --days 7
+#        python batch_plans.py --fake-llm 0.2   (가짜 LLM 으로 시험 실행, 응답 캐시는 쓰지 않음)
+#  - 사용자를 CHUNK_SIZE 명씩 묶어 프로세스 풀에 나눠 주고 (동영상 계획은 CPU, AI 계획은 LLM 대기)
+#  - 결과는 메인 프로세스 하나가 묶음 순서대로 schedule.db 에 쓴다 (SQLite 쓰기 잠금 경쟁 없음)
+#  - 쓴 사용자는 batch_progress 에 run_id 별로 기록해서, 중단 후 같은 run_id 로 다시 실행하면 남은 사용자만 만든다
+CHUNK_SIZE = 16
+# 아직 쓰지 못한 묶음이 워커 수 × 이 값을 넘으면 새 묶음을 보내지 않는다 (순서 대기 중인 결과의 메모리 상한)
+MAX_AHEAD = 4
+
+_PROMPT_DAYS_RE = re.compile(r'^Days: Day 1 to Day (\d+)', re.MULTILINE)
+_PROMPT_CATALOG_RE = re.compile(r'^(\d+) \| ([^|]+?) \|', re.MULTILINE)
+
+# --fake-llm 일 때의 스케줄러 한도: 스케줄러 경로는 그대로 거치되 실제로는 막지 않는다
+FAKE_LIMITS = {'requests_per_minute': 10 ** 9, 'tokens_per_minute': 10 ** 12, 'max_in_flight': 10 ** 6}
+
+# 워커 프로세스 상태 (_init_worker 에서 한 번 설정)
+_options = None
+_client = None
+
+
+def init_db(db_file=schedule_store.DB_FILE):
+    schedule_store.init_db(db_file)
+    connect(db_file).execute(
+        "CREATE TABLE IF NOT EXISTS batch_progress ("
+        "run_id TEXT NOT NULL, user_id TEXT NOT NULL, finished REAL NOT NULL, "
+        "PRIMARY KEY (run_id, user_id)) WITHOUT ROWID"
+    )
+
+
+def finished_users(run_id, db_file=schedule_store.DB_FILE):
+    return {row[0] for row in connect(db_file).execute(
+        "SELECT user_id FROM batch_progress WHERE run_id = ?", (run_id,))}
+
+
+def clear_progress(run_id, db_file=schedule_store.DB_FILE):
+    connect(db_file).execute("DELETE FROM batch_progress WHERE run_id = ?", (run_id,))
+
+
+# 가짜 LLM 응답: 프롬프트의 날 수와 후보 운동으로 'Day N: ...' 계획을 만든다 (7일째마다 휴식)
+def fake_plan_reply(messages):
+    prompt = messages[-1]['content']
+    match = _PROMPT_DAYS_RE.search(prompt)
+    if not match:
+        return 'Rest'
+    exercises = _PROMPT_CATALOG_RE.findall(prompt) or [('0', 'Push-up')]
+    lines = []
+    for i in range(int(match.group(1))):
+        if i % 7 == 6:
+            lines.append(f'Day {i + 1}: Rest')
+            continue
+        picked = [exercises[(i * 3 + j) % len(exercises)] for j in range(3)]
+        lines.append(f'Day {i + 1}: ' + '; '.join(f'[{exercise_id}] {title} 3 x 12' for exercise_id, title in picked))
+    return '\n'.join(lines)
+
+
+# 워커마다 스케줄러가 따로 있으므로 분당 한도를 워커 수로 나눠 쓴다 (가짜 LLM 은 OpenAI 한도와 상관없다)
+def _init_worker(options):
+    global _options, _client
+    _options = options
+    if options['fake_llm'] is not None:
+        scheduler = llm_scheduler.configure(**FAKE_LIMITS)
+        _client = llm_scheduler.ScheduledClient(
+            FakeOpenAI(reply=fake_plan_reply, latency=options['fake_llm']), scheduler, llm_scheduler.BATCH)
+    else:
+        llm_scheduler.configure(
+            requests_per_minute=llm_scheduler.REQUESTS_PER_MINUTE / options['workers'],
+            tokens_per_minute=llm_scheduler.TOKENS_PER_MINUTE / options['workers'],
+            max_in_flight=max(1, llm_scheduler.MAX_IN_FLIGHT // options['workers']),
+        )
+        _client = get_client(llm_scheduler.BATCH)
+
+
+# 이름은 계획 내용과 상관없으므로 넣지 않는다 (프롬프트에서는 나이도 묶이므로 같은 조건의 회원끼리 응답 캐시를 나눠 쓴다)
+def _preferences(profile, experience_level):
+    age = str(profile.get('age') or '')
+    return {
+        'age': int(age) if age.isdigit() else 0,
+        'experience_level': experience_level,
+        'target_body_part': [],
+        'equipment_available': [],
+    }
+
+
+# 한 사용자의 계획: [(출처, 항목 목록), ...]
+# 동영상이 있으면 동영상 계획, 회원이면 AI 운동 계획 (사이드바 대신 프로필과 기본 선호도 사용)
+def plan_user(user_id, profile, options):
+    start = date.fromisoformat(options['start'])
+    plans = []
+    videos = video_store.get_videos_by_user(user_id, options['videos_db'])
+    if videos:
+        day_plans = day_planner.plan_days(videos, options['days'], options['daily_minutes'] * 60,
+                                          no_repeat_days=options['no_repeat_days'])
+        plans.append((schedule_store.VIDEO_PLAN, day_planner.schedule_entries(day_plans, start)))
+    if profile is not None and options['pt_plans']:
+        dates = plan_prompt.plan_dates(start, options['days'])
+        plan = plan_prompt.generate_plan(
+            _client, exercise_catalog.load_exercises(),
+            _preferences(profile, options['experience_level']), dates,
+            cache=options['fake_llm'] is None,
+        )
+        items = plan_prompt.parse_plan(plan, dates)
+        # 빈 응답 / 거절 / 형식이 다른 응답을 성공으로 기록하면 이어서 실행할 때 다시 만들지 않는다
+        if not items:
+            raise ValueError('AI plan reply has no plan lines')
+        plans.append((schedule_store.PT_PLAN, items))
+    return plans
+
+
+# 워커에서 실행: 묶음 하나 → (묶음 번호, [(user_id, 계획 목록, 오류 메시지 또는 None), ...])
+# 한 사용자의 실패는 기록만 하고 나머지 사용자는 계속 만든다
+def plan_chunk(index, users):
+    results = []
+    for user_id, profile in users:
+        try:
+            results.append((user_id, plan_user(user_id, profile, _options), None))
+        except Exception as e:
+            results.append((user_id, [], f'{type(e).__name__}: {e}'))
+    return index, results
+
+
+# 메인 프로세스의 유일한 쓰기 경로: 계획 저장 후 진행 기록 (그 사이에 멈추면 그 묶음만 다시 만든다)
+def _write_chunk(run_id, results, db_file):
+    succeeded = [(user_id, plans) for user_id, plans, error in results if error is None]
+    entries = schedule_store.save_plans(
+        [(user_id, source, items) for user_id, plans in succeeded for source, items in plans], db_file)
+    conn = connect(db_file)
+    with transaction(conn):
+        conn.executemany(
+            "INSERT OR REPLACE INTO batch_progress (run_id, user_id, finished) VALUES (?, ?, ?)",
+            [(run_id, user_id, time.time()) for user_id, _ in succeeded],
+        )
+    return entries
+
+
+# users: [(user_id, 프로필 또는 None), ...] → {'users', 'skipped', 'written', 'entries', 'failed', 'seconds'}
+def run(run_id, users, options, workers=None, chunk_size=CHUNK_SIZE, db_file=schedule_store.DB_FILE, log=print):
+    init_db(db_file)
+    workers = workers or os.cpu_count() or 1
+    done = finished_users(run_id, db_file)
+    todo = [user for user in users if user[0] not in done]
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    summary = {'users': len(users), 'skipped': len(users) - len(todo), 'written': 0, 'entries': 0,
+               'failed': [], 'seconds': 0.0}
+    log(f'{run_id}: 사용자 {len(users)}명 중 {len(todo)}명 생성 ({summary["skipped"]}명은 이미 완료), '
+        f'워커 {workers}개, 묶음 {len(chunks)}개')
+
+    start = time.perf_counter()
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_worker, initargs=(dict(options, workers=workers),))
+    try:
+        in_flight = set()
+        finished = {}
+        next_submit = next_write = 0
+        while next_write < len(chunks):
+            while next_submit < len(chunks) and next_submit - next_write < workers * MAX_AHEAD:
+                in_flight.add(pool.submit(plan_chunk, next_submit, chunks[next_submit]))
+                next_submit += 1
+            completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                index, results = future.result()
+                finished[index] = results
+            # 앞 묶음이 끝날 때까지 뒤 묶음은 기다렸다가 순서대로 쓴다
+            while next_write in finished:
+                results = finished.pop(next_write)
+                summary['entries'] += _write_chunk(run_id, results, db_file)
+                summary['written'] += sum(1 for _, _, error in results if error is None)
+                summary['failed'].extend((user_id, error) for user_id, _, error in results if error is not None)
+                next_write += 1
+                elapsed = time.perf_counter() - start
+                log(f'  {summary["written"] + len(summary["failed"])}/{len(todo)}명 '
+                    f'({(summary["written"] + len(summary["failed"])) / elapsed:.1f}명/초)')
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        log(f'중단됨: 같은 run_id 로 다시 실행하면 이어서 만든다 (--run-id {run_id})')
+        raise
+    finally:
+        pool.shutdown()
+    summary['seconds'] = time.perf_counter() - start
+
+    for user_id, error in summary['failed']:
+        log(f'  실패 {user_id}: {error}')
+    log(f'완료: {summary["written"]}명, 항목 {summary["entries"]}개, 실패 {len(summary["failed"])}명, '
+        f'{summary["seconds"]:.1f}초')
+    return summary
+
+
+# 회원(users.db) + 동영상을 저장한 사용자(videos.db) 전체, user_id 순서
+def load_users(users_db=user_store.DB_FILE, videos_db=video_store.DB_FILE, only=None):
+    user_store.init_db(users_db)
+    video_store.init_db(videos_db)
+    profiles = user_store.get_profiles(users_db)
+    user_ids = sorted(set(profiles) | set(video_store.get_user_ids(videos_db)))
+    if only:
+        only = set(only)
+        user_ids = [user_id for user_id in user_ids if user_id in only]
+    return [(user_id, profiles.get(user_id)) for user_id in user_ids]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='전체 사용자 운동 계획 일괄 생성')
+    parser.add_argument('--start', type=date.fromisoformat, default=date.today() + timedelta(days=1),
+                        help='계획 시작 날짜 (기본: 내일)')
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--daily-minutes', type=int, default=30, help='동영상 계획의 하루 운동 시간 (분)')
+    parser.add_argument('--no-repeat-days', type=int, default=day_planner.NO_REPEAT_DAYS)
+    parser.add_argument('--experience-level', default='Beginner', choices=list(plan_prompt.LEVELS))
+    parser.add_argument('--no-pt-plans', action='store_true', help='AI 운동 계획은 만들지 않는다 (동영상 계획만)')
+    parser.add_argument('--workers', type=int, default=None, help='워커 프로세스 수 (기본: CPU 수)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--run-id', default=None, help='이어서 실행할 때 쓰는 이름 (기본: 시작 날짜와 기간)')
+    parser.add_argument('--restart', action='store_true', help='이 run_id 의 진행 기록을 지우고 처음부터')
+    parser.add_argument('--users', nargs='*', default=None, help='이 사용자들만')
+    parser.add_argument('--fake-llm', type=float, default=None, metavar='LATENCY',
+                        help='OpenAI 대신 이 지연 시간(초)의 가짜 응답을 쓴다')
+    args = parser.parse_args()
+
+    run_id = args.run_id or f'{args.start.isoformat()}+{args.days}d'
+    options = {
+        'start': args.start.isoformat(),
+        'days': args.days,
+        'daily_minutes': args.daily_minutes,
+        'no_repeat_days': args.no_repeat_days,
+        'experience_level': args.experience_level,
+        'pt_plans': not args.no_pt_plans,
+        'videos_db': video_store.DB_FILE,
+        'fake_llm': args.fake_llm,
+    }
+    init_db()
+    if args.restart:
+        clear_progress(run_id)
+    try:
+        summary = run(run_id, load_users(only=args.users), options, args.workers, args.chunk_size)
+    except KeyboardInterrupt:
+        raise SystemExit(130)
+    if summary['failed']:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
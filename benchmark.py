@@ -0,0 +1,302 @@
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+import category_index
+import day_planner
+import exercise_catalog
+import plan_prompt
+import similar_index
+import user_store
+import video_store
+from categorizer import Categorizer, FakeCategorizeClient, load_taxonomy
+from ingest import ingest_videos
+from playlist_fetcher import FakePlaylist
+
+# 합성 데이터와 가짜 OpenAI/pytube 로 주요 경로의 실행 시간을 재는 벤치마크
+# 사용법: python benchmark.py --sizes 1000 10000 100000 --out bench_baseline.json
+#        python benchmark.py --compare bench_baseline.json   (기준보다 느려지면 종료 코드 1)
+#        python benchmark.py --sizes --pages   (main.py 에 등록된 페이지의 첫 실행 / 재실행 시간만)
+DEFAULT_SIZES = [1000, 10000, 100000]
+TOLERANCE = 0.25
+# 이보다 작은 차이는 측정 잡음으로 보고 무시
+MIN_DELTA_MS = 1.0
+VIDEOS_PER_USER = 20
+# 비슷한 동영상 색인 생성은 행 수에 비례해 오래 걸리므로 이 크기까지만 잰다
+SIMILAR_MAX_ROWS = 10000
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# main.py 에 등록된 페이지와, 페이지가 읽는 원본 데이터 파일
+PAGES = ['main.py', 'register.py', 'cal.py', 'app_f.py', 'calendar1.py']
+PAGE_DATA_FILES = ['exercises.csv', 'home_training_categories.csv', 'img.png']
+PAGE_ROWS = 1000
+
+# 페이지는 이 모듈(pandas 등을 import 함)과 섞이지 않도록 깨끗한 프로세스에서 AppTest 로 실행한다
+# 첫 실행(페이지의 모듈 import 포함)과 이후 재실행 시간을 잰다
+PAGE_WORKER = '''
+import json, statistics, sys, time
+from streamlit.testing.v1 import AppTest
+
+page, repeat = sys.argv[1], int(sys.argv[2])
+at = AppTest.from_file(page, default_timeout=120)
+at.secrets['API_KEY'] = 'bench'
+start = time.perf_counter()
+at.run()
+cold = (time.perf_counter() - start) * 1000
+if at.exception:
+    sys.exit(f'{page}: {at.exception[0].message}')
+if page.endswith('app_f.py'):
+    # 동영상 목록과 계획 입력까지 그려지도록 사용자 ID 를 넣어둔다
+    at.text_input[0].input('user0').run()
+samples = []
+for _ in range(repeat):
+    start = time.perf_counter()
+    at.run()
+    samples.append((time.perf_counter() - start) * 1000)
+print(json.dumps({
+    'cold': {'median_ms': round(cold, 4), 'min_ms': round(cold, 4)},
+    'rerun': {'median_ms': round(statistics.median(samples), 4), 'min_ms': round(min(samples), 4)},
+}))
+'''
+
+TITLE_WORDS = ['전신', '복근', '하체', '스트레칭', '유산소', '덤벨', '스쿼트', '요가', '필라테스', 'HIIT',
+               '홈트', '다이어트', '초보', '10분', '20분', 'Full Body', 'ABS', 'Workout']
+
+
+# ---- 합성 데이터 ----
+
+def write_users_csv(path, n, rng):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(user_store.FIELDS)
+        for i in range(n):
+            writer.writerow([f'user{i}', f'pw{i}', f'이름{i}', rng.randint(15, 70),
+                             rng.choice(['Male', 'Female']), rng.randint(150, 190), rng.randint(45, 100)])
+
+
+def write_videos_csv(path, n, rng):
+    taxonomy = load_taxonomy()
+    users = max(1, n // VIDEOS_PER_USER)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(video_store.FIELDS)
+        for i in range(n):
+            video_id = f'v{i:010d}'
+            writer.writerow([
+                f'user{i % users}', video_id, ' | '.join(rng.sample(TITLE_WORDS, 4)) + f' #{i}',
+                f'https://youtube.com/watch?v={video_id}', rng.randint(180, 1800), '홈트 채널',
+                'https://www.youtube.com/channel/fake', rng.randint(100, 100000),
+                ', '.join(rng.sample(taxonomy, rng.randint(1, 2))),
+            ])
+
+
+# 실제 exercises.csv 의 행을 섞어서 n 행으로 늘린다
+def write_exercises_csv(path, n, rng, source=exercise_catalog.CSV_FILE):
+    with open(source, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for i in range(n):
+            row = list(rng.choice(rows))
+            row[0] = i
+            row[1] = f'{row[1]} {i}'
+            writer.writerow(row)
+
+
+# ---- 측정 ----
+
+def timeit(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': round(statistics.median(samples), 4), 'min_ms': round(min(samples), 4)}
+
+
+def run_size(n, workdir, fetch_latency, llm_latency, repeat):
+    rng = random.Random(n)
+    users_csv = os.path.join(workdir, 'users.csv')
+    videos_csv = os.path.join(workdir, 'videos1.csv')
+    exercises_csv = os.path.join(workdir, 'exercises.csv')
+    users_db = os.path.join(workdir, 'users.db')
+    videos_db = os.path.join(workdir, 'videos.db')
+    write_users_csv(users_csv, n, rng)
+    write_videos_csv(videos_csv, n, rng)
+    write_exercises_csv(exercises_csv, n, rng)
+
+    results = {}
+    user_ids = [f'user{rng.randrange(n)}' for _ in range(200)]
+    video_users = max(1, n // VIDEOS_PER_USER)
+
+    # register.py: 가져오기, 로그인, 프로필 저장 (200회 기준)
+    results['register.import_users_csv'] = timeit(
+        lambda: user_store.init_db(users_db, users_csv), repeat=1)
+    results['register.login_x200'] = timeit(
+        lambda: [user_store.check_login(u, f'pw{u[4:]}', db_file=users_db) for u in user_ids], repeat)
+    results['register.save_profile_x200'] = timeit(
+        lambda: [user_store.update_user(u, db_file=users_db, age='31', weight='70') for u in user_ids], repeat)
+
+    # app_f.py: 카탈로그 조회, 중복 확인, 저장, 일별 계획
+    results['app_f.import_videos_csv'] = timeit(
+        lambda: video_store.init_db(videos_db, videos_csv), repeat=1)
+    results['app_f.get_videos_by_user'] = timeit(
+        lambda: video_store.get_videos_by_user(f'user{rng.randrange(video_users)}', db_file=videos_db), repeat)
+    results['app_f.load_videos'] = timeit(
+        lambda: video_store.load_videos(f'user{rng.randrange(video_users)}', db_file=videos_db), repeat)
+
+    # 카테고리 선택: 색인은 카탈로그가 바뀔 때만 만들고, 선택은 비트셋 합집합
+    category_index._catalogs.clear()
+    results['app_f.category_catalog_build'] = timeit(
+        lambda: category_index.VideoCatalog(video_store.get_videos_by_user('user0', db_file=videos_db)), repeat)
+    catalog = category_index.get_catalog('user0', db_file=videos_db)
+    selected = catalog.categories[::2]
+    results['app_f.category_select'] = timeit(lambda: category_index.get_catalog('user0', db_file=videos_db).select(selected), repeat)
+
+    playlist_ids = [f'v{rng.randrange(n):010d}' for _ in range(100)] + [f'new{i}' for i in range(100)]
+    results['app_f.duplicate_check_200'] = timeit(
+        lambda: video_store.existing_video_ids(playlist_ids, db_file=videos_db), repeat)
+
+    categorizer = Categorizer(FakeCategorizeClient(latency=llm_latency),
+                              cache_db_file=os.path.join(workdir, 'categories.db'))
+    counter = iter(range(10 ** 9))
+
+    def ingest():
+        # 매번 새 video_id 로 저장 경로 전체를 탄다
+        playlist = FakePlaylist(size=50, latency=fetch_latency, id_prefix=f'bench{next(counter)}_')
+        ingest_videos('bench_user', playlist.videos, categorizer, db_file=videos_db)
+    results['app_f.ingest_playlist_50'] = timeit(ingest, repeat=max(1, repeat // 2))
+
+    # 운동 계획: app_f 와 같이 카테고리 선택 결과(dict 목록)로 만든다
+    videos = catalog.select(selected)
+    results['app_f.day_plan_30d'] = timeit(lambda: day_planner.plan_days(videos, 30, 30 * 60), repeat)
+    results['app_f.day_plan_365d'] = timeit(lambda: day_planner.plan_days(videos, 365, 30 * 60), max(1, repeat // 2))
+
+    # cal.py: 데이터 로드 (처음 파싱 / Parquet 캐시 / 프로세스 캐시), 프롬프트 구성
+    exercises_cache = os.path.join(workdir, 'exercises.parquet')
+
+    def load_cold():
+        exercise_catalog._loaded.clear()
+        if os.path.exists(exercises_cache):
+            os.remove(exercises_cache)
+        exercise_catalog.load_exercises(exercises_csv, exercises_cache)
+
+    def load_parquet():
+        exercise_catalog._loaded.clear()
+        exercise_catalog.load_exercises(exercises_csv, exercises_cache)
+
+    results['cal.load_dataset_cold'] = timeit(load_cold, repeat=max(1, repeat // 2))
+    results['cal.load_dataset_parquet'] = timeit(load_parquet, repeat)
+    results['cal.load_dataset_rerun'] = timeit(lambda: exercise_catalog.load_exercises(exercises_csv, exercises_cache), repeat)
+
+    df = exercise_catalog.load_exercises(exercises_csv, exercises_cache)
+    preferences = {'name': 'bench', 'age': 30, 'experience_level': 'Beginner',
+                   'target_body_part': ['Abdominals', 'Chest'], 'equipment_available': ['Bands', 'Dumbbell']}
+    dates = [date(2024, 1, d).isoformat() for d in range(1, 31)]
+    results['cal.prompt_build'] = timeit(lambda: plan_prompt.build_messages(
+        preferences, dates, plan_prompt.pack_candidates(plan_prompt.retrieve_candidates(df, preferences))), repeat)
+
+    # app_f.py 비슷한 동영상: 색인 생성(프로세스당 한 번), 새 동영상 추가, 질의
+    if n <= SIMILAR_MAX_ROWS:
+        videos = video_store.get_videos_since(0, videos_db)
+        results['app_f.similar_index_build'] = timeit(
+            lambda: similar_index.SimilarIndex(videos[:-50], df), repeat=1)
+        index = similar_index.SimilarIndex(videos[:-50], df)
+        results['app_f.similar_index_add_50'] = timeit(lambda: index.add_videos(videos[-50:]), repeat=1)
+        video_ids = [video['video_id'] for video in rng.sample(videos, min(100, len(videos)))]
+        results['app_f.similar_videos_x100'] = timeit(
+            lambda: [index.similar_videos(video_id) for video_id in video_ids], repeat)
+        results['app_f.exercises_for_video_x100'] = timeit(
+            lambda: [index.exercises_for_video(video_id) for video_id in video_ids], repeat)
+    return results
+
+
+def run_pages(workdir, repeat):
+    rng = random.Random(0)
+    for name in PAGE_DATA_FILES:
+        shutil.copy(os.path.join(REPO_DIR, name), workdir)
+    write_users_csv(os.path.join(workdir, 'users.csv'), PAGE_ROWS, rng)
+    write_videos_csv(os.path.join(workdir, 'videos1.csv'), PAGE_ROWS, rng)
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+    results = {}
+    for page in PAGES:
+        # 첫 프로세스는 DB / Parquet 같은 파일 캐시를 만들고, 두 번째 프로세스(서버 재시작)를 잰다
+        for _ in range(2):
+            output = subprocess.run(
+                [sys.executable, '-c', PAGE_WORKER, os.path.join(REPO_DIR, page), str(repeat)],
+                cwd=workdir, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+        for case, result in json.loads(output.splitlines()[-1]).items():
+            results[f'{page}.{case}'] = result
+    return results
+
+
+def compare(baseline, current, tolerance=TOLERANCE):
+    regressions = []
+    for size, cases in current.items():
+        for case, result in cases.items():
+            before = baseline.get(size, {}).get(case)
+            if (before and result['median_ms'] > before['median_ms'] * (1 + tolerance)
+                    and result['median_ms'] - before['median_ms'] > MIN_DELTA_MS):
+                regressions.append((size, case, before['median_ms'], result['median_ms']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AI100 FitnessApp 벤치마크')
+    parser.add_argument('--sizes', type=int, nargs='*', default=DEFAULT_SIZES, help='행 수 (users/videos/exercises)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--fetch-latency', type=float, default=0.002, help='가짜 pytube 속성 요청 지연 (초)')
+    parser.add_argument('--llm-latency', type=float, default=0.05, help='가짜 OpenAI 요청 지연 (초)')
+    parser.add_argument('--out', default=None, help='결과를 저장할 JSON 파일')
+    parser.add_argument('--compare', default=None, help='비교할 기준 JSON 파일')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--pages', action='store_true', help='페이지 첫 실행 / 재실행 시간도 잰다 (AppTest)')
+    args = parser.parse_args()
+
+    current = {}
+    for n in args.sizes:
+        workdir = tempfile.mkdtemp(prefix=f'fitness_bench_{n}_')
+        try:
+            current[str(n)] = run_size(n, workdir, args.fetch_latency, args.llm_latency, args.repeat)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        for case, result in current[str(n)].items():
+            print(f'{n:>8}  {case:32s} {result["median_ms"]:10.3f} ms')
+
+    if args.pages:
+        workdir = tempfile.mkdtemp(prefix='fitness_bench_pages_')
+        try:
+            current['pages'] = run_pages(workdir, args.repeat)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        for case, result in current['pages'].items():
+            print(f'{"pages":>8}  {case:32s} {result["median_ms"]:10.3f} ms')
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(json.load(f), current, args.tolerance)
+        for size, case, before, after in regressions:
+            print(f'REGRESSION {size:>8} {case}: {before:.3f} ms -> {after:.3f} ms')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,57 +1,56 @@
 import streamlit as st
-from openai import OpenAI
-import pandas as pd
-from datetime import datetime, timedelta
-import os
-# Load and preprocess the dataset
-df = pd.read_csv('exercises.csv')
-df.fillna('', inplace=True)
-df['Rating'] = df['Rating'].apply(lambda x: float(x) if x != '' else 0.0)
+import uuid
+from datetime import datetime
 
-# Using Secrets API to get API key from environment variables
-os.environ["OPENAI_API_KEY"] = st.secrets['API_KEY']
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+import exercise_catalog
+import incremental_plan
+import instrumentation
+import local_planner
+import plan_prompt
+import schedule_store
+from llm import get_client
 
+instrumentation.begin_rerun('cal')
 
+# Sidebar options come from a small cached JSON file; the dataset itself (pandas) is
+# loaded on first use, parsed once per process and shared across reruns
+facet_values = exercise_catalog.get_facet_values()
+
+# Plans are also saved per date so the calendar page can show them
+schedule_store.init_db()
+# Plans are kept as one unit per date, so only the days whose inputs changed are rebuilt
+incremental_plan.init_db()
 
-def generate_workout_plan(user_preferences, duration, start_date):
-    try:
-        messages = [
-            {"role": "system", "content": "You are a fitness coach."},
-            {"role": "user", "content": f"Create a {duration} workout plan starting from {start_date.strftime('%Y-%m-%d')} for a user with the following preferences: {user_preferences}. The plan should include different exercises from the dataset provided and be well-balanced."}
-        ]
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-        )
+# Sidebar planner choices
+LOCAL = "Local"
+LOCAL_POLISH = "Local + AI polish"
+AI = "AI (GPT-4o)"
 
-        return response.choices[0].message.content.strip()
+
+# LOCAL builds the plan from exercises.csv in milliseconds (same preferences and seed -> same plan).
+# LOCAL_POLISH also sends the days whose local draft changed (or are in `force`) to GPT-4o in one request,
+# streamed into `container`; if that fails the local draft is kept. AI lets GPT-4o write the days whose
+# exercises or preferences changed.
+# Returns ({date: DayUnit}, dates that were rebuilt, polish error or None), or None on error.
+def generate_workout_plan(user_id, user_preferences, dates, seed, planner, container=None, force=(), instruction=None):
+    try:
+        exercises = exercise_catalog.load_exercises()
+        if planner == AI:
+            units, generated = incremental_plan.generate_pt_plan(get_client(), exercises, user_id, user_preferences,
+                                                                 dates, container=container, force=force,
+                                                                 instruction=instruction)
+            return units, generated, None
+        return incremental_plan.generate_local_pt_plan(exercises, user_id, user_preferences, dates, seed=seed,
+                                                       polish_client=get_client() if planner == LOCAL_POLISH else None,
+                                                       container=container, force=force, instruction=instruction)
     except Exception as e:
         st.error(f"An error occurred: {e}")
         return None
 
 # Function to calculate dates based on selected duration
 def calculate_dates(duration, start_date):
-    dates = []
-    if duration == "1 Week":
-        for i in range(7):  # 7 days for 1 week
-            day = start_date + timedelta(days=i)
-            dates.append(day.strftime('%Y-%m-%d'))
-    elif duration == "2 Weeks":
-        for i in range(14):  # 14 days for 2 weeks
-            day = start_date + timedelta(days=i)
-            dates.append(day.strftime('%Y-%m-%d'))
-    elif duration == "3 Weeks":
-        for i in range(21):  # 21 days for 3 weeks
-            day = start_date + timedelta(days=i)
-            dates.append(day.strftime('%Y-%m-%d'))
-    elif duration == "1 Month":
-        # Calculate dates for 1 month (approximately 30 days)
-        for i in range(30):
-            day = start_date + timedelta(days=i)
-            dates.append(day.strftime('%Y-%m-%d'))
-    return dates
+    return plan_prompt.plan_dates(start_date, plan_prompt.DURATION_DAYS.get(duration, 0))
 
 # Streamlit app
 st.title("AI-Fitness Planner")
@@ -60,37 +59,117 @@ st.sidebar.title("User Preferences")
 name = st.sidebar.text_input("Name")
 age = st.sidebar.number_input("Age", min_value=0, max_value=100)
 experience_level = st.sidebar.selectbox("Experience Level", options=["Beginner", "Intermediate", "Advanced"])
-target_body_part = st.sidebar.multiselect("Target Body Parts", options=df['BodyPart'].unique())
-equipment_available = st.sidebar.multiselect("Equipment Available", options=df['Equipment'].unique())
-duration = st.sidebar.selectbox("Plan Duration", options=["1 Week", "2 Weeks", "3 Weeks", "1 Month"])
+target_body_part = st.sidebar.multiselect("Target Body Parts", options=facet_values['BodyPart'])
+equipment_available = st.sidebar.multiselect("Equipment Available", options=facet_values['Equipment'])
+duration = st.sidebar.selectbox("Plan Duration", options=list(plan_prompt.DURATION_DAYS))
 
 start_date = st.sidebar.date_input("Starting Date", datetime.today())
+seed = st.sidebar.number_input("Plan Seed", min_value=0, value=0, help="The same preferences and seed always give the same plan")
+planner = st.sidebar.radio("Planner", options=[LOCAL, LOCAL_POLISH, AI],
+                           help="Local plans need no AI; 'AI polish' lets GPT-4o refine them; 'AI' lets GPT-4o write the plan")
 
-if st.sidebar.button("Generate Plan"):
-    with st.spinner('Generating plan...'):
-        user_preferences = {
+generate = st.sidebar.button("Generate Plan", help="Only days affected by changed preferences are regenerated")
+regenerate = st.sidebar.button("Regenerate Plan", help="Ignore the saved plan and generate a new one")
+
+# Calendar entries go to the logged-in user, or the name entered here
+plan_user = st.session_state.get('logged_in_user') or name
+
+if generate or regenerate:
+    # The plan stays on the page (and can be edited day by day) until the next Generate
+    st.session_state['pt_plan'] = {
+        # Saved day units are keyed by user; without a name they belong to this browser session
+        'user_id': plan_user or st.session_state.setdefault('plan_guest_id', f'guest-{uuid.uuid4().hex[:12]}'),
+        'duration': duration,
+        'start_date': start_date,
+        'dates': calculate_dates(duration, start_date),
+        'seed': int(seed),
+        'planner': planner,
+        'preferences': {
             "name": name,
             "age": age,
             "experience_level": experience_level,
             "target_body_part": target_body_part,
             "equipment_available": equipment_available
-        }
-
-        plan = generate_workout_plan(user_preferences, duration, start_date)
-        if plan:
-            st.subheader(f"Workout Plan for {duration}")
-            st.write(plan)
-            
-            st.write("Starting Date: ", start_date.strftime('%Y-%m-%d'))
-            dates = calculate_dates(duration, start_date)
-            # st.write("Dates for the Plan:")
-            # st.write(dates)
-
-            # Add Save button to save plan to a file
-            file_name = f"{name}_workout_plan.txt"  # Example file name
-            plan_bytes = plan.encode('utf-8')
-            st.download_button(label="Click here to download", data=plan_bytes, file_name=file_name, mime="text/plain")
-
-            # st.write("Check the calendar page for an interactive calendar display.")
-            # st.markdown(f"[View in Calendar](http://localhost:8501/calendar)")
+        },
+    }
+
+current_plan = st.session_state.get('pt_plan')
+if current_plan:
+    dates = current_plan['dates']
+    st.subheader(f"Workout Plan for {current_plan['duration']}")
+    plan_area = st.empty()
+    plan_info = st.empty()
+
+    with st.expander("Change one day"):
+        edit_date = st.selectbox("Day", dates)
+        edit_request = st.text_input("What should change?", placeholder="e.g. lighter, no jumping, rest day")
+        apply_edit = st.button("Update this day", disabled=current_plan['planner'] == LOCAL,
+                               help="Choose an AI planner and generate again to change a day with a request")
+
+    result = None
+    if generate or regenerate:
+        with st.spinner('Generating plan...'):
+            result = generate_workout_plan(current_plan['user_id'], current_plan['preferences'], dates,
+                                           current_plan['seed'], current_plan['planner'],
+                                           container=plan_area.container(), force=dates if regenerate else ())
+    elif apply_edit:
+        with st.spinner(f'Updating {edit_date}...'):
+            result = generate_workout_plan(current_plan['user_id'], current_plan['preferences'], dates,
+                                           current_plan['seed'], current_plan['planner'],
+                                           container=plan_area.container(), force=[edit_date],
+                                           instruction=edit_request or None)
+
+    if result is not None:
+        units, generated, polish_error = result
+        plan_info.caption(f"Built {len(generated)} day(s), reused {len(dates) - len(generated)} saved day(s)")
+        if polish_error:
+            st.warning(f"AI polish is unavailable ({polish_error}); showing the local plan. "
+                       "Click Generate Plan again to polish only the days that were not polished.")
+        # Save the plan per date for the calendar
+        if generated and plan_user:
+            schedule_store.save_plan(plan_user, schedule_store.PT_PLAN,
+                                     plan_prompt.parse_plan(incremental_plan.format_plan(units), dates))
+    else:
+        units = incremental_plan.load_pt_plan(current_plan['user_id'], dates)
+
+    plan = incremental_plan.format_plan(units)
+    plan_area.markdown(plan.replace('\n', '  \n'))
+    # Local plans never relax body parts and equipment, so say when they leave too few exercises
+    if current_plan['planner'] != AI:
+        for note in local_planner.pool_notes(exercise_catalog.load_exercises(), current_plan['preferences']):
+            st.warning(note)
+    missing = len(dates) - len(units)
+    if missing:
+        st.warning(f"{missing} day(s) could not be generated. Click Generate Plan again to fill only those days.")
+    if plan:
+        st.write("Starting Date: ", current_plan['start_date'].strftime('%Y-%m-%d'))
+        # st.write("Dates for the Plan:")
+        # st.write(dates)
+
+        # Add Save button to save plan to a file
+        file_name = f"{name}_workout_plan.txt"  # Example file name
+        plan_bytes = plan.encode('utf-8')
+        st.download_button(label="Click here to download", data=plan_bytes, file_name=file_name, mime="text/plain")
+
+        # st.write("Check the calendar page for an interactive calendar display.")
+        # st.markdown(f"[View in Calendar](http://localhost:8501/calendar)")
+
+# Exercise search over Title/Desc, narrowed by the body part and equipment chosen in the sidebar
+st.write('---')
+st.subheader("Exercise Search")
+query = st.text_input("Search exercises", placeholder="e.g. plank")
+if query:
+    # The search index (numpy) is only needed once something is searched
+    import exercise_search
+
+    df = exercise_catalog.load_exercises()
+    results = exercise_search.load_index().search(
+        query, {'BodyPart': target_body_part, 'Equipment': equipment_available}
+    )
+    if results:
+        st.dataframe(df.loc[[i for i, _ in results], ['Title', 'BodyPart', 'Equipment', 'Level', 'Rating']],
+                     hide_index=True)
+    else:
+        st.info("No matching exercises.")
 
+instrumentation.end_rerun()
@@ -1,6 +1,14 @@
 import streamlit as st
-import calendar
-from datetime import datetime, timedelta
+from datetime import datetime
+
+import instrumentation
+import schedule_store
+from calendar_view import render_calendar
+
+instrumentation.begin_rerun('calendar1')
+
+# 저장된 운동 계획 (PT Plan, Video List & Plan 페이지에서 생성)
+schedule_store.init_db()
 
 # 현재 날짜 가져오기
 now = datetime.now()
@@ -11,11 +19,6 @@ if 'current_month' not in st.session_state:
 if 'view_mode' not in st.session_state:
     st.session_state.view_mode = 'Monthly'
 
-current_year = st.session_state.current_year
-current_month = st.session_state.current_month
-view_mode = st.session_state.view_mode
-today = now.day
-
 # 이전/다음 달 버튼
 def prev_month(year, month):
     if month == 1:
@@ -29,72 +32,49 @@ def next_month(year, month):
     else:
         return year, month + 1
 
-prev_year, prev_month = prev_month(current_year, current_month)
-next_year, next_month = next_month(current_year, current_month)
-
-col1, col2, col3, col4 = st.columns([0.1, 0.1, 1, 0.1])
-with col1:
-    if st.button("◀", key='prev_button'):
-        st.session_state.current_year, st.session_state.current_month = prev_year, prev_month
-        st.experimental_rerun()
-with col2:
-    if st.button("▶", key='next_button'):
-        st.session_state.current_year, st.session_state.current_month = next_year, next_month
-        st.experimental_rerun()
-with col3:
-    m_col, w_col = st.columns([1, 1])
-    with m_col:
-        if st.button("Monthly", key='monthly'):
-            st.session_state.view_mode = 'Monthly'
-            st.experimental_rerun()
-    with w_col:
-        if st.button("Weekly", key='weekly'):
-            st.session_state.view_mode = 'Weekly'
-            st.experimental_rerun()
-
-# 월간 달력 표시
-def create_monthly_calendar(year, month, today):
-    cal = calendar.Calendar()
-    month_days = cal.monthdayscalendar(year, month)
-
-    days_in_week = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
-    
-    # 요일 헤더 표시
-    cols = st.columns(7)
-    for i, day in enumerate(days_in_week):
-        cols[i].markdown(f"<div style='text-align: center; color: white; background-color: lightpink;'>{day}</div>", unsafe_allow_html=True)
-
-    # 달력 표시
-    for week in month_days:
-        cols = st.columns(7)
-        for i, day in enumerate(week):
-            if day == 0:
-                cols[i].markdown(f"<div style='height: 50px; border: 1px solid lightgrey;'></div>", unsafe_allow_html=True)
-            elif day == today and year == now.year and month == now.month:
-                cols[i].markdown(f"<div style='height: 50px; text-align: center; background-color: lightblue; border: 1px solid lightgrey;'>{day}</div>", unsafe_allow_html=True)
-            else:
-                cols[i].markdown(f"<div style='height: 50px; text-align: center; background-color: #f0f8ff; border: 1px solid lightgrey;'>{day}</div>", unsafe_allow_html=True)
-
-# 주간 플래너 표시
-def create_weekly_planner(year, month):
-    cal = calendar.Calendar()
-    month_days = cal.monthdayscalendar(year, month)
-    days_in_week = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
-
-    st.write(f"### {year}년 {month}월")
-    for week_number, week in enumerate(month_days, 1):
-        week_dates = [f"{month}/{day}" if day != 0 else "" for day in week]
-        week_start = next((date for date in week_dates if date), "")
-        week_end = next((date for date in reversed(week_dates) if date), "")
-        week_range = f"{week_start} - {week_end}" if week_start and week_end else ""
-
-        st.markdown(f"#### <div style='text-align: center;'>{week_number}주차 ({week_range})</div>", unsafe_allow_html=True)
-        cols = st.columns(7)
-        for i, day in enumerate(week_dates):
-            cols[i].markdown(f"<div style='text-align: center; border: 1px solid lightgrey; padding: 10px;'>{days_in_week[i]}<br>{day}</div>", unsafe_allow_html=True)
-
-st.header(f"{current_year}년 {current_month}월")
-if st.session_state.view_mode == 'Monthly':
-    create_monthly_calendar(current_year, current_month, today)
-else:
-    create_weekly_planner(current_year, current_month)
\ No newline at end of file
+# 버튼 콜백: 상태만 바꾸고, 다시 그리는 것은 아래 fragment 가 한 번에 처리한다
+def go_prev():
+    st.session_state.current_year, st.session_state.current_month = prev_month(
+        st.session_state.current_year, st.session_state.current_month)
+
+def go_next():
+    st.session_state.current_year, st.session_state.current_month = next_month(
+        st.session_state.current_year, st.session_state.current_month)
+
+def set_view_mode(view_mode):
+    st.session_state.view_mode = view_mode
+
+# 로그인한 사용자의 계획을 보여주고, 로그인하지 않았으면 ID 를 직접 입력받는다
+user_id = st.session_state.get('logged_in_user') or st.text_input('사용자 ID')
+
+# 달력 영역만 다시 실행되도록 fragment 로 감싼다 (페이지 전체를 다시 실행하지 않음)
+@st.experimental_fragment
+def show_calendar():
+    col1, col2, col3, col4 = st.columns([0.1, 0.1, 1, 0.1])
+    with col1:
+        st.button("◀", key='prev_button', on_click=go_prev)
+    with col2:
+        st.button("▶", key='next_button', on_click=go_next)
+    with col3:
+        m_col, w_col = st.columns([1, 1])
+        with m_col:
+            st.button("Monthly", key='monthly', on_click=set_view_mode, args=('Monthly',))
+        with w_col:
+            st.button("Weekly", key='weekly', on_click=set_view_mode, args=('Weekly',))
+
+    current_year = st.session_state.current_year
+    current_month = st.session_state.current_month
+
+    st.header(f"{current_year}년 {current_month}월")
+    # 한 달치 계획은 (user_id, date) 범위 조회 한 번으로 가져온다
+    annotations = schedule_store.get_month_annotations(user_id, current_year, current_month) if user_id else {}
+
+    # 월간/주간 달력 전체를 HTML 하나로 그린다 (같은 달은 캐시된 HTML 재사용)
+    st.markdown(
+        render_calendar(current_year, current_month, st.session_state.view_mode, now.date(), annotations),
+        unsafe_allow_html=True,
+    )
+
+show_calendar()
+
+instrumentation.end_rerun()
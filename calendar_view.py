@@ -0,0 +1,79 @@
+import calendar
+import html
+from functools import lru_cache
+
+# 월간/주간 달력을 HTML 한 덩어리로 만드는 렌더러
+# (요일 칸마다 st.columns / st.markdown 을 부르지 않고 st.markdown 한 번으로 그린다)
+DAYS_IN_WEEK = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']
+
+_STYLE = """
+<style>
+.fit-cal {width: 100%; border-collapse: collapse; table-layout: fixed;}
+.fit-cal th {text-align: center; color: white; background-color: lightpink; font-weight: normal;}
+.fit-cal td {height: 50px; border: 1px solid lightgrey; vertical-align: top; text-align: center; background-color: #f0f8ff;}
+.fit-cal td.empty {background-color: transparent;}
+.fit-cal td.today {background-color: lightblue;}
+.fit-cal .note {font-size: 0.7em; text-align: left; margin-top: 2px; padding: 1px 3px;
+                border-radius: 3px; background-color: #ffe4ec; overflow: hidden; white-space: nowrap; text-overflow: ellipsis;}
+.fit-week-title {text-align: center; font-weight: bold; margin: 12px 0 4px;}
+.fit-week td {height: auto; padding: 10px;}
+</style>
+"""
+
+
+def _weeks(year, month):
+    # 일요일 시작 (요일 헤더와 맞춤)
+    return calendar.Calendar(firstweekday=6).monthdayscalendar(year, month)
+
+
+def _notes(annotations, year, month, day):
+    notes = annotations.get(f'{year:04d}-{month:02d}-{day:02d}', ())
+    return ''.join(f"<div class='note' title='{html.escape(note)}'>{html.escape(note)}</div>" for note in notes)
+
+
+def _day_cell(year, month, day, today, annotations, label=None):
+    if day == 0:
+        return "<td class='empty'></td>"
+    is_today = (year, month, day) == (today.year, today.month, today.day)
+    css = " class='today'" if is_today else ''
+    return f"<td{css}>{label or day}{_notes(annotations, year, month, day)}</td>"
+
+
+@lru_cache(maxsize=256)
+def _month_html(year, month, today, annotations_key):
+    annotations = dict(annotations_key)
+    header = ''.join(f'<th>{day}</th>' for day in DAYS_IN_WEEK)
+    rows = ''.join(
+        '<tr>' + ''.join(_day_cell(year, month, day, today, annotations) for day in week) + '</tr>'
+        for week in _weeks(year, month)
+    )
+    return f"{_STYLE}<table class='fit-cal'><tr>{header}</tr>{rows}</table>"
+
+
+@lru_cache(maxsize=256)
+def _week_html(year, month, today, annotations_key):
+    annotations = dict(annotations_key)
+    parts = [_STYLE, f"<h3>{year}년 {month}월</h3>"]
+    for week_number, week in enumerate(_weeks(year, month), 1):
+        week_dates = [f"{month}/{day}" if day != 0 else "" for day in week]
+        week_start = next((date for date in week_dates if date), "")
+        week_end = next((date for date in reversed(week_dates) if date), "")
+        week_range = f"{week_start} - {week_end}" if week_start and week_end else ""
+
+        cells = ''.join(
+            _day_cell(year, month, day, today, annotations, label=f"{DAYS_IN_WEEK[i]}<br>{week_dates[i]}")
+            for i, day in enumerate(week)
+        )
+        parts.append(f"<div class='fit-week-title'>{week_number}주차 ({week_range})</div>"
+                     f"<table class='fit-cal fit-week'><tr>{cells}</tr></table>")
+    return ''.join(parts)
+
+
+def _annotations_key(annotations):
+    return tuple(sorted((date, tuple(notes)) for date, notes in (annotations or {}).items()))
+
+
+# annotations: {'YYYY-MM-DD': ['운동 이름', ...]} — 날짜 칸 안에 함께 표시된다
+def render_calendar(year, month, view_mode, today, annotations=None):
+    render = _month_html if view_mode == 'Monthly' else _week_html
+    return render(year, month, today, _annotations_key(annotations))
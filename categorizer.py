@@ -0,0 +1,170 @@
+import csv
+import json
+import re
+import time
+from functools import lru_cache
+from types import SimpleNamespace
+
+from db import connect, transaction
+from llm import record_llm_call
+
+# 동영상 제목 → 카테고리 분류 서비스
+TAXONOMY_FILE = 'home_training_categories.csv'
+CACHE_DB_FILE = 'categories.db'
+MODEL = 'gpt-4o'
+BATCH_SIZE = 20
+
+SYSTEM_PROMPT = (
+    "다음은 유튜브 홈트레이닝 동영상 제목 목록이다. 각 제목에 가장 적절한 카테고리를 후보 중에서 골라라. "
+    "부위가 있으면 부위와 가장 유사한 값을 찾아라. 카테고리는 후보 문자열 그대로 사용한다. "
+    'JSON 으로만 응답하라: {{"results": [{{"id": 0, "categories": ["후보1", "후보2"]}}, ...]}}\n'
+    "카테고리 후보: {candidates}"
+)
+
+
+# 카테고리 목록은 프로세스당 한 번만 읽는다 ('대카테고리,소카테고리[,세부]' 문자열 목록)
+@lru_cache(maxsize=None)
+def load_taxonomy(taxonomy_file=TAXONOMY_FILE):
+    with open(taxonomy_file, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return tuple(','.join(cell.strip() for cell in row if cell.strip()) for row in reader if row)
+
+
+def normalize_title(title):
+    return re.sub(r'\s+', ' ', title).strip()
+
+
+# 카테고리 목록을 videos 테이블의 category 문자열 형식으로 변환
+def format_categories(categories):
+    return ', '.join(categories)
+
+
+class Categorizer:
+    # local: 로컬 분류기 (predict(title) -> (카테고리 목록, 신뢰도), threshold 속성), 없으면 LLM 만 사용
+    def __init__(self, client, cache_db_file=CACHE_DB_FILE, taxonomy_file=TAXONOMY_FILE,
+                 model=MODEL, batch_size=BATCH_SIZE, local=None):
+        self.client = client
+        self.local = local
+        self.cache_db_file = cache_db_file
+        self.taxonomy = load_taxonomy(taxonomy_file)
+        self.model = model
+        self.batch_size = batch_size
+        self.stats = {'cache_hits': 0, 'local_hits': 0, 'llm_titles': 0, 'llm_calls': 0}
+
+        connect(cache_db_file).execute(
+            "CREATE TABLE IF NOT EXISTS title_categories (title TEXT PRIMARY KEY, categories TEXT NOT NULL)"
+        )
+
+    def categorize(self, title):
+        return self.categorize_many([title])[normalize_title(title)]
+
+    # 제목 목록 → {정규화된 제목: 카테고리 문자열}
+    # 캐시 → 로컬 분류기 순서로 확인하고, 남은 제목만 묶어서 LLM 에 보냄
+    def categorize_many(self, titles):
+        keys = list(dict.fromkeys(normalize_title(title) for title in titles))
+        results = self._cache_get(keys)
+        self.stats['cache_hits'] += len(results)
+
+        misses = [key for key in keys if key not in results]
+        if self.local is not None and misses:
+            confident = {}
+            for key in misses:
+                categories, confidence = self.local.predict(key)
+                if categories and confidence >= self.local.threshold:
+                    confident[key] = format_categories(categories)
+            if confident:
+                self.stats['local_hits'] += len(confident)
+                self._cache_put(confident)
+                results.update(confident)
+                misses = [key for key in misses if key not in confident]
+
+        for i in range(0, len(misses), self.batch_size):
+            batch = misses[i:i + self.batch_size]
+            labelled = self._request_batch(batch)
+            # 응답이 깨졌거나 빠진 제목 (빈 카테고리) 은 캐시에 넣지 않아 다음 호출에서 다시 분류한다
+            self._cache_put({title: categories for title, categories in labelled.items() if categories})
+            results.update(labelled)
+        return results
+
+    # 예전에 저장된 빈 카테고리는 캐시에 없는 것으로 본다
+    def _cache_get(self, keys):
+        conn = connect(self.cache_db_file)
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for row in conn.execute(
+                f"SELECT title, categories FROM title_categories WHERE title IN ({placeholders}) AND categories != ''",
+                chunk
+            ):
+                found[row['title']] = row['categories']
+        return found
+
+    def _cache_put(self, labelled):
+        conn = connect(self.cache_db_file)
+        with transaction(conn):
+            conn.executemany(
+                "INSERT OR REPLACE INTO title_categories (title, categories) VALUES (?, ?)",
+                list(labelled.items()),
+            )
+
+    def _request_batch(self, titles):
+        self.stats['llm_calls'] += 1
+        self.stats['llm_titles'] += len(titles)
+        start = time.perf_counter()
+        chat_completion = self.client.chat.completions.create(
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT.format(candidates=list(self.taxonomy))},
+                {"role": "user", "content": json.dumps(
+                    [{"id": i, "title": title} for i, title in enumerate(titles)], ensure_ascii=False
+                )},
+            ],
+            model=self.model,
+            response_format={"type": "json_object"},
+        )
+        usage = getattr(chat_completion, 'usage', None)
+        record_llm_call(self.model, 'categorize', time.perf_counter() - start,
+                        prompt_tokens=usage and usage.prompt_tokens, completion_tokens=usage and usage.completion_tokens)
+        return self._parse_response(titles, chat_completion.choices[0].message.content)
+
+    # 후보에 없는 카테고리는 버리고, 응답이 빠진 제목은 빈 문자열로 둔다 (캐시하지 않는다)
+    def _parse_response(self, titles, content):
+        known = set(self.taxonomy)
+        try:
+            results = json.loads(content).get('results', [])
+        except (ValueError, AttributeError):
+            results = []
+
+        labelled = {title: '' for title in titles}
+        for item in results:
+            try:
+                title = titles[int(item['id'])]
+            except (KeyError, IndexError, TypeError, ValueError):
+                continue
+            categories = [c.strip() for c in item.get('categories', []) if c.strip() in known]
+            labelled[title] = format_categories(categories)
+        return labelled
+
+
+# 네트워크 없이 배치/캐시 동작을 확인하기 위한 가짜 OpenAI 클라이언트
+# 제목에 소카테고리 단어가 들어 있으면 해당 카테고리를 고른다
+class FakeCategorizeClient:
+    def __init__(self, taxonomy_file=TAXONOMY_FILE, latency=0.0):
+        self.taxonomy = load_taxonomy(taxonomy_file)
+        self.latency = latency
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, messages, model, **kwargs):
+        items = json.loads(messages[-1]['content'])
+        self.calls.append(len(items))
+        time.sleep(self.latency)
+        results = []
+        for item in items:
+            title = item['title'].replace(' ', '')
+            categories = [path for path in self.taxonomy
+                          if path.split(',')[-1].replace(' 운동', '').replace(' ', '') in title]
+            results.append({"id": item['id'], "categories": categories[:3] or [self.taxonomy[0]]})
+        content = json.dumps({"results": results}, ensure_ascii=False)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
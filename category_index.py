@@ -0,0 +1,131 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import video_store
+
+# 카테고리 → 동영상 역색인 (카테고리마다 동영상 위치의 비트셋을 파이썬 정수로 들고 있음)
+# 여러 카테고리 선택은 비트셋 OR(합집합) / AND(교집합) 몇 번으로 끝난다
+
+# 바이트 값 → 켜진 비트 위치
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+class CategoryIndex:
+    # categories_per_item: 항목별 카테고리 목록 (위치 i 의 항목 → 비트 i)
+    def __init__(self, categories_per_item):
+        positions = {}
+        for i, categories in enumerate(categories_per_item):
+            for category in categories:
+                positions.setdefault(category, []).append(i)
+
+        self.size = len(categories_per_item)
+        self.bitsets = {category: _bitset(items, self.size) for category, items in positions.items()}
+        self.counts = {category: len(items) for category, items in positions.items()}
+        self.categories = sorted(self.bitsets)
+
+    # match='any' 이면 하나라도 가진 항목, 'all' 이면 모두 가진 항목의 비트셋
+    def select(self, categories, match='any'):
+        bitsets = [self.bitsets.get(category, 0) for category in dict.fromkeys(categories)]
+        if not bitsets:
+            return 0
+        bits = bitsets[0]
+        for other in bitsets[1:]:
+            bits = bits | other if match == 'any' else bits & other
+        return bits
+
+    def count(self, bits):
+        return bin(bits).count('1')
+
+    # 비트셋 → 항목 위치 목록 (오름차순)
+    def positions(self, bits):
+        found = []
+        for offset, byte in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, 'little')):
+            if byte:
+                base = offset << 3
+                found.extend([base + bit for bit in _BYTE_BITS[byte]])
+        return found
+
+
+def _bitset(positions, size):
+    data = bytearray((size + 7) // 8)
+    for i in positions:
+        data[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(data, 'little')
+
+
+# 한 사용자의 동영상 목록 + 카테고리 색인 (동영상이 추가되면 다시 만든다)
+class VideoCatalog:
+    def __init__(self, videos):
+        self.videos = videos
+        self.index = CategoryIndex([video['categories'] for video in videos])
+
+    @property
+    def categories(self):
+        return self.index.categories
+
+    # 선택한 카테고리 중 하나라도 가진 동영상 목록 (저장 순서)
+    def select(self, categories, match='any'):
+        return [self.videos[i] for i in self.index.positions(self.index.select(categories, match))]
+
+
+# 프로세스에 들고 있는 사용자 카탈로그 수 (오래 안 본 사용자부터 버린다)
+MAX_CATALOGS = 32
+
+# (db_file, user_id) → (catalog_version, VideoCatalog), 최근에 본 순서
+_catalogs = OrderedDict()
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(user_id, db_file=video_store.DB_FILE):
+    version = video_store.catalog_version(db_file)
+    key = (db_file, user_id)
+    with _catalogs_lock:
+        entry = _catalogs.get(key)
+        if entry is not None and entry[0] == version:
+            _catalogs.move_to_end(key)
+            return entry[1]
+    catalog = VideoCatalog(video_store.get_videos_by_user(user_id, db_file))
+    with _catalogs_lock:
+        # 동영상이 추가되면 같은 DB 의 다른 사용자 카탈로그도 모두 낡은 것이므로 함께 버린다
+        for stale in [other for other, (other_version, _) in _catalogs.items()
+                      if other[0] == db_file and other_version != version]:
+            del _catalogs[stale]
+        _catalogs[key] = (version, catalog)
+        _catalogs.move_to_end(key)
+        while len(_catalogs) > MAX_CATALOGS:
+            _catalogs.popitem(last=False)
+    return catalog
+
+
+# 합성 카테고리 목록으로 색인 생성 / 선택 지연 시간 측정
+def main(sizes=(1000, 10000, 50000), categories=40):
+    rng = random.Random(0)
+    names = [f'카테고리{i}' for i in range(categories)]
+    for size in sizes:
+        items = [rng.sample(names, rng.randint(1, 3)) for _ in range(size)]
+        start = time.perf_counter()
+        index = CategoryIndex(items)
+        built = time.perf_counter() - start
+
+        selected = names[:categories // 2]
+        samples = []
+        for _ in range(100):
+            started = time.perf_counter()
+            bits = index.select(selected)
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        started = time.perf_counter()
+        positions = index.positions(bits)
+        listed = time.perf_counter() - started
+
+        naive = time.perf_counter()
+        expected = [i for i, item in enumerate(items) if any(category in selected for category in item)]
+        naive = time.perf_counter() - naive
+        assert positions == expected
+        print(f'{size:>7,} 동영상  생성 {built * 1000:.1f}ms  선택 p50 {samples[50] * 1e6:.1f}us  '
+              f'위치 {listed * 1000:.2f}ms ({len(positions):,}개)  기존 방식 {naive * 1000:.1f}ms')
+
+if __name__ == '__main__':
+    main()
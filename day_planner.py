@@ -0,0 +1,196 @@
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+import numpy as np
+
+# 동영상 목록으로 일별 운동 계획을 만드는 모듈
+# 날마다 하루 목표 시간 ±10분 안에 들어오는 동영상 조합을 0/1 배낭 문제(DP)로 고른다
+#  - 최근 no_repeat_days 일 안에 나온 동영상은 다시 넣지 않는다 (후보가 모자라면 오래된 것부터 허용)
+#  - 지금까지 덜 나온 카테고리의 동영상, 전날 나오지 않은 카테고리의 동영상을 우선한다
+#  - 전날까지 목표보다 모자라거나 넘친 시간은 다음 날 목표에 반영해서 전체 시간을 맞춘다
+TOLERANCE = 600
+NO_REPEAT_DAYS = 3
+# 하루 DP 에 넣는 후보 수 (가중치 상위 + 짧은 동영상)
+CANDIDATES = 48
+SHORT_CANDIDATES = 16
+# DP 칸 크기 (초)
+GRANULARITY = 1
+# 목표에서 1초 벗어날 때의 손해 (가중치 1 인 동영상 1초의 가치 = 1)
+DEVIATION_COST = 2.0
+# 전날 나온 카테고리를 가진 동영상의 가중치 배율
+YESTERDAY_PENALTY = 0.6
+
+# videos: 그날 동영상 (dict) 목록, total_seconds: 합계, categories: 그날 나온 카테고리 목록
+DayPlan = namedtuple('DayPlan', ['day', 'videos', 'total_seconds', 'categories'])
+
+
+def _records(videos):
+    if hasattr(videos, 'to_dict'):
+        return videos.to_dict('records')
+    return list(videos)
+
+
+# videos: DataFrame 또는 dict 목록 ('length', 'categories' 필요)
+# 하루 최대 시간보다 긴 동영상은 어느 날에도 들어갈 수 없으므로 제외한다
+def plan_days(videos, num_days, daily_duration_seconds, tolerance=TOLERANCE, no_repeat_days=NO_REPEAT_DAYS):
+    min_daily_duration = max(0, daily_duration_seconds - tolerance)
+    max_daily_duration = daily_duration_seconds + tolerance
+    records = [video for video in _records(videos) if 0 < int(video['length']) <= max_daily_duration]
+    if not records:
+        return [DayPlan(day, [], 0, []) for day in range(1, num_days + 1)]
+
+    lengths = np.array([int(video['length']) for video in records], dtype=np.int64)
+    cells = np.maximum(1, np.rint(lengths / GRANULARITY)).astype(np.int64)
+    categories = sorted({category for video in records for category in video['categories']})
+    category_ids = {category: i for i, category in enumerate(categories)}
+    membership = np.zeros((len(records), max(1, len(categories))), dtype=bool)
+    for i, video in enumerate(records):
+        for category in video['categories']:
+            membership[i, category_ids[category]] = True
+    # 행마다 카테고리 수로 나눠서 membership_mean @ x 가 그 동영상 카테고리들의 평균이 되게 한다
+    membership_float = membership.astype(np.float32)
+    membership_mean = membership_float / np.maximum(1, membership_float.sum(axis=1, keepdims=True))
+
+    by_length = np.argsort(lengths, kind='stable')
+    last_used = np.full(len(records), -np.inf)
+    category_seconds = np.zeros(membership.shape[1])
+    yesterday = np.zeros(membership.shape[1], dtype=bool)
+    carry = 0
+
+    day_plans = []
+    for day in range(1, num_days + 1):
+        target = min(max(daily_duration_seconds + carry, min_daily_duration), max_daily_duration)
+        since = day - last_used
+        eligible = since > no_repeat_days
+        if lengths[eligible].sum() < min_daily_duration:
+            # 반복 금지를 지키면 하루를 못 채우는 경우: 모든 동영상을 후보로 두고 오래된 순으로 우선
+            eligible = np.ones(len(records), dtype=bool)
+
+        need = category_seconds.max() - category_seconds
+        if need.max() > 0:
+            need = need / need.max()
+        weight = 0.5 + 0.5 * (membership_mean @ need)
+        weight *= np.where(membership_float @ yesterday > 0, YESTERDAY_PENALTY, 1.0)
+        # 오래전에 나왔을수록 1 에 가깝다 (한 번도 안 나온 동영상은 1)
+        weight *= 1 - (no_repeat_days + 1) / (since + no_repeat_days + 1)
+
+        candidates = _candidates(eligible, weight, by_length)
+        chosen = candidates[_pack(
+            cells[candidates], lengths[candidates] * weight[candidates],
+            int(np.ceil(min_daily_duration / GRANULARITY)), int(round(target / GRANULARITY)),
+            max_daily_duration // GRANULARITY,
+        )]
+        chosen = chosen[np.argsort(-weight[chosen], kind='stable')]
+
+        total = int(lengths[chosen].sum())
+        last_used[chosen] = day
+        day_categories = membership[chosen].any(axis=0)
+        category_seconds += lengths[chosen] @ membership[chosen]
+        yesterday = day_categories
+        carry += daily_duration_seconds - total
+        day_plans.append(DayPlan(day, [records[i] for i in chosen], total,
+                                 [categories[i] for i in np.flatnonzero(day_categories[:len(categories)])]))
+    return day_plans
+
+
+# 가중치 상위 CANDIDATES 개 + 가장 짧은 SHORT_CANDIDATES 개 (목표 시간을 잘게 맞출 수 있도록)
+# eligible: 후보가 될 수 있는 동영상 bool 배열, by_length: 길이 오름차순 인덱스
+def _candidates(eligible, weight, by_length):
+    indices = np.flatnonzero(eligible)
+    if len(indices) <= CANDIDATES + SHORT_CANDIDATES:
+        return indices
+    top = indices[np.argpartition(-weight[indices], CANDIDATES)[:CANDIDATES]]
+    rest = eligible.copy()
+    rest[top] = False
+    short = by_length[rest[by_length]][:SHORT_CANDIDATES]
+    return np.sort(np.concatenate([top, short]))
+
+
+# 0/1 배낭: 합이 [low, high] 칸 안에 들면서 (가치 합 - 목표와의 차이) 가 가장 큰 조합의 인덱스
+# 구간 안에 드는 조합이 없으면 high 이하에서 목표에 가장 가까운 조합
+def _pack(cells, values, low, target, high):
+    best = np.full(high + 1, -np.inf)
+    best[0] = 0.0
+    take = np.zeros((len(cells), high + 1), dtype=bool)
+    for i, (width, value) in enumerate(zip(cells, values)):
+        if width > high:
+            continue
+        shifted = best[:high + 1 - width] + value
+        np.greater(shifted, best[width:], out=take[i, width:])
+        np.maximum(best[width:], shifted, out=best[width:])
+
+    positions = np.arange(high + 1)
+    reachable = np.isfinite(best)
+    in_window = reachable & (positions >= low)
+    if in_window.any():
+        score = np.where(in_window, best - DEVIATION_COST * GRANULARITY * np.abs(positions - target), -np.inf)
+        cell = int(np.argmax(score))
+    else:
+        cell = int(np.flatnonzero(reachable)[-1])
+
+    chosen = []
+    for i in range(len(cells) - 1, -1, -1):
+        if cell > 0 and take[i, cell]:
+            chosen.append(i)
+            cell -= cells[i]
+    return np.array(chosen[::-1], dtype=np.int64)
+
+
+# 시간을 'NN분 NN초' 형식으로 변환
+def format_time(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 60}분 {seconds % 60}초"
+
+
+# 달력 저장용 날짜별 항목 (schedule_store.save_plan 형식), start_date 가 Day 1
+def schedule_entries(day_plans, start_date):
+    return [
+        {
+            'date': (start_date + timedelta(days=plan.day - 1)).isoformat(),
+            'title': video['title'],
+            'detail': f"{format_time(video['length'])} | {video['url']}",
+        }
+        for plan in day_plans for video in plan.videos
+    ]
+
+
+# AL_video 에 보내는 'Day N\n제목 (N분) - 카테고리' 형식의 일별 요약
+def format_day_outputs(day_plans):
+    return [
+        f"Day {plan.day}\n" +
+        "\n".join([f"{video['title']} ({video['length'] // 60}분) - {video['category']}" for video in plan.videos])
+        for plan in day_plans
+    ]
+
+
+# 합성 동영상 목록으로 1년치 계획 생성 시간과 제약 충족 여부 측정
+def main(num_videos=10000, num_days=365, daily_minutes=30, seed=0):
+    rng = np.random.default_rng(seed)
+    categories = [f'카테고리{i}' for i in range(30)]
+    videos = [
+        {'video_id': f'v{i}', 'title': f'동영상 {i}', 'category': '', 'length': int(length),
+         'categories': list(rng.choice(categories, size=rng.integers(1, 4), replace=False))}
+        for i, length in enumerate(rng.lognormal(np.log(600), 0.7, size=num_videos).clip(60, 5400))
+    ]
+    start = time.perf_counter()
+    day_plans = plan_days(videos, num_days, daily_minutes * 60)
+    elapsed = time.perf_counter() - start
+
+    target = daily_minutes * 60
+    totals = np.array([plan.total_seconds for plan in day_plans])
+    in_window = np.mean(np.abs(totals - target) <= TOLERANCE)
+    last_seen, min_gap = {}, None
+    for plan in day_plans:
+        for video in plan.videos:
+            if video['video_id'] in last_seen:
+                gap = plan.day - last_seen[video['video_id']]
+                min_gap = gap if min_gap is None else min(min_gap, gap)
+            last_seen[video['video_id']] = plan.day
+    print(f'{num_videos:,} 동영상 × {num_days}일: {elapsed * 1000:.0f}ms')
+    print(f'목표 ±{TOLERANCE // 60}분 안에 든 날 {in_window:.0%}, 평균 {totals.mean() / 60:.1f}분, '
+          f'전체 {totals.sum() / 60:.0f}분 / 목표 {target * num_days / 60:.0f}분')
+    print(f'같은 동영상 최소 재등장 간격 {min_gap}일, 서로 다른 동영상 {len(last_seen):,}개')
+
+if __name__ == '__main__':
+    main()
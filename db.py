@@ -0,0 +1,35 @@
+import sqlite3
+import threading
+
+_local = threading.local()
+
+
+# 스레드마다 DB 연결을 하나씩 재사용 (Streamlit 세션은 서로 다른 스레드에서 실행됨)
+def connect(db_file):
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(db_file)
+    if conn is None:
+        conn = sqlite3.connect(db_file, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        # WAL 모드: 읽기는 쓰기를 기다리지 않고, 쓰기끼리는 잠금으로 직렬화됨
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        conns[db_file] = conn
+    return conn
+
+
+# 여러 문장을 하나의 쓰기 트랜잭션으로 묶음 (중간에 실패하면 전부 취소)
+class transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
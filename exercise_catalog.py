@@ -0,0 +1,101 @@
+import json
+import os
+
+import instrumentation
+
+# exercises.csv 를 프로세스당 한 번만 읽어서 공유하는 모듈
+# pandas 는 데이터가 실제로 필요할 때 import 한다 (사이드바 선택지는 작은 JSON 파일에서 읽음)
+CSV_FILE = 'exercises.csv'
+CACHE_FILE = 'exercises.parquet'
+VALUES_FILE = 'exercises_values.json'
+CATEGORY_COLUMNS = ['Type', 'BodyPart', 'Equipment', 'Level']
+TEXT_COLUMNS = ['Title', 'Desc', 'RatingDesc']
+TOP_RATED_PER_BODY_PART = 10
+
+# csv_file → (원본 수정 시각, DataFrame, facets)
+_loaded = {}
+# values_file → (원본 수정 시각, 컬럼별 값 목록)
+_loaded_values = {}
+
+
+def _parse_csv(csv_file):
+    import pandas as pd
+
+    df = pd.read_csv(csv_file, index_col=0)
+    for column in TEXT_COLUMNS:
+        df[column] = df[column].fillna('')
+    for column in CATEGORY_COLUMNS:
+        df[column] = df[column].fillna('').astype('category')
+    df['Rating'] = df['Rating'].fillna(0.0).astype('float32')
+    return df
+
+
+# 원본보다 새로운 Parquet 캐시가 있으면 그것을 읽고, 없으면 CSV 를 파싱해서 캐시를 만든다
+def _read(csv_file, cache_file):
+    import pandas as pd
+
+    if os.path.exists(cache_file) and os.path.getmtime(cache_file) >= os.path.getmtime(csv_file):
+        with instrumentation.span('file_read_seconds', file=os.path.basename(cache_file)):
+            return pd.read_parquet(cache_file)
+    with instrumentation.span('file_read_seconds', file=os.path.basename(csv_file)):
+        df = _parse_csv(csv_file)
+    df.to_parquet(cache_file)
+    return df
+
+
+def _build_facets(df):
+    facets = {'values': {}, 'counts': {}}
+    for column in CATEGORY_COLUMNS:
+        counts = df[column].value_counts()
+        counts = counts[counts.index != '']
+        facets['values'][column] = sorted(counts.index)
+        facets['counts'][column] = counts.to_dict()
+
+    # 부위별 평점 상위 운동
+    ranked = df.sort_values('Rating', ascending=False, kind='stable')
+    facets['top_rated'] = {
+        body_part: group.head(TOP_RATED_PER_BODY_PART)
+        for body_part, group in ranked.groupby('BodyPart', observed=True)
+    }
+    return facets
+
+
+def _load(csv_file, cache_file):
+    mtime = os.path.getmtime(csv_file)
+    entry = _loaded.get(csv_file)
+    if entry is None or entry[0] != mtime:
+        df = _read(csv_file, cache_file)
+        entry = _loaded[csv_file] = (mtime, df, _build_facets(df))
+    return entry
+
+
+def _write_values(values_file, values):
+    tmp_path = f'{values_file}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(values, f, ensure_ascii=False)
+    os.replace(tmp_path, values_file)
+
+
+# 운동 데이터 (읽기 전용으로 사용할 것 — 모든 페이지가 같은 객체를 공유함)
+def load_exercises(csv_file=CSV_FILE, cache_file=CACHE_FILE):
+    return _load(csv_file, cache_file)[1]
+
+
+# 미리 계산된 facets: values(컬럼별 값 목록), counts(값별 개수), top_rated(부위별 평점 상위 운동)
+def get_facets(csv_file=CSV_FILE, cache_file=CACHE_FILE):
+    return _load(csv_file, cache_file)[2]
+
+
+# 컬럼별 값 목록만 필요할 때 (페이지 첫 화면): 원본보다 새로운 JSON 파일이 있으면 pandas 없이 읽는다
+def get_facet_values(csv_file=CSV_FILE, cache_file=CACHE_FILE, values_file=VALUES_FILE):
+    mtime = os.path.getmtime(csv_file)
+    entry = _loaded_values.get(values_file)
+    if entry is None or entry[0] != mtime:
+        if os.path.exists(values_file) and os.path.getmtime(values_file) >= mtime:
+            with open(values_file, 'r', encoding='utf-8') as f:
+                values = json.load(f)
+        else:
+            values = get_facets(csv_file, cache_file)['values']
+            _write_values(values_file, values)
+        entry = _loaded_values[values_file] = (mtime, values)
+    return entry[1]
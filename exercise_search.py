@@ -0,0 +1,213 @@
+import json
+import os
+import random
+import re
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+import exercise_catalog
+import instrumentation
+
+# exercises.csv 의 Title/Desc 전문 검색 (BM25) + Type/BodyPart/Equipment/Level 비트맵 필터
+INDEX_FILE = 'exercises_index.npz'
+FACET_COLUMNS = exercise_catalog.CATEGORY_COLUMNS
+TITLE_WEIGHT = 3
+K1 = 1.2
+B = 0.75
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_STOPWORDS = frozenset('a an and are as at be by for from in into is it of on or the this to with your you'.split())
+
+# index_file → (원본 수정 시각, ExerciseIndex)
+_loaded = {}
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class ExerciseIndex:
+    # 역색인은 CSR 형태로 저장: 단어 t 의 문서 목록은 doc_ids[offsets[t]:offsets[t + 1]]
+    def __init__(self, vocab, offsets, doc_ids, tfs, doc_lengths, labels, ratings, facets):
+        self.vocab = vocab
+        self.term_ids = {term: i for i, term in enumerate(vocab)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        self.labels = labels
+        self.ratings = ratings
+        # facets: {컬럼: {값: 문서 수 길이의 bool 비트맵}}
+        self.facets = facets
+        self.num_docs = len(doc_lengths)
+
+    @classmethod
+    def build(cls, df):
+        postings = defaultdict(list)
+        doc_lengths = np.zeros(len(df), dtype=np.int32)
+        for doc, (title, desc) in enumerate(zip(df['Title'], df['Desc'])):
+            counts = Counter(tokenize(title) * TITLE_WEIGHT + tokenize(desc))
+            doc_lengths[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((doc, tf))
+
+        vocab = sorted(postings)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in vocab])
+        pairs = np.array([pair for term in vocab for pair in postings[term]], dtype=np.int64).reshape(-1, 2)
+
+        facets = {
+            column: {value: (df[column] == value).to_numpy() for value in df[column].unique() if value != ''}
+            for column in FACET_COLUMNS
+        }
+        return cls(vocab, offsets, pairs[:, 0].astype(np.int32), pairs[:, 1].astype(np.int32), doc_lengths,
+                   df.index.to_numpy(), df['Rating'].to_numpy(dtype=np.float32), facets)
+
+    def save(self, path):
+        arrays = {'offsets': self.offsets, 'doc_ids': self.doc_ids, 'tfs': self.tfs,
+                  'doc_lengths': self.doc_lengths, 'labels': self.labels, 'ratings': self.ratings}
+        facet_values = {}
+        for column, bitmaps in self.facets.items():
+            facet_values[column] = list(bitmaps)
+            for i, bitmap in enumerate(bitmaps.values()):
+                arrays[f'facet_{column}_{i}'] = np.packbits(bitmap)
+        meta = json.dumps({'vocab': self.vocab, 'facets': facet_values})
+        tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+        np.savez(tmp_path, meta=np.array(meta), **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            num_docs = len(data['doc_lengths'])
+            facets = {
+                column: {value: np.unpackbits(data[f'facet_{column}_{i}'], count=num_docs).astype(bool)
+                         for i, value in enumerate(values)}
+                for column, values in meta['facets'].items()
+            }
+            return cls(meta['vocab'], data['offsets'], data['doc_ids'], data['tfs'], data['doc_lengths'],
+                       data['labels'], data['ratings'], facets)
+
+    # filters: {컬럼: [값, ...]} — 컬럼 안에서는 OR, 컬럼끼리는 AND
+    def filter_mask(self, filters):
+        mask = None
+        for column, values in (filters or {}).items():
+            if not values:
+                continue
+            column_mask = np.zeros(self.num_docs, dtype=bool)
+            for value in values:
+                bitmap = self.facets[column].get(value)
+                if bitmap is not None:
+                    column_mask |= bitmap
+            mask = column_mask if mask is None else mask & column_mask
+        return mask
+
+    # 검색 결과: [(exercises.csv 인덱스, 점수)] 점수 높은 순
+    # 검색어가 없으면 필터에 맞는 운동을 평점순으로 돌려준다
+    def search(self, query, filters=None, k=20):
+        mask = self.filter_mask(filters)
+        term_ids = [self.term_ids[term] for term in dict.fromkeys(tokenize(query)) if term in self.term_ids]
+
+        if not term_ids:
+            if not query.strip() and mask is not None:
+                candidates = np.flatnonzero(mask)
+                return self._top(candidates, self.ratings[candidates], k)
+            return []
+
+        ids, scores = [], []
+        for t in term_ids:
+            start, end = self.offsets[t], self.offsets[t + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+            if mask is not None:
+                keep = mask[docs]
+                docs, tf = docs[keep], tf[keep]
+            idf = np.log(1 + (self.num_docs - (end - start) + 0.5) / ((end - start) + 0.5))
+            norm = K1 * (1 - B + B * self.doc_lengths[docs] / self.avg_length)
+            ids.append(docs)
+            scores.append(idf * tf * (K1 + 1) / (tf + norm))
+
+        ids = np.concatenate(ids)
+        scores = np.concatenate(scores)
+        if len(term_ids) > 1:
+            # 여러 단어에 걸친 같은 문서의 점수를 합친다
+            ids, inverse = np.unique(ids, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores)
+        return self._top(ids, scores, k)
+
+    def _top(self, docs, scores, k):
+        if len(docs) > k:
+            top = np.argpartition(-scores, k)[:k]
+            docs, scores = docs[top], scores[top]
+        order = np.argsort(-scores, kind='stable')
+        return [(self.labels[docs[i]].item(), float(scores[i])) for i in order]
+
+
+# 원본보다 새로운 인덱스 파일이 있으면 읽고, 없으면 만들어서 저장한다 (프로세스당 한 번)
+def load_index(csv_file=exercise_catalog.CSV_FILE, index_file=INDEX_FILE):
+    mtime = os.path.getmtime(csv_file)
+    entry = _loaded.get(index_file)
+    if entry is None or entry[0] != mtime:
+        if os.path.exists(index_file) and os.path.getmtime(index_file) >= mtime:
+            with instrumentation.span('file_read_seconds', file=os.path.basename(index_file)):
+                index = ExerciseIndex.load(index_file)
+        else:
+            index = ExerciseIndex.build(exercise_catalog.load_exercises(csv_file))
+            index.save(index_file)
+        entry = _loaded[index_file] = (mtime, index)
+    return entry[1]
+
+
+# 현재 카탈로그를 100배로 늘린 합성 데이터로 질의 지연 시간 측정
+# 행을 그대로 복사하면 어휘와 포스팅 모양이 원본과 같아지므로, 복사본마다 Title/Desc 단어를 일부 빼고 섞은 뒤
+# 카탈로그의 다른 단어 하나, 복사본 번호를 붙인 변형 단어 하나, 복사본 접미사를 더한다
+def main(scale=100, seed=0):
+    df = exercise_catalog.load_exercises()
+    rng = random.Random(seed)
+    words = sorted({word for text in df['Title'].tolist() + df['Desc'].tolist() for word in text.split()})
+
+    def variant(text, copy):
+        tokens = text.split()
+        if tokens:
+            tokens = rng.sample(tokens, len(tokens) - rng.randint(0, len(tokens) // 3))
+            i = rng.randrange(len(tokens))
+            tokens[i] = f'{tokens[i]}{copy}'
+        return ' '.join(tokens + [rng.choice(words), f'v{copy}'])
+
+    synthetic = df.loc[df.index.repeat(scale)].reset_index(drop=True)
+    synthetic['Title'] = [variant(title, i % scale) for i, title in enumerate(synthetic['Title'].tolist())]
+    synthetic['Desc'] = [variant(desc, i % scale) for i, desc in enumerate(synthetic['Desc'].tolist())]
+    vocab = {token for column in ('Title', 'Desc') for text in synthetic[column].tolist() for token in tokenize(text)}
+    print(f'{len(synthetic):,} rows 합성 (어휘 {len(vocab):,}개)')
+    start = time.perf_counter()
+    index = ExerciseIndex.build(synthetic)
+    print(f'{len(synthetic):,} rows 인덱스 생성 {time.perf_counter() - start:.1f}s')
+
+    index.save('exercises_index_bench.npz')
+    start = time.perf_counter()
+    index = ExerciseIndex.load('exercises_index_bench.npz')
+    print(f'인덱스 로드 {(time.perf_counter() - start) * 1000:.1f}ms')
+    os.remove('exercises_index_bench.npz')
+
+    queries = [
+        ('plank', {'BodyPart': ['Abdominals'], 'Equipment': ['Bands']}),
+        ('plank', None),
+        ('dumbbell curl', {'BodyPart': ['Biceps']}),
+        ('hip stretch', {'Type': ['Stretching'], 'Level': ['Beginner']}),
+        ('squat', {'Equipment': ['Barbell', 'Body Only']}),
+    ]
+    for query, filters in queries:
+        samples = []
+        for _ in range(50):
+            started = time.perf_counter()
+            results = index.search(query, filters)
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        print(f'{query!r:18} {str(filters):60} p50 {samples[25] * 1000:.2f}ms  ({len(results)} results)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import base64
+import hashlib
+import io
+import os
+import time
+
+from db import connect
+from llm import record_llm_call
+
+# 내용 해시로 이미지를 저장하는 로컬 저장소 (원본 + 크기별 WebP 변형)
+STORE_DIR = 'image_store'
+DB_FILE = 'images.db'
+VARIANT_WIDTHS = (256, 512)
+DISPLAY_WIDTH = 512
+
+
+class ImageStore:
+    def __init__(self, root=STORE_DIR, widths=VARIANT_WIDTHS, keep_original=True):
+        self.root = root
+        self.widths = widths
+        self.keep_original = keep_original
+
+    def _dir(self, digest):
+        return os.path.join(self.root, digest[:2])
+
+    def original_path(self, digest):
+        return os.path.join(self._dir(digest), f'{digest}.png')
+
+    def path(self, digest, width=DISPLAY_WIDTH):
+        return os.path.join(self._dir(digest), f'{digest}_{width}.webp')
+
+    def exists(self, digest, width=DISPLAY_WIDTH):
+        return os.path.exists(self.path(digest, width))
+
+    def _files(self, digest):
+        files = [self.path(digest, width) for width in self.widths]
+        if self.keep_original:
+            files.append(self.original_path(digest))
+        return files
+
+    # 저장된 파일들의 전체 크기 (바이트)
+    def size(self, digest):
+        return sum(os.path.getsize(f) for f in self._files(digest) if os.path.exists(f))
+
+    def remove(self, digest):
+        for f in self._files(digest):
+            if os.path.exists(f):
+                os.remove(f)
+
+    # 이미지 바이트를 저장하고 해시를 돌려준다 (이미 있는 내용이면 다시 쓰지 않음)
+    def put(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        if all(self.exists(digest, width) for width in self.widths):
+            return digest
+
+        # PIL 은 새 이미지를 저장할 때만 필요하다
+        from PIL import Image
+
+        os.makedirs(self._dir(digest), exist_ok=True)
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        if self.keep_original:
+            _atomic_write(self.original_path(digest), data)
+        for width in self.widths:
+            variant = image.copy()
+            variant.thumbnail((width, width), Image.LANCZOS)
+            buffer = io.BytesIO()
+            variant.save(buffer, format='WEBP', quality=85)
+            _atomic_write(self.path(digest, width), buffer.getvalue())
+        return digest
+
+
+# 임시 파일에 쓴 뒤 이름을 바꿔서, 읽는 쪽이 반쯤 쓰인 파일을 보지 않게 한다
+def _atomic_write(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _request_key(model, prompt, size, quality):
+    return hashlib.sha256(f'{model}\n{size}\n{quality}\n{prompt}'.encode('utf-8')).hexdigest()
+
+
+# 같은 프롬프트로 생성한 이미지가 있으면 생성 없이 로컬 파일 경로를 돌려준다
+# 새로 생성한 이미지는 만료되는 URL 대신 base64 로 받아서 바로 저장한다
+def get_or_generate(client, prompt, model='dall-e-3', size='1024x1024', quality='standard',
+                    refresh=False, store=None, db_file=DB_FILE):
+    store = store or ImageStore()
+    conn = connect(db_file)
+    conn.execute("CREATE TABLE IF NOT EXISTS generated_images (request_key TEXT PRIMARY KEY, digest TEXT NOT NULL)")
+    key = _request_key(model, prompt, size, quality)
+
+    if not refresh:
+        row = conn.execute("SELECT digest FROM generated_images WHERE request_key = ?", (key,)).fetchone()
+        if row and store.exists(row['digest']):
+            return store.path(row['digest'])
+
+    start = time.perf_counter()
+    response = client.images.generate(
+        model=model,
+        prompt=prompt,
+        size=size,
+        quality=quality,
+        n=1,
+        response_format='b64_json',
+    )
+    record_llm_call(model, 'image', time.perf_counter() - start)
+    digest = store.put(base64.b64decode(response.data[0].b64_json))
+    conn.execute(
+        "INSERT OR REPLACE INTO generated_images (request_key, digest) VALUES (?, ?)", (key, digest)
+    )
+    return store.path(digest)
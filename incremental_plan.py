@@ -0,0 +1,413 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+from datetime import date
+
+import instrumentation
+import local_planner
+import plan_prompt
+import schedule_store
+from db import connect, transaction
+from llm import stream_chat
+
+# 계획을 날짜별 단위(DayUnit)로 저장하고, 그날이 의존하는 값의 지문(fingerprint)이 바뀐 날만 다시 만든다
+#  - AI 운동 계획 (cal.py 의 AI 플래너): 지문 = (경험 수준, 목표 부위, 나이) + 그날 쓴 운동들의 카탈로그 행과 사용 가능 여부
+#    장비를 빼면 그 장비를 쓰던 날만, 기간을 늘리면 새 날짜만, 하루 고치기는 그날만 LLM 에 보낸다
+#  - 로컬 계획 (cal.py, local_planner): 지문 = 그날의 로컬 초안
+#    (+ 다듬었으면 초안에 드러나지 않는 선호도와, 다듬은 결과의 운동이 지금 장비로 할 수 있는지)
+#    초안이 바뀐 날만 (선택적으로) LLM 으로 다듬고, 다듬지 못한 날은 다음 생성 때 다시 다듬는다
+#  - 동영상 계획 분석 (app_f.py): 지문 = 그날 동영상 목록, 동영상이 바뀐 날의 분석만 다시 받는다
+#  - 다시 만들 날은 한 번의 요청으로 묶고, 남아 있는 이웃 날을 참고로 보낸 뒤 결과를 합친다
+DB_FILE = schedule_store.DB_FILE
+PT_PLAN = schedule_store.PT_PLAN
+VIDEO_ANALYSIS = 'video_analysis'
+# 다시 만드는 날의 앞뒤 며칠을 참고로 보낸다 (같은 운동이 이어지지 않도록)
+CONTEXT_DAYS = 2
+# 프롬프트나 응답 형식이 바뀌면 올려서 저장된 단위를 모두 다시 만들게 한다
+VERSION = 1
+
+# content: 그날 계획 텍스트, deps: 지문 계산에 쓰는 그날의 의존 값 (AI 계획은 운동 id 목록)
+DayUnit = namedtuple('DayUnit', ['date', 'fingerprint', 'content', 'deps'])
+
+_DAY_HEADER_RE = re.compile(r'^\W*Day\s*(\d+)\b', re.IGNORECASE)
+
+
+def init_db(db_file=DB_FILE):
+    connect(db_file).execute(
+        "CREATE TABLE IF NOT EXISTS plan_days ("
+        "user_id TEXT NOT NULL, kind TEXT NOT NULL, date TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+        "content TEXT NOT NULL, deps TEXT, updated_at REAL NOT NULL, "
+        "PRIMARY KEY (user_id, kind, date)) WITHOUT ROWID"
+    )
+
+
+def fingerprint(*parts):
+    data = json.dumps([VERSION, *parts], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+
+# dates 중 저장된 단위 → {date: DayUnit}
+def load_units(user_id, kind, dates, db_file=DB_FILE):
+    if not dates:
+        return {}
+    wanted = set(dates)
+    return {row['date']: DayUnit(row['date'], row['fingerprint'], row['content'], json.loads(row['deps']))
+            for row in connect(db_file).execute(
+                "SELECT date, fingerprint, content, deps FROM plan_days "
+                "WHERE user_id = ? AND kind = ? AND date BETWEEN ? AND ?",
+                (user_id, kind, min(dates), max(dates)),
+            ) if row['date'] in wanted}
+
+
+# units 를 저장하고, removed 날짜의 단위는 지운다 (다시 만들지 못한 날에 예전 내용이 남지 않도록)
+def save_units(user_id, kind, units, db_file=DB_FILE, removed=()):
+    conn = connect(db_file)
+    now = time.time()
+    with transaction(conn):
+        conn.executemany(
+            "DELETE FROM plan_days WHERE user_id = ? AND kind = ? AND date = ?",
+            [(user_id, kind, day) for day in removed],
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO plan_days (user_id, kind, date, fingerprint, content, deps, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(user_id, kind, unit.date, unit.fingerprint, unit.content, json.dumps(unit.deps), now)
+             for unit in units],
+        )
+
+
+# dates 의 단위 중 지문이 지금 상태와 같은 날은 그대로 쓰고, 나머지와 force 날짜만 generate 로 만든다
+# fingerprint_of(date, deps): 지금 상태에서 그날 단위의 지문 (None 이면 저장은 하되 다음번에 다시 만든다)
+# generate(다시 만들 날짜 목록, {date: 재사용 단위}) → {date: (content, deps)} (응답에 빠진 날은 없어도 됨)
+# 반환값: ({date: DayUnit} (날짜 순서, 만들지 못한 날은 빠짐), 다시 만들려고 한 날짜 목록)
+def refresh(user_id, kind, dates, fingerprint_of, generate, force=(), db_file=DB_FILE):
+    stored = load_units(user_id, kind, dates, db_file)
+    force = set(force)
+    units = {}
+    stale = []
+    for day in dates:
+        unit = stored.get(day)
+        if unit is not None and day not in force and unit.fingerprint == fingerprint_of(day, unit.deps):
+            units[day] = unit
+        else:
+            stale.append(day)
+    instrumentation.inc('plan_days_total', len(units), kind=kind, status='reused')
+
+    if stale:
+        generated = generate(stale, dict(units))
+        new_units = [DayUnit(day, fingerprint_of(day, generated[day][1]) or '', *generated[day])
+                     for day in stale if day in generated]
+        save_units(user_id, kind, new_units, db_file, removed=[day for day in stale if day not in generated])
+        units.update((unit.date, unit) for unit in new_units)
+        instrumentation.inc('plan_days_total', len(new_units), kind=kind, status='generated')
+        instrumentation.inc('plan_days_total', len(stale) - len(new_units), kind=kind, status='missing')
+    return {day: units[day] for day in dates if day in units}, stale
+
+
+# 다시 만들 날 앞뒤 CONTEXT_DAYS 안에 있는 재사용 날짜 (dates 순서)
+def _neighbours(dates, stale, reused):
+    positions = {day: i for i, day in enumerate(dates)}
+    near = set()
+    for day in stale:
+        i = positions[day]
+        near.update(dates[max(0, i - CONTEXT_DAYS):i + CONTEXT_DAYS + 1])
+    return [day for day in dates if day in near and day in reused]
+
+
+def _exercise_row(exercises, exercise_id):
+    if exercise_id not in exercises.index:
+        return None
+    row = exercises.loc[exercise_id]
+    return [str(row[column]) for column in ('Title', 'BodyPart', 'Equipment', 'Level', 'Type')]
+
+
+# AI 계획 하루의 지문: 계획 전체에 걸리는 선호도 + 그날 쓴 운동의 카탈로그 행 (지금 고를 수 없는 운동이면 None)
+def _pt_fingerprint_of(exercises, user_preferences):
+    plan_key = (user_preferences.get('experience_level'), sorted(user_preferences.get('target_body_part') or []),
+                user_preferences.get('age'))
+    available = set(plan_prompt.matching_exercises(exercises, user_preferences).index)
+
+    def fingerprint_of(day, exercise_ids):
+        return fingerprint(PT_PLAN, plan_key, [
+            [exercise_id, _exercise_row(exercises, exercise_id) if exercise_id in available else None]
+            for exercise_id in exercise_ids or ()
+        ])
+    return fingerprint_of
+
+
+# AI 운동 계획: 지문이 바뀌었거나 없는 날만 한 번의 요청으로 만들고 나머지 날과 합친다
+# force: 지문과 상관없이 다시 만들 날짜, instruction: 그 날짜들에 적용할 수정 요청
+# 반환값은 refresh 와 같다
+def generate_pt_plan(client, exercises, user_id, user_preferences, dates, container=None, force=(),
+                     instruction=None, cache=True, db_file=DB_FILE):
+    # 이름은 빼고 나이는 묶어서 프롬프트와 지문에 쓴다
+    preferences = plan_prompt.prompt_preferences(user_preferences)
+
+    # 프롬프트에는 날짜 대신 계획 안의 'Day N' 을 쓴다 (시작 날짜가 다른 사용자끼리도 응답 캐시를 나눠 쓰도록)
+    labels = plan_prompt.day_labels(dates)
+
+    def generate(stale, reused):
+        candidates = plan_prompt.pack_candidates(plan_prompt.retrieve_candidates(exercises, preferences))
+        context = [f'{labels[day]}: {reused[day].content}' for day in _neighbours(dates, stale, reused)]
+        messages = plan_prompt.build_messages(preferences, stale, candidates, context, instruction, relative_to=dates)
+        text = stream_chat(client, messages, plan_prompt.MODEL, container=container, cache=cache,
+                           refresh=bool(force), max_tokens=plan_prompt.max_tokens_for(stale))
+        return {day: (content, plan_prompt.exercise_ids(content))
+                for day, content in plan_prompt.parse_plan_days(plan_prompt.relative_to_dates(text, dates),
+                                                                stale).items()}
+
+    return refresh(user_id, PT_PLAN, dates, _pt_fingerprint_of(exercises, preferences), generate, force, db_file)
+
+
+# 로컬 계획: local_planner 초안을 날마다 만들고 (수 ms), 저장된 날 중 초안이 그대로인 날은 그대로 쓴다
+# polish_client 가 있으면 새로 만들 날의 초안만 한 번의 요청으로 다듬는다 (instruction 은 그 날들에 적용할 수정 요청)
+# 다듬기 요청이 실패하거나 응답에 빠진 날은 초안을 그대로 쓰고, 다음 생성 때 그날만 다시 다듬는다
+# deps: {'polished': 다듬었는지, 'ids': 그날 계획의 운동 id 목록}
+# 반환값: (refresh 의 반환값..., 다듬기 오류 또는 None)
+def generate_local_pt_plan(exercises, user_id, user_preferences, dates, seed=local_planner.SEED, polish_client=None,
+                           container=None, force=(), instruction=None, cache=True, db_file=DB_FILE):
+    preferences = plan_prompt.prompt_preferences(user_preferences)
+    draft = local_planner.plan(exercises, preferences, dates, seed)
+    errors = []
+    # 부위 / 장비는 초안에 이미 드러나므로, 다듬기 프롬프트에만 영향을 주는 선호도 (나이 등)
+    polish_key = {key: value for key, value in preferences.items()
+                  if key not in ('target_body_part', 'equipment_available')}
+    available = set(plan_prompt.filter_exercises(exercises, [], preferences.get('equipment_available'), []).index)
+    labels = plan_prompt.day_labels(dates)
+
+    def fingerprint_of(day, deps):
+        polished = isinstance(deps, dict) and deps.get('polished', False)
+        if polish_client is not None and not polished:
+            return None
+        if polish_client is None:
+            # 다듬기를 끄면 다듬은 날도 초안으로 돌아간다
+            return fingerprint('local', None, draft[day])
+        return fingerprint('local', polish_key, draft[day], [i in available for i in deps.get('ids', ())])
+
+    def generate(stale, reused):
+        if polish_client is None:
+            return {day: (draft[day], {'polished': False, 'ids': []}) for day in stale}
+        context = [f'{labels[day]}: {reused[day].content}' for day in _neighbours(dates, stale, reused)]
+        messages = local_planner.polish_messages(
+            preferences, [f'{labels[day]}: {draft[day]}' for day in stale],
+            plan_prompt.pack_candidates(plan_prompt.retrieve_candidates(exercises, preferences)), context, instruction)
+        try:
+            text = stream_chat(polish_client, messages, plan_prompt.MODEL, container=container, cache=cache,
+                               refresh=bool(force), max_tokens=plan_prompt.max_tokens_for(stale))
+            polished = plan_prompt.parse_plan_days(plan_prompt.relative_to_dates(text, dates), stale)
+        except Exception as e:
+            errors.append(e)
+            polished = {}
+        return {day: (polished[day], {'polished': True, 'ids': plan_prompt.exercise_ids(polished[day])})
+                if day in polished else (draft[day], {'polished': False, 'ids': []}) for day in stale}
+
+    units, stale = refresh(user_id, PT_PLAN, dates, fingerprint_of, generate, force, db_file)
+    return units, stale, errors[0] if errors else None
+
+
+# 저장된 운동 계획을 LLM 없이 다시 읽는다 (지문 확인 없이, 화면을 다시 그릴 때)
+def load_pt_plan(user_id, dates, db_file=DB_FILE):
+    units = load_units(user_id, PT_PLAN, dates, db_file)
+    return {day: units[day] for day in dates if day in units}
+
+
+# {date: DayUnit} → parse_plan 이 읽는 'YYYY-MM-DD: ...' 줄 텍스트
+def format_plan(units):
+    return '\n'.join(f'{day}: {unit.content}' for day, unit in units.items())
+
+
+# 'Day N' 머리줄로 나뉜 응답 → {day_dates[N]: 그 Day 부분 텍스트}
+# 머리줄이 없고 요청한 날이 하루뿐이면 응답 전체가 그날 것
+def split_day_sections(text, day_dates):
+    sections = {}
+    current = None
+    for line in text.splitlines():
+        match = _DAY_HEADER_RE.match(line)
+        if match and int(match.group(1)) in day_dates:
+            current = day_dates[int(match.group(1))]
+            sections.setdefault(current, [])
+        if current is not None:
+            sections[current].append(line)
+    if not sections and len(day_dates) == 1 and text.strip():
+        return {next(iter(day_dates.values())): text.strip()}
+    return {day: '\n'.join(lines).strip() for day, lines in sections.items()}
+
+
+# 응답에서 요청한 Day 의 첫 머리줄 앞부분 (머리줄이 하나도 없으면 응답 전체)
+def _unsplit_text(text, day_numbers):
+    lines = []
+    for line in text.splitlines():
+        match = _DAY_HEADER_RE.match(line)
+        if match and int(match.group(1)) in day_numbers:
+            break
+        lines.append(line)
+    return '\n'.join(lines).strip()
+
+
+# 동영상 계획 분석: 동영상 목록이 바뀐 날의 요약만 analyze(요약 목록) 로 보내고 결과를 Day 별로 나눠 저장한다
+# day_summaries: [(date, Day 번호, 그날 요약 텍스트), ...]
+# 반환값: (Day 순서로 합친 분석 텍스트, 다시 만들려고 한 날짜 목록)
+# 응답에서 Day 별로 나누지 못한 날은 저장하지 않고, 응답 중 어느 Day 에도 속하지 않은 부분을
+# 그런 날 중 첫 날 자리에 한 번 쓴다 (저장된 날과 나눈 날의 분석은 그대로 Day 순서로 합친다)
+def analyze_video_plan(user_id, day_summaries, analyze, refresh_all=False, db_file=DB_FILE):
+    summaries = {day: (number, summary) for day, number, summary in day_summaries}
+    dates = list(summaries)
+    unsplit = []
+
+    def fingerprint_of(day, deps):
+        return fingerprint(VIDEO_ANALYSIS, summaries[day][1])
+
+    def generate(stale, reused):
+        text = analyze([summaries[day][1] for day in stale])
+        day_dates = {summaries[day][0]: day for day in stale}
+        sections = split_day_sections(text, day_dates)
+        leftover = _unsplit_text(text, day_dates)
+        if len(sections) < len(stale) and leftover:
+            unsplit.append(leftover)
+        return {day: (content, None) for day, content in sections.items()}
+
+    units, stale = refresh(user_id, VIDEO_ANALYSIS, dates, fingerprint_of, generate,
+                           force=dates if refresh_all else (), db_file=db_file)
+    parts = []
+    for day in dates:
+        if day in units:
+            parts.append(units[day].content)
+        elif unsplit:
+            parts.append(unsplit.pop())
+    return '\n\n'.join(parts), stale
+
+
+# 가짜 LLM 응답: 프롬프트의 Days 줄의 Day 마다 카탈로그 운동 3개 (7일째마다 휴식), 다듬기 요청이면 초안 그대로
+def _fake_reply(messages):
+    prompt = messages[-1]['content']
+    if 'Draft:\n' in prompt:
+        return prompt.split('Draft:\n', 1)[1].split('\nCatalog', 1)[0]
+    line = next(line for line in prompt.splitlines() if line.startswith('Days:'))
+    found = [int(number) for number in re.findall(r'Day (\d+)', line)]
+    if ' to ' in line:
+        found = list(range(found[0], found[1] + 1))
+    catalog = prompt.split('Catalog', 1)[1].splitlines()[1:]
+    exercises = [line.split(' | ')[:2] for line in catalog if ' | ' in line]
+    lines = []
+    for i in found:
+        if i % 7 == 0:
+            lines.append(f'Day {i}: Rest')
+            continue
+        picked = [exercises[(i * 3 + j) % len(exercises)] for j in range(3)]
+        lines.append(f'Day {i}: ' + '; '.join(f'[{exercise_id}] {title} 3 x 12' for exercise_id, title in picked))
+    return '\n'.join(lines)
+
+
+# 한 달 계획에서 전체 생성 / 그대로 다시 열기 / 장비 하나 빼기 / 기간 늘리기 / 하루 고치기의 요청 크기를 비교한다
+def main():
+    import exercise_catalog
+    import llm_cache
+    from llm import TIMINGS, FakeOpenAI
+
+    workdir = tempfile.mkdtemp(prefix='incremental_plan_')
+    try:
+        db_file = os.path.join(workdir, 'schedule.db')
+        init_db(db_file)
+        exercises = exercise_catalog.load_exercises()
+        client = FakeOpenAI(reply=_fake_reply)
+        preferences = {'name': 'demo', 'age': 30, 'experience_level': 'Intermediate',
+                       'target_body_part': ['Chest', 'Quadriceps', 'Abdominals'],
+                       'equipment_available': ['Dumbbell', 'Barbell', 'Cable']}
+        month = plan_prompt.plan_dates(date(2026, 11, 1), 30)
+
+        def llm_plan(user_preferences, dates, **options):
+            return generate_pt_plan(client, exercises, 'demo', user_preferences, dates, cache=False,
+                                    db_file=db_file, **options)
+
+        def unavailable(messages):
+            raise RuntimeError('polish unavailable')
+
+        broken = FakeOpenAI(reply=unavailable)
+        polish_errors = []
+
+        def local_plan(user_preferences, dates, polish_client=client, **options):
+            units, stale, error = generate_local_pt_plan(exercises, 'local', user_preferences, dates,
+                                                         polish_client=polish_client, cache=False,
+                                                         db_file=db_file, **options)
+            polish_errors.append(error)
+            return units, stale
+
+        def step(label, dates, user_preferences=preferences, planner=llm_plan, **options):
+            calls = client.calls
+            TIMINGS.clear()
+            start = time.perf_counter()
+            units, stale = planner(user_preferences, dates, **options)
+            elapsed = time.perf_counter() - start
+            prompt = sum(timing['prompt_tokens'] or 0 for timing in TIMINGS)
+            completion = sum(timing['completion_tokens'] or 0 for timing in TIMINGS)
+            print(f'{label:28s} 요청 {client.calls - calls}번, 다시 만든 날 {len(stale):2d}/{len(dates)}, '
+                  f'토큰 {prompt:5d} + {completion:5d}, {elapsed * 1000:6.1f}ms')
+            assert len(units) == len(dates)
+            return units, stale
+
+        step('한 달 계획 처음 생성', month)
+        _, stale = step('같은 조건으로 다시 열기', month)
+        assert not stale
+        before = load_pt_plan('demo', month, db_file)
+        without = dict(preferences, equipment_available=['Dumbbell', 'Cable'])
+        after, stale = step('장비에서 Barbell 빼기', month, without)
+        barbell = {day for day, unit in before.items()
+                   if any(_exercise_row(exercises, i)[2] == 'Barbell' for i in unit.deps)}
+        assert set(stale) == barbell
+        assert all(after[day] == before[day] for day in month if day not in barbell)
+        step('기간 30일 → 37일', plan_prompt.plan_dates(date(2026, 11, 1), 37), without)
+        _, stale = step('하루만 고치기', month, without, force=[month[9]], instruction='Make it lighter')
+        assert stale == [month[9]]
+
+        step('로컬 계획 (LLM 없음)', month, planner=local_plan, polish_client=None)
+        step('로컬 + 다듬기 실패', month, planner=local_plan, polish_client=broken)
+        assert polish_errors[-1] is not None
+        # 다듬지 못한 날은 초안으로 저장되고 다음 생성 때 다시 다듬는다
+        _, stale = step('로컬 계획 + 다듬기', month, planner=local_plan)
+        assert stale == month and polish_errors[-1] is None
+        _, stale = step('로컬 + 다듬기 다시 열기', month, planner=local_plan)
+        assert not stale
+        step('로컬 + 다듬기, Barbell 빼기', month, without, planner=local_plan)
+        _, stale = step('로컬 + 다듬기, 하루만 고치기', month, without, planner=local_plan, force=[month[9]],
+                        instruction='Make it lighter')
+        assert stale == [month[9]]
+        _, stale = step('로컬 + 다듬기, 나이 바꾸기', month, dict(without, age=45), planner=local_plan)
+        assert stale == month
+
+        # 시작 날짜가 다른 두 사용자 (이름과 나이도 조금 다름): 프롬프트가 같아서 두 번째는 응답 캐시에서 읽는다
+        cache = llm_cache.ResponseCache(os.path.join(workdir, 'cache.db'))
+        other = plan_prompt.plan_dates(date(2026, 11, 8), 30)
+        for label, planner in (('AI', generate_pt_plan), ('로컬 + 다듬기', None)):
+            calls = client.calls
+            for user_id, dates, age in (('first', month, 31), ('second', other, 38)):
+                user_preferences = dict(preferences, name=user_id, age=age)
+                if planner is None:
+                    generate_local_pt_plan(exercises, f'{label}-{user_id}', user_preferences, dates,
+                                           polish_client=client, cache=cache, db_file=db_file)
+                else:
+                    planner(client, exercises, f'{label}-{user_id}', user_preferences, dates, cache=cache,
+                            db_file=db_file)
+            print(f'{label} 시작 날짜가 다른 두 사용자: 요청 {client.calls - calls}번')
+            assert client.calls - calls == 1
+
+        # 동영상 계획 분석: 응답이 다시 보낸 날 중 일부만 Day 로 나뉘어도 저장된 날의 분석은 그대로 보인다
+        week = plan_prompt.plan_dates(date(2026, 11, 1), 4)
+        summaries = [(day, i + 1, f'Day {i + 1} 동영상 {i + 1}') for i, day in enumerate(week)]
+        analysis, _ = analyze_video_plan('demo', summaries, lambda outputs: '\n'.join(
+            f'{output.split()[0]} {output.split()[1]}: 분석' for output in outputs), db_file=db_file)
+        summaries[2:] = [(day, number, summary + ' (바뀜)') for day, number, summary in summaries[2:]]
+        partial, stale = analyze_video_plan('demo', summaries, lambda outputs: '전체 요약\nDay 3: 새 분석',
+                                            db_file=db_file)
+        print(f'동영상 분석 일부만 나뉨: 다시 보낸 날 {len(stale)}일 →\n{partial}')
+        assert stale == week[2:] and partial.startswith('\n\n'.join(analysis.split('\n\n')[:2]))
+        assert partial.endswith('Day 3: 새 분석\n\n전체 요약')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import video_store
+from categorizer import normalize_title
+from playlist_fetcher import iter_video_metadata
+
+# 재생목록 동영상 저장 과정 (중복 확인 → 메타데이터 병렬 수집 → 묶음 분류 → 트랜잭션 저장)
+
+
+# 가져온 동영상 메타데이터를 묶어서 분류하고, videos 테이블에 넣을 행 목록을 돌려준다
+def categorize_records(user_id, records, categorizer):
+    if not records:
+        return []
+    categorized = categorizer.categorize_many([record['title'] for record in records])
+
+    new_videos = []
+    for record in records:
+        categorized_video = categorized[normalize_title(record['title'])]
+        new_videos.append({
+            'user_id': user_id,
+            **record,
+            'category': categorized_video.replace("'", "")
+        })
+    return new_videos
+
+
+# 가져온 동영상 메타데이터를 분류해서 한 트랜잭션으로 저장하고, 저장한 동영상 목록을 돌려준다
+def save_video_batch(user_id, records, categorizer, db_file=video_store.DB_FILE):
+    new_videos = categorize_records(user_id, records, categorizer)
+    video_store.insert_videos(new_videos, db_file=db_file)
+    return new_videos
+
+
+# playlist_videos: pytube YouTube 객체 목록 (video_id 만 미리 알면 됨)
+# on_progress(완료 수, 전체 수), on_saved(저장된 동영상 목록) 콜백으로 진행 상황을 알린다
+# 반환값: (새로 저장한 동영상 수, 가져오지 못한 동영상 수)
+def ingest_videos(user_id, playlist_videos, categorizer, db_file=video_store.DB_FILE,
+                  on_progress=None, on_saved=None, **fetch_options):
+    # 재생목록 전체의 중복 여부를 한 번에 확인
+    known_ids = video_store.existing_video_ids([video.video_id for video in playlist_videos], db_file=db_file)
+
+    pending_videos = []
+    for video in playlist_videos:
+        if video.video_id not in known_ids:
+            known_ids.add(video.video_id)
+            pending_videos.append(video)
+
+    # 메타데이터를 병렬로 가져오면서, 도착한 순서대로 묶어서 분류·저장
+    new_videos_count = 0
+    failed_count = 0
+    fetched = []
+
+    def flush():
+        saved = save_video_batch(user_id, fetched, categorizer, db_file=db_file)
+        if saved and on_saved:
+            on_saved(saved)
+        fetched.clear()
+        return len(saved)
+
+    for i, result in enumerate(iter_video_metadata(pending_videos, **fetch_options), 1):
+        if result.error:
+            failed_count += 1
+        else:
+            fetched.append(result.record)
+        if len(fetched) >= categorizer.batch_size:
+            new_videos_count += flush()
+        if on_progress:
+            on_progress(i, len(pending_videos))
+    new_videos_count += flush()
+    return new_videos_count, failed_count
@@ -0,0 +1,444 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+import instrumentation
+import video_store
+from db import connect, transaction
+from ingest import categorize_records
+from playlist_fetcher import iter_video_metadata
+
+# 재생목록 가져오기 작업 큐 (동영상 DB 안의 SQLite 테이블)
+#  - '저장하기' 는 작업만 등록하고 바로 돌아간다. 같은 프로세스의 백그라운드 스레드(IngestWorker)가 먼저 온 순서대로 처리
+#  - 동영상마다 상태(pending / saved / skipped / failed)를 남기고, 동영상 저장과 상태 변경을 한 트랜잭션으로 커밋한다
+#    → 탭을 닫거나 스크립트가 다시 실행되거나 프로세스가 죽어도, 다음 워커가 남은 동영상부터 이어서 처리
+#  - 화면은 get_jobs() 를 몇 초마다 읽어서 진행 상황을 보여준다
+DB_FILE = video_store.DB_FILE
+POLL_SECONDS = 2
+# 분류 묶음이 차지 않아도 이 시간마다 체크포인트 (화면 진행 상황이 멈춰 보이지 않도록)
+CHECKPOINT_SECONDS = 3
+# 이 시간 동안 heartbeat 가 없는 running 작업은 죽은 워커의 것으로 보고 다시 가져간다
+STALE_SECONDS = 120
+IDLE_SECONDS = 5
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+ACTIVE = (QUEUED, RUNNING)
+
+# submit() 이 같은 프로세스의 워커를 바로 깨운다
+_wake = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def init_db(db_file=DB_FILE):
+    connect(db_file).executescript(
+        """
+        CREATE TABLE IF NOT EXISTS ingest_jobs (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            playlist_url TEXT NOT NULL,
+            status TEXT NOT NULL,
+            error TEXT,
+            worker TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            heartbeat REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status, id);
+        CREATE INDEX IF NOT EXISTS idx_ingest_jobs_user ON ingest_jobs (user_id, id);
+        CREATE TABLE IF NOT EXISTS ingest_job_videos (
+            job_id INTEGER NOT NULL,
+            video_id TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            state TEXT NOT NULL DEFAULT 'pending',
+            error TEXT,
+            PRIMARY KEY (job_id, video_id)
+        ) WITHOUT ROWID;
+        """
+    )
+
+
+# 작업 등록 (같은 사용자가 같은 재생목록을 이미 기다리는 중이면 그 작업 번호를 돌려준다)
+def submit(user_id, playlist_url, db_file=DB_FILE):
+    conn = connect(db_file)
+    with transaction(conn):
+        row = conn.execute(
+            "SELECT id FROM ingest_jobs WHERE user_id = ? AND playlist_url = ? AND status IN (?, ?)",
+            (user_id, playlist_url, *ACTIVE),
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        job_id = conn.execute(
+            "INSERT INTO ingest_jobs (user_id, playlist_url, status, created_at) VALUES (?, ?, ?, ?)",
+            (user_id, playlist_url, QUEUED, time.time()),
+        ).lastrowid
+    instrumentation.inc('ingest_jobs_total', status=QUEUED)
+    _wake.set()
+    return job_id
+
+
+# 기다리거나 실행 중인 작업을 멈춘다 (실행 중이면 워커가 다음 체크포인트에서 그만둔다)
+def cancel_job(job_id, db_file=DB_FILE):
+    cur = connect(db_file).execute(
+        "UPDATE ingest_jobs SET status = ?, finished_at = ? WHERE id = ? AND status IN (?, ?)",
+        (CANCELLED, time.time(), job_id, *ACTIVE),
+    )
+    return cur.rowcount == 1
+
+
+# 실패하거나 취소한 작업, 또는 가져오지 못한 동영상이 남은 채 끝난 작업을 다시 큐에 넣는다
+# 저장했거나 건너뛴 동영상은 그대로 두고, 가져오지 못한 동영상은 다시 가져온다
+def retry_job(job_id, db_file=DB_FILE):
+    conn = connect(db_file)
+    with transaction(conn):
+        retried = conn.execute(
+            "UPDATE ingest_jobs SET status = ?, error = NULL, finished_at = NULL "
+            "WHERE id = ? AND (status IN (?, ?) OR (status = ? AND EXISTS ("
+            "SELECT 1 FROM ingest_job_videos WHERE job_id = ? AND state = 'failed')))",
+            (QUEUED, job_id, FAILED, CANCELLED, DONE, job_id),
+        ).rowcount == 1
+        if retried:
+            conn.execute(
+                "UPDATE ingest_job_videos SET state = 'pending', error = NULL WHERE job_id = ? AND state = 'failed'",
+                (job_id,),
+            )
+    _wake.set()
+    return retried
+
+
+# 사용자의 최근 작업과 동영상 상태별 개수 (최신 작업 먼저)
+def get_jobs(user_id, limit=5, db_file=DB_FILE):
+    with instrumentation.span('db_query_seconds', query='get_ingest_jobs'):
+        return [dict(row) for row in connect(db_file).execute(
+            "SELECT j.id, j.playlist_url, j.status, j.error, j.created_at, j.finished_at, "
+            "COUNT(v.video_id) AS total, "
+            "COALESCE(SUM(v.state != 'pending'), 0) AS processed, "
+            "COALESCE(SUM(v.state = 'saved'), 0) AS saved, "
+            "COALESCE(SUM(v.state = 'skipped'), 0) AS skipped, "
+            "COALESCE(SUM(v.state = 'failed'), 0) AS failed "
+            "FROM ingest_jobs j LEFT JOIN ingest_job_videos v ON v.job_id = j.id "
+            "WHERE j.user_id = ? GROUP BY j.id ORDER BY j.id DESC LIMIT ?",
+            (user_id, limit),
+        )]
+
+
+# 끝나지 않은 작업이 있는지 (페이지를 열 때 워커를 다시 띄울지 판단)
+def has_unfinished(db_file=DB_FILE):
+    return connect(db_file).execute(
+        "SELECT 1 FROM ingest_jobs WHERE status IN (?, ?) LIMIT 1", ACTIVE
+    ).fetchone() is not None
+
+
+# 가장 오래 기다린 작업 (또는 heartbeat 가 끊긴 실행 중 작업) 하나를 worker 이름으로 가져간다
+def claim_job(worker, db_file=DB_FILE, stale_seconds=STALE_SECONDS):
+    conn = connect(db_file)
+    now = time.time()
+    with transaction(conn):
+        row = conn.execute(
+            "SELECT id, user_id, playlist_url, status FROM ingest_jobs "
+            "WHERE status = ? OR (status = ? AND heartbeat < ?) ORDER BY id LIMIT 1",
+            (QUEUED, RUNNING, now - stale_seconds),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE ingest_jobs SET status = ?, worker = ?, started_at = COALESCE(started_at, ?), heartbeat = ?, "
+            "error = NULL WHERE id = ?",
+            (RUNNING, worker, now, now, row['id']),
+        )
+    if row['status'] == RUNNING:
+        instrumentation.inc('ingest_jobs_resumed_total')
+    return dict(row, status=RUNNING)
+
+
+# 작업이 아직 이 워커의 것인지 확인하면서 heartbeat 갱신 (취소됐거나 다른 워커가 가져갔으면 False)
+def _touch(conn, job_id, worker):
+    return conn.execute(
+        "UPDATE ingest_jobs SET heartbeat = ? WHERE id = ? AND worker = ? AND status = ?",
+        (time.time(), job_id, worker, RUNNING),
+    ).rowcount == 1
+
+
+def _finish(conn, job_id, worker, status, error=None):
+    conn.execute(
+        "UPDATE ingest_jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND worker = ? AND status = ?",
+        (status, error, time.time(), job_id, worker, RUNNING),
+    )
+    instrumentation.inc('ingest_jobs_total', status=status)
+
+
+# 재생목록 URL → pytube YouTube 객체 목록 (pytube 는 워커에서만 불러온다)
+def load_pytube_playlist(playlist_url):
+    from pytube import Playlist
+
+    with instrumentation.span('pytube_fetch_seconds', op='playlist'):
+        return list(Playlist(playlist_url).videos)
+
+
+# 작업 하나를 남은 동영상부터 끝까지 처리하고 마지막 상태를 돌려준다
+# 메타데이터는 병렬로 가져오고, 분류 묶음이 차거나 CHECKPOINT_SECONDS 가 지날 때마다
+# 분류 → 동영상 저장 + 동영상 상태 + heartbeat 를 한 트랜잭션으로 커밋한다
+# (분류 LLM 요청 전에도 heartbeat 를 갱신하고, 작업이 더는 이 워커의 것이 아니면 그 묶음은 저장하지 않는다)
+def process_job(job, worker, categorizer, load_playlist=load_pytube_playlist, db_file=DB_FILE,
+                on_saved=None, **fetch_options):
+    conn = connect(db_file)
+    job_id = job['id']
+    playlist_videos = list({video.video_id: video for video in load_playlist(job['playlist_url'])}.values())
+    with transaction(conn):
+        conn.executemany(
+            "INSERT OR IGNORE INTO ingest_job_videos (job_id, video_id, position) VALUES (?, ?, ?)",
+            [(job_id, video.video_id, position) for position, video in enumerate(playlist_videos)],
+        )
+        if not _touch(conn, job_id, worker):
+            return CANCELLED
+    pending_ids = {row[0] for row in conn.execute(
+        "SELECT video_id FROM ingest_job_videos WHERE job_id = ? AND state = 'pending'", (job_id,)
+    )}
+    pending = [video for video in playlist_videos if video.video_id in pending_ids]
+
+    # 이미 카탈로그에 있는 동영상 (다른 작업이나 예전 가져오기) 은 건너뛴다
+    known_ids = video_store.existing_video_ids([video.video_id for video in pending], db_file=db_file)
+    if known_ids:
+        with transaction(conn):
+            conn.executemany(
+                "UPDATE ingest_job_videos SET state = 'skipped' WHERE job_id = ? AND video_id = ?",
+                [(job_id, video_id) for video_id in known_ids],
+            )
+        pending = [video for video in pending if video.video_id not in known_ids]
+
+    fetched = []
+    failed = []
+    last_checkpoint = time.monotonic()
+
+    def checkpoint():
+        # 분류는 가장 낮은 우선순위 레인에서 재시도까지 하므로 오래 걸릴 수 있다
+        with transaction(conn):
+            if not _touch(conn, job_id, worker):
+                return False
+        rows = categorize_records(job['user_id'], fetched, categorizer)
+        with transaction(conn):
+            # 분류하는 동안 취소됐거나 다른 워커가 가져갔으면 아무것도 남기지 않는다
+            if not _touch(conn, job_id, worker):
+                return False
+            video_store.insert_videos_in(conn, rows)
+            conn.executemany(
+                "UPDATE ingest_job_videos SET state = 'saved' WHERE job_id = ? AND video_id = ?",
+                [(job_id, row['video_id']) for row in rows],
+            )
+            conn.executemany(
+                "UPDATE ingest_job_videos SET state = 'failed', error = ? WHERE job_id = ? AND video_id = ?",
+                [(error, job_id, video_id) for video_id, error in failed],
+            )
+        instrumentation.inc('ingest_videos_total', len(rows), state='saved')
+        instrumentation.inc('ingest_videos_total', len(failed), state='failed')
+        fetched.clear()
+        failed.clear()
+        if rows and on_saved:
+            on_saved(rows)
+        return True
+
+    results = iter_video_metadata(pending, **fetch_options)
+    try:
+        for result in results:
+            if result.error:
+                failed.append((result.video_id, str(result.error)))
+            else:
+                fetched.append(result.record)
+            if len(fetched) >= categorizer.batch_size or time.monotonic() - last_checkpoint >= CHECKPOINT_SECONDS:
+                last_checkpoint = time.monotonic()
+                if not checkpoint():
+                    return CANCELLED
+    finally:
+        results.close()
+    if not checkpoint():
+        return CANCELLED
+    _finish(conn, job_id, worker, DONE)
+    return DONE
+
+
+# 작업 큐를 처리하는 스레드 (큐가 비면 submit() 이 깨울 때까지 또는 IDLE_SECONDS 마다 확인)
+class IngestWorker(threading.Thread):
+    def __init__(self, categorizer, load_playlist=load_pytube_playlist, db_file=DB_FILE, on_saved=None,
+                 stale_seconds=STALE_SECONDS, **fetch_options):
+        super().__init__(name='ingest-worker', daemon=True)
+        self.worker = f'{socket.gethostname()}:{os.getpid()}:{id(self):x}'
+        self.categorizer = categorizer
+        self.load_playlist = load_playlist
+        self.db_file = db_file
+        self.on_saved = on_saved
+        self.stale_seconds = stale_seconds
+        self.fetch_options = fetch_options
+        self.stopping = threading.Event()
+
+    # 작업 하나를 가져와 처리 (가져올 작업이 없으면 False)
+    def run_once(self):
+        job = claim_job(self.worker, self.db_file, self.stale_seconds)
+        if job is None:
+            return False
+        try:
+            with instrumentation.span('ingest_job_seconds'):
+                process_job(job, self.worker, self.categorizer, self.load_playlist, self.db_file,
+                            self.on_saved, **self.fetch_options)
+        except Exception as e:
+            # 처리한 동영상까지는 커밋되어 있으므로 다시 시도하면 남은 것부터 이어서 한다
+            _finish(connect(self.db_file), job['id'], self.worker, FAILED, f'{type(e).__name__}: {e}')
+        return True
+
+    def run(self):
+        while not self.stopping.is_set():
+            _wake.clear()
+            if not self.run_once():
+                _wake.wait(IDLE_SECONDS)
+
+    def stop(self):
+        self.stopping.set()
+        _wake.set()
+
+
+# 프로세스에 워커 스레드를 하나만 띄운다 (이미 돌고 있으면 그대로 돌려준다)
+def start_worker(categorizer, **options):
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = IngestWorker(categorizer, **options)
+            _worker.start()
+    return _worker
+
+
+# 데모에서 프로세스가 죽은 것처럼 작업을 중간에 끊을 때 쓰는 예외 (워커가 잡지 않는다)
+class _Crash(BaseException):
+    pass
+
+
+class _CrashingCategorizer:
+    def __init__(self, categorizer, after_batches):
+        self.categorizer = categorizer
+        self.batch_size = categorizer.batch_size
+        self.remaining = after_batches
+
+    def categorize_many(self, titles):
+        if self.remaining == 0:
+            raise _Crash()
+        self.remaining -= 1
+        return self.categorizer.categorize_many(titles)
+
+
+# 분류하는 동안 작업이 취소되는 상황
+class _CancellingCategorizer:
+    def __init__(self, categorizer, job_id, db_file):
+        self.categorizer = categorizer
+        self.batch_size = categorizer.batch_size
+        self.job_id = job_id
+        self.db_file = db_file
+
+    def categorize_many(self, titles):
+        cancel_job(self.job_id, self.db_file)
+        return self.categorizer.categorize_many(titles)
+
+
+def _print_jobs(jobs):
+    for job in sorted(jobs, key=lambda job: job['id']):
+        print(f"  작업 #{job['id']} {job['status']:9s} {job['processed']:3d}/{job['total']:3d} "
+              f"(저장 {job['saved']}, 건너뜀 {job['skipped']}, 실패 {job['failed']})")
+
+
+# 가짜 재생목록으로: 작업 등록 지연 시간 / 중간에 죽은 작업 이어서 처리 / 백그라운드 처리 중 진행 상황 확인
+def main(playlists=3, size=60, fetch_latency=0.02, llm_latency=0.05):
+    from categorizer import Categorizer, FakeCategorizeClient
+    from playlist_fetcher import FakePlaylist
+
+    workdir = tempfile.mkdtemp(prefix='ingest_jobs_')
+    try:
+        db_file = os.path.join(workdir, 'videos.db')
+        video_store.init_db(db_file, csv_file=os.path.join(workdir, 'none.csv'))
+        init_db(db_file)
+        client = FakeCategorizeClient(latency=llm_latency)
+        categorizer = Categorizer(client, cache_db_file=os.path.join(workdir, 'categories.db'))
+        fake = {f'fake://playlist/{i}': FakePlaylist(size, fetch_latency, failure_rate=0.05, seed=i,
+                                                      id_prefix=f'p{i}_') for i in range(playlists)}
+        # 두 번째 재생목록은 첫 번째와 앞 10개가 겹친다
+        fake['fake://playlist/1'].videos[:10] = fake['fake://playlist/0'].videos[:10]
+
+        def load_playlist(url):
+            return fake[url].videos
+
+        start = time.perf_counter()
+        job_ids = [submit('demo', url, db_file) for url in fake]
+        print(f'작업 {len(job_ids)}개 등록 {(time.perf_counter() - start) * 1000:.1f}ms '
+              f'(같은 재생목록 다시 등록 → #{submit("demo", "fake://playlist/0", db_file)})')
+
+        # 분류 2묶음을 저장한 뒤 프로세스가 죽은 상황
+        crashed = IngestWorker(_CrashingCategorizer(categorizer, after_batches=2), load_playlist, db_file,
+                               backoff=0.01)
+        try:
+            crashed.run_once()
+        except _Crash:
+            pass
+        print('첫 작업 처리 중 워커가 죽은 직후:')
+        _print_jobs(get_jobs('demo', db_file=db_file))
+
+        # 새 워커가 heartbeat 가 끊긴 작업부터 이어서 처리하는 동안 화면처럼 진행 상황을 읽는다
+        polls = []
+        worker = IngestWorker(categorizer, load_playlist, db_file, stale_seconds=0, backoff=0.01)
+        start = time.perf_counter()
+        worker.start()
+        while True:
+            started = time.perf_counter()
+            jobs = get_jobs('demo', db_file=db_file)
+            polls.append(time.perf_counter() - started)
+            if not any(job['status'] in ACTIVE for job in jobs):
+                break
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        worker.stop()
+        print(f'이어서 처리 {elapsed:.2f}s, 진행 상황 조회 {len(polls)}번 '
+              f'p50 {sorted(polls)[len(polls) // 2] * 1000:.2f}ms:')
+        _print_jobs(jobs)
+
+        conn = connect(db_file)
+        stored = conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+        distinct = len({video.video_id for playlist in fake.values() for video in playlist.videos})
+        failed = sum(job['failed'] for job in jobs)
+        print(f'저장된 동영상 {stored}개 + 실패 {failed}개 = 서로 다른 동영상 {distinct}개')
+        assert all(job['status'] == DONE for job in jobs)
+        assert stored + failed == distinct
+        assert not conn.execute("SELECT COUNT(*) FROM ingest_job_videos WHERE state = 'pending'").fetchone()[0]
+
+        # 가져오지 못한 동영상이 남은 채 끝난 작업을 다시 시도하면 그 동영상만 다시 가져온다
+        fake['fake://playlist/flaky'] = FakePlaylist(size, fetch_latency, failure_rate=0.2, seed=playlists,
+                                                     id_prefix='flaky_')
+        job_id = submit('demo', 'fake://playlist/flaky', db_file)
+        IngestWorker(categorizer, load_playlist, db_file, retries=0).run_once()
+        before = next(job for job in get_jobs('demo', db_file=db_file) if job['id'] == job_id)
+        assert retry_job(job_id, db_file)
+        IngestWorker(categorizer, load_playlist, db_file, backoff=0.01).run_once()
+        after = next(job for job in get_jobs('demo', db_file=db_file) if job['id'] == job_id)
+        print(f"실패가 남은 작업 #{job_id} 다시 시도: 저장 {before['saved']} → {after['saved']}, "
+              f"실패 {before['failed']} → {after['failed']}")
+        assert before['status'] == DONE and before['failed'] and not after['failed']
+        assert after['status'] == DONE and after['saved'] == size and not retry_job(job_id, db_file)
+
+        # 분류하는 동안 취소된 작업은 그 묶음을 저장하지 않는다
+        fake['fake://playlist/cancel'] = FakePlaylist(size, fetch_latency, failure_rate=0, seed=playlists + 1,
+                                                      id_prefix='cancel_')
+        job_id = submit('demo', 'fake://playlist/cancel', db_file)
+        IngestWorker(_CancellingCategorizer(categorizer, job_id, db_file), load_playlist, db_file,
+                     backoff=0.01).run_once()
+        job = next(job for job in get_jobs('demo', db_file=db_file) if job['id'] == job_id)
+        saved = video_store.existing_video_ids([video.video_id for video in fake['fake://playlist/cancel'].videos],
+                                               db_file=db_file)
+        print(f"분류 중 취소: 작업 #{job_id} {job['status']}, 저장된 동영상 {len(saved)}개")
+        assert job['status'] == CANCELLED and not saved
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
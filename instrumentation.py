@@ -0,0 +1,239 @@
+import atexit
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# 페이지 재실행 / 파일 읽기 / LLM 호출 / pytube 요청 시간을 재서 히스토그램으로 모으는 모듈
+# FITNESS_METRICS=1 일 때만 동작하고, 꺼져 있으면 span() 은 아무것도 하지 않는 컨텍스트를 돌려준다
+# 모은 값은 Prometheus 텍스트 형식 파일(METRICS_FILE)로 내보내고,
+# FITNESS_DEBUG_PANEL=1 이면 각 페이지 사이드바에 이번 실행의 구간별 시간과 누적 통계를 보여준다
+DEBUG_PANEL = os.environ.get('FITNESS_DEBUG_PANEL', '') == '1'
+ENABLED = DEBUG_PANEL or os.environ.get('FITNESS_METRICS', '') == '1'
+METRICS_FILE = os.environ.get('FITNESS_METRICS_FILE', 'metrics.prom')
+# 파일 쓰기는 재실행마다 하지 않고 이 간격(초)마다 한 번만
+EXPORT_INTERVAL = 5.0
+PREFIX = 'fitness_'
+
+# 초 단위 히스토그램 구간 (재실행 수 ms ~ LLM 수십 초)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 지표 이름 → 설명 (내보낼 때 HELP 줄)
+DESCRIPTIONS = {
+    'rerun_seconds': 'Streamlit 페이지 스크립트 한 번 실행 시간',
+    'file_read_seconds': 'CSV / Parquet / 인덱스 파일 읽기 시간',
+    'db_query_seconds': 'SQLite 조회 시간',
+    'llm_seconds': 'OpenAI 요청 전체 시간',
+    'llm_ttft_seconds': 'OpenAI 스트리밍 첫 토큰까지 시간',
+    'llm_tokens_total': 'OpenAI 사용 토큰 수',
+    'llm_queue_seconds': 'llm_scheduler 에서 차례를 기다린 시간',
+    'llm_retries_total': '429 / 5xx / 연결 오류로 다시 보낸 요청 수',
+    'llm_coalesced_total': '진행 중인 같은 요청과 합쳐진 요청 수',
+    'pytube_fetch_seconds': 'pytube 동영상 메타데이터 요청 시간',
+    'ingest_jobs_total': '재생목록 가져오기 작업 상태 변경 수 (등록 / 완료 / 실패 / 취소)',
+    'ingest_jobs_resumed_total': '죽은 워커에게서 이어받은 가져오기 작업 수',
+    'ingest_job_seconds': '재생목록 가져오기 작업 하나의 처리 시간',
+    'ingest_videos_total': '가져오기 작업이 저장하거나 실패한 동영상 수',
+}
+
+_NOOP = nullcontext()
+_lock = threading.Lock()
+# (이름, 레이블 튜플) → Histogram / 누적값
+_histograms = {}
+_counters = {}
+# 스크립트 실행 스레드별 이번 재실행의 구간 기록
+_local = threading.local()
+_last_export = 0.0
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # 구간 안에서 선형 보간한 분위수 (Prometheus histogram_quantile 과 같은 방식)
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(name, seconds, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+    spans = getattr(_local, 'spans', None)
+    if spans is not None:
+        spans.append((name, key[1], seconds))
+
+
+def inc(name, value=1, **labels):
+    if not ENABLED or not value:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def _span(name, labels):
+    start = time.perf_counter()
+    try:
+        yield labels
+    except Exception:
+        labels['outcome'] = 'error'
+        raise
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+# with span('file_read_seconds', file='exercises.csv'): ...
+# 블록에서 예외가 나면 outcome="error" 레이블이 붙는다
+def span(name, **labels):
+    if not ENABLED:
+        return _NOOP
+    return _span(name, labels)
+
+
+# 페이지 스크립트 맨 앞에서 begin_rerun, 맨 끝에서 end_rerun 을 부른다
+def begin_rerun(page):
+    if not ENABLED:
+        return
+    _local.page = page
+    _local.started = time.perf_counter()
+    _local.spans = []
+
+
+def end_rerun():
+    if not ENABLED or getattr(_local, 'spans', None) is None:
+        return
+    elapsed = time.perf_counter() - _local.started
+    spans, _local.spans = _local.spans, None
+    observe('rerun_seconds', elapsed, page=_local.page)
+    if DEBUG_PANEL:
+        debug_panel(_local.page, elapsed, spans)
+    maybe_export()
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def prometheus_text():
+    with _lock:
+        histograms = {key: (list(h.counts), h.sum, h.count) for key, h in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name in sorted({name for name, _ in histograms}):
+        metric = PREFIX + name
+        lines.append(f'# HELP {metric} {DESCRIPTIONS.get(name, name)}')
+        lines.append(f'# TYPE {metric} histogram')
+        for (key_name, labels), (counts, total, count) in sorted(histograms.items()):
+            if key_name != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{_format_labels(labels, [("le", str(bound))])} {cumulative}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {_format_number(total)}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {count}')
+    for name in sorted({name for name, _ in counters}):
+        metric = PREFIX + name
+        lines.append(f'# HELP {metric} {DESCRIPTIONS.get(name, name)}')
+        lines.append(f'# TYPE {metric} counter')
+        for (key_name, labels), value in sorted(counters.items()):
+            if key_name == name:
+                lines.append(f'{metric}{_format_labels(labels)} {_format_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def export(path=None):
+    global _last_export
+    path = path or METRICS_FILE
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text())
+    os.replace(tmp_path, path)
+    _last_export = time.monotonic()
+
+
+def maybe_export():
+    if ENABLED and time.monotonic() - _last_export >= EXPORT_INTERVAL:
+        export()
+
+
+# 누적 통계 표: [{'metric', 'labels', 'count', 'p50_ms', 'p95_ms', 'total_ms'}, ...]
+def summary():
+    with _lock:
+        items = sorted(_histograms.items())
+        rows = []
+        for (name, labels), histogram in items:
+            rows.append({
+                'metric': name,
+                'labels': ', '.join(f'{k}={v}' for k, v in labels),
+                'count': histogram.count,
+                'p50_ms': round(histogram.quantile(0.5) * 1000, 2),
+                'p95_ms': round(histogram.quantile(0.95) * 1000, 2),
+                'total_ms': round(histogram.sum * 1000, 2),
+            })
+    return rows
+
+
+def debug_panel(page, elapsed, spans):
+    import streamlit as st
+
+    with st.sidebar.expander(f'⏱ {page} {elapsed * 1000:.1f}ms'):
+        st.caption('이번 실행')
+        st.dataframe([
+            {'span': name, 'labels': ', '.join(f'{k}={v}' for k, v in labels), 'ms': round(seconds * 1000, 2)}
+            for name, labels, seconds in spans
+        ], hide_index=True)
+        st.caption('누적 (히스토그램 추정 분위수)')
+        st.dataframe(summary(), hide_index=True)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+if ENABLED:
+    atexit.register(export)
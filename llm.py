@@ -0,0 +1,281 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import instrumentation
+import llm_cache
+import llm_scheduler
+
+# 모든 페이지가 함께 쓰는 LLM 호출 도우미
+
+# 최근 호출의 지연 시간 기록 (model, ttft, latency, chars, cached, prompt_tokens, completion_tokens)
+TIMINGS = deque(maxlen=200)
+
+# 공유 클라이언트의 연결 풀 설정 (httpx 기본 keep-alive 5초는 사용자가 버튼을 누르는 간격보다 짧다)
+MAX_CONNECTIONS = 50
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY = 120.0
+REQUEST_TIMEOUT = 120.0
+CONNECT_TIMEOUT = 5.0
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _api_key():
+    api_key = os.environ.get('OPENAI_API_KEY')
+    if api_key:
+        return api_key
+    import streamlit as st
+    return st.secrets['API_KEY']
+
+
+# 프로세스 전체가 함께 쓰는 OpenAI 클라이언트 (처음 쓸 때 한 번만 만든다)
+# Streamlit 은 페이지 스크립트를 재실행마다 다시 실행하므로, 페이지에서 클라이언트를 만들면
+# 재실행마다 연결 풀이 새로 생기고 TLS 연결을 다시 맺는다
+# 요청은 llm_scheduler 를 거쳐 나간다 (lane: 화면 요청 INTERACTIVE / 일괄 생성 BATCH / 동영상 분류 INGEST)
+# 재시도는 스케줄러가 맡으므로 SDK 자체 재시도는 끈다
+def get_client(lane=llm_scheduler.INTERACTIVE):
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import httpx
+                from openai import DefaultHttpxClient, OpenAI
+
+                _client = OpenAI(
+                    api_key=_api_key(),
+                    max_retries=0,
+                    http_client=DefaultHttpxClient(
+                        limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                                            keepalive_expiry=KEEPALIVE_EXPIRY),
+                        timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+                    ),
+                )
+    return llm_scheduler.ScheduledClient(_client, llm_scheduler.get_scheduler(), lane)
+
+
+# 응답을 스트리밍으로 받아 container(st, st.empty() 등)에 토큰 단위로 그리고, 최종 텍스트를 돌려준다
+# container 가 없으면 화면에 그리지 않고 텍스트만 모은다
+# 같은 요청의 응답은 디스크 캐시에서 바로 돌려주며, refresh=True 면 캐시를 건너뛰고 새로 생성한다
+def stream_chat(client, messages, model, container=None, cache=True, refresh=False, **params):
+    response_cache = llm_cache.default_cache() if cache is True else cache or None
+    key = llm_cache.make_key(model, messages, **params) if response_cache else None
+    timing = {'model': model, 'ttft': None, 'latency': None, 'chars': 0, 'cached': False,
+              'prompt_tokens': None, 'completion_tokens': None}
+
+    if response_cache and not refresh:
+        start = time.perf_counter()
+        cached = response_cache.get(key)
+        if cached is not None:
+            timing.update(ttft=time.perf_counter() - start, latency=time.perf_counter() - start,
+                          chars=len(cached), cached=True)
+            TIMINGS.append(timing)
+            instrumentation.observe('llm_seconds', timing['latency'], model=model, kind='chat', cached='1')
+            if container is not None:
+                container.markdown(cached)
+            return cached
+
+    def tokens():
+        start = time.perf_counter()
+        stream = client.chat.completions.create(model=model, messages=messages, stream=True,
+                                                stream_options={'include_usage': True}, **params)
+        for chunk in stream:
+            # 마지막 청크에만 토큰 사용량이 들어 있다
+            usage = getattr(chunk, 'usage', None)
+            if usage:
+                timing['prompt_tokens'] = usage.prompt_tokens
+                timing['completion_tokens'] = usage.completion_tokens
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if timing['ttft'] is None:
+                    timing['ttft'] = time.perf_counter() - start
+                timing['chars'] += len(delta)
+                yield delta
+        timing['latency'] = time.perf_counter() - start
+        TIMINGS.append(timing)
+        record_llm_call(model, 'chat', timing['latency'], timing['ttft'],
+                        timing['prompt_tokens'], timing['completion_tokens'])
+
+    if container is None:
+        text = ''.join(tokens())
+    else:
+        text = container.write_stream(tokens())
+    if response_cache and text:
+        response_cache.put(key, text)
+    return text
+
+
+# 호출 한 번의 시간과 토큰 수를 instrumentation 히스토그램/카운터에 기록한다
+def record_llm_call(model, kind, latency, ttft=None, prompt_tokens=None, completion_tokens=None):
+    instrumentation.observe('llm_seconds', latency, model=model, kind=kind, cached='0')
+    if ttft is not None:
+        instrumentation.observe('llm_ttft_seconds', ttft, model=model, kind=kind)
+    instrumentation.inc('llm_tokens_total', prompt_tokens or 0, model=model, type='prompt')
+    instrumentation.inc('llm_tokens_total', completion_tokens or 0, model=model, type='completion')
+
+
+# 네트워크 없이 쓰는 프로세스 내 가짜 OpenAI 클라이언트 (벤치마크용, 지연 시간 설정 가능)
+# reply 에 함수를 주면 요청 messages 로 응답 텍스트를 만든다
+class FakeOpenAI:
+    def __init__(self, reply='Day 1: 가벼운 전신 운동으로 시작하세요.', latency=0.0, chunk_size=4, chunk_delay=0.0):
+        self.reply = reply
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.images = SimpleNamespace(generate=self._generate)
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        reply = self.reply(messages) if callable(self.reply) else self.reply
+        prompt_tokens = sum(len(m['content']) for m in messages) // 4
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(reply) // 4,
+                                total_tokens=prompt_tokens + len(reply) // 4)
+        if stream:
+            return self._stream(reply, usage if kwargs.get('stream_options', {}).get('include_usage') else None)
+        message = SimpleNamespace(role='assistant', content=reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason='stop')], usage=usage)
+
+    def _stream(self, reply, usage):
+        for i in range(0, len(reply), self.chunk_size):
+            time.sleep(self.chunk_delay)
+            delta = SimpleNamespace(content=reply[i:i + self.chunk_size])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+        if usage:
+            yield SimpleNamespace(choices=[], usage=usage)
+
+    def _generate(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return SimpleNamespace(data=[SimpleNamespace(b64_json=FAKE_IMAGE_B64, url=None)])
+
+
+# 가짜 이미지 생성 응답 (8x8 PNG)
+FAKE_IMAGE_B64 = 'iVBORw0KGgoAAAANSUhEUgAAAAgAAAAICAIAAABLbSncAAAAFUlEQVR4nGP8v+0gAzbAhFV00EoAAO6ZAobYMv13AAAAAElFTkSuQmCC'
+
+
+# 오프라인 테스트용 OpenAI 호환 서버 (/v1/chat/completions SSE 스트리밍, /v1/images/generations)
+# OpenAI(api_key='fake', base_url=server.base_url) 로 연결한다
+# statuses: 요청마다 앞에서부터 하나씩 꺼내 쓰는 응답 코드 (예: [429, 429] → 처음 두 요청은 한도 초과, 그 뒤는 200)
+class FakeStreamingServer:
+    def __init__(self, reply='안녕하세요, AI 비서입니다. 오늘의 운동 계획입니다.', chunk_size=4,
+                 first_token_delay=0.2, chunk_delay=0.02, image_delay=0.5, statuses=(), retry_after=None):
+        self.reply = reply
+        self.chunk_size = chunk_size
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.image_delay = image_delay
+        self.statuses = deque(statuses)
+        self.retry_after = retry_after
+        self.requests = []
+        self.rejected = 0
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}/v1'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                status = server.statuses.popleft() if server.statuses else 200
+                if status != 200:
+                    server.rejected += 1
+                    headers = {'retry-after': str(server.retry_after)} if server.retry_after is not None else {}
+                    self._send_json({'error': {'message': f'scripted {status}', 'type': 'rate_limit_exceeded',
+                                               'code': status}}, status, headers)
+                    return
+                server.requests.append(body)
+                if self.path.endswith('/images/generations'):
+                    time.sleep(server.image_delay)
+                    self._send_json({'created': int(time.time()), 'data': [{'b64_json': FAKE_IMAGE_B64}]})
+                    return
+                time.sleep(server.first_token_delay)
+                if body.get('stream'):
+                    try:
+                        self._stream(body)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # 클라이언트가 다 읽기 전에 연결을 닫은 경우
+                        pass
+                else:
+                    self._send_json(_completion(body, server.reply))
+
+            def _stream(self, body):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.end_headers()
+                reply = server.reply
+                for i in range(0, len(reply), server.chunk_size):
+                    chunk = _chunk(body['model'], {'content': reply[i:i + server.chunk_size]})
+                    self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+                    self.wfile.flush()
+                    time.sleep(server.chunk_delay)
+                done = _chunk(body['model'], {}, finish_reason='stop')
+                self.wfile.write(f'data: {json.dumps(done)}\n\n'.encode('utf-8'))
+                if body.get('stream_options', {}).get('include_usage'):
+                    usage = dict(_chunk(body['model'], {}), choices=[], usage=_usage(body, reply))
+                    self.wfile.write(f'data: {json.dumps(usage)}\n\n'.encode('utf-8'))
+                self.wfile.write(b'data: [DONE]\n\n')
+
+            def _send_json(self, payload, status=200, headers=None):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def _chunk(model, delta, finish_reason=None):
+    return {
+        'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+    }
+
+
+def _completion(body, content):
+    model = body['model']
+    return {
+        'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': _usage(body, content),
+    }
+
+
+# 토큰 수는 글자 수 / 4 로 흉내 낸다
+def _usage(body, content):
+    prompt_tokens = sum(len(message.get('content') or '') for message in body['messages']) // 4
+    completion_tokens = len(content) // 4
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens}
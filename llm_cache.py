@@ -0,0 +1,97 @@
+import hashlib
+import json
+import re
+import time
+
+from db import connect, transaction
+
+# LLM 응답 디스크 캐시 (SQLite)
+# 키: 모델 + 메시지 + 파라미터를 정규화한 JSON 의 해시, 크기 기준 LRU 제거 + 항목별 TTL
+DB_FILE = 'llm_cache.db'
+MAX_BYTES = 50 * 1024 * 1024
+TTL = 7 * 24 * 60 * 60
+
+
+def _normalize_text(text):
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+# 공백 차이나 파라미터 순서가 달라도 같은 요청이면 같은 키가 되도록 만든다
+def make_key(model, messages, **params):
+    canonical = {
+        'model': model,
+        'messages': [{'role': m['role'], 'content': _normalize_text(m['content'])} for m in messages],
+        'params': {k: v for k, v in params.items() if v is not None},
+    }
+    data = json.dumps(canonical, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, db_file=DB_FILE, max_bytes=MAX_BYTES, ttl=TTL):
+        self.db_file = db_file
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        connect(db_file).executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL,
+                expires REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed);
+            """
+        )
+
+    def get(self, key):
+        conn = connect(self.db_file)
+        now = time.time()
+        row = conn.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None or row['expires'] < now:
+            if row is not None:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.stats['misses'] += 1
+            return None
+        conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        self.stats['hits'] += 1
+        return row['value']
+
+    def put(self, key, value, ttl=None):
+        conn = connect(self.db_file)
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with transaction(conn):
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, accessed, expires) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now + (self.ttl if ttl is None else ttl)),
+            )
+            self._evict(conn, now)
+
+    # 만료된 항목을 지우고, 전체 크기가 max_bytes 를 넘으면 가장 오래 안 쓴 항목부터 지운다
+    def _evict(self, conn, now):
+        self.stats['evictions'] += conn.execute("DELETE FROM responses WHERE expires < ?", (now,)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for row in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            evicted.append((row['key'],))
+            total -= row['size']
+        conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.stats['evictions'] += len(evicted)
+
+
+_default_cache = None
+
+
+# 프로세스 전체에서 함께 쓰는 기본 캐시
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
@@ -0,0 +1,459 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+import weakref
+from types import SimpleNamespace
+
+import instrumentation
+import llm_cache
+
+# 프로세스 전체의 OpenAI 요청 스케줄러
+#  - 분당 요청 수 / 분당 토큰 수 토큰 버킷, 동시에 보내는 요청 수 상한
+#  - 우선순위 차선: 화면에서 기다리는 요청(interactive)이 일괄 생성(batch), 동영상 분류(ingest)보다 먼저 나간다
+#  - 429 / 5xx / 연결 오류는 지수 백오프 + 지터로 다시 시도 (Retry-After 가 있으면 그만큼은 모두 쉰다)
+#  - 같은 요청이 동시에 들어오면 한 번만 보내고 결과(스트리밍이면 청크)를 함께 쓴다 (singleflight)
+# 페이지는 llm.get_client(lane) 로 받은 ScheduledClient 를 원래 OpenAI 클라이언트처럼 쓴다
+
+# gpt-4o 기본 등급 한도에 맞춘 값
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 30000
+MAX_IN_FLIGHT = 8
+MAX_RETRIES = 5
+BASE_DELAY = 0.5
+MAX_DELAY = 20.0
+# max_tokens 가 없는 요청의 응답 토큰 추정값
+DEFAULT_COMPLETION_TOKENS = 500
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+INGEST = 'ingest'
+# 차선 → 우선순위 (작을수록 먼저)
+LANES = {INTERACTIVE: 0, BATCH: 1, INGEST: 2}
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+class TokenBucket:
+    # 1분 동안 per_minute 만큼 차오르고, 최대 1분치까지 모아 둔다
+    def __init__(self, per_minute, now):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = now
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # amount 를 꺼낼 수 있을 때까지 남은 시간 (초)
+    def delay(self, amount, now):
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    # 실제 사용량과 추정값의 차이를 반영 (음수면 돌려받음)
+    def adjust(self, amount):
+        self.level = min(self.capacity, max(-self.capacity, self.level - amount))
+
+
+# 요청 본문 → 분당 토큰 한도에 쓸 추정 토큰 수 (영어 기준 4글자 ≈ 1토큰)
+def estimate_tokens(kwargs):
+    prompt = sum(len(message.get('content') or '') for message in kwargs.get('messages', ())) // 4
+    return prompt + (kwargs.get('max_tokens') or DEFAULT_COMPLETION_TOKENS)
+
+
+# 다시 시도할 오류면 (True, Retry-After 초 또는 None)
+def _retryable(error):
+    status = getattr(error, 'status_code', None)
+    if status == 429 or (status is not None and status >= 500):
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        try:
+            return True, float(headers.get('retry-after'))
+        except (TypeError, ValueError):
+            return True, None
+    try:
+        import openai
+    except ImportError:
+        return False, None
+    return isinstance(error, openai.APIConnectionError), None
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+# 스트리밍 응답을 여러 호출자가 나눠 읽는 버퍼: 먼저 읽는 쪽이 원본에서 청크를 가져와 쌓아 두고, 나머지는 쌓인 것을 읽는다
+# 원본을 다 읽거나 모든 호출자가 그만 읽으면 (읽지 않고 버린 경우 포함) on_close 를 한 번 부른다
+class _SharedStream:
+    def __init__(self, stream, on_chunk, on_close):
+        self._stream = iter(stream)
+        self._source = stream
+        self._on_chunk = on_chunk
+        self._on_close = on_close
+        self._chunks = []
+        self._finished = False
+        self._error = None
+        self._readers = 0
+        self._lock = threading.Lock()
+
+    def _finish(self):
+        if not self._finished:
+            self._finished = True
+            self._on_close()
+
+    def reader(self):
+        return _StreamReader(self)
+
+    def _attach(self):
+        with self._lock:
+            self._readers += 1
+
+    # 마지막 호출자가 다 읽기 전에 그만 읽으면 원본을 닫는다 (뒤늦게 붙은 호출자는 오류를 받는다)
+    def _detach(self):
+        with self._lock:
+            self._readers -= 1
+            if not self._readers and not self._finished:
+                close = getattr(self._source, 'close', None)
+                if close:
+                    close()
+                self._error = RuntimeError('stream was closed before it finished')
+                self._finish()
+
+    # position 번째 청크 (아직 없으면 원본에서 가져온다), 끝이면 StopIteration
+    def _chunk(self, position):
+        with self._lock:
+            if position == len(self._chunks) and not self._finished:
+                try:
+                    chunk = next(self._stream)
+                    self._chunks.append(chunk)
+                    self._on_chunk(chunk)
+                except StopIteration:
+                    self._finish()
+                except Exception as e:
+                    self._error = e
+                    self._finish()
+            if position < len(self._chunks):
+                return self._chunks[position]
+            if self._error is not None:
+                raise self._error
+            raise StopIteration
+
+
+# _SharedStream 을 처음부터 읽는 호출자 하나
+# 다 읽거나 close() 하거나 버려지면 (한 번도 읽지 않았어도) 한 번만 떼어 내서 슬롯이 새지 않게 한다
+class _StreamReader:
+    def __init__(self, shared):
+        self._shared = shared
+        self._position = 0
+        shared._attach()
+        self._detach = weakref.finalize(self, shared._detach)
+        self._detach.atexit = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = self._shared._chunk(self._position)
+        except BaseException:
+            self.close()
+            raise
+        self._position += 1
+        return chunk
+
+    def close(self):
+        self._detach()
+
+
+class Scheduler:
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                 max_in_flight=MAX_IN_FLIGHT, max_retries=MAX_RETRIES, base_delay=BASE_DELAY, max_delay=MAX_DELAY,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.sleep = sleep
+        self.requests = TokenBucket(requests_per_minute, clock())
+        self.tokens = TokenBucket(tokens_per_minute, clock())
+        self.stats = {'calls': 0, 'upstream': 0, 'coalesced': 0, 'retries': 0, 'queued_seconds': 0.0}
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._flights = {}
+
+    # 차례가 되고 (우선순위 → 먼저 온 순서), 동시 요청 수와 두 버킷에 여유가 생길 때까지 기다린다
+    def _acquire(self, ticket, cost):
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    wait = None
+                    if self._waiting[0] == ticket and self._in_flight < self.max_in_flight:
+                        now = self.clock()
+                        wait = max(self.requests.delay(1, now), self.tokens.delay(cost, now), self._paused_until - now)
+                        if wait <= 0:
+                            heapq.heappop(self._waiting)
+                            self.requests.take(1)
+                            self.tokens.take(cost)
+                            self._in_flight += 1
+                            self._cond.notify_all()
+                            return
+                    self._cond.wait(wait)
+            except BaseException:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                raise
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _settle(self, usage, estimate):
+        total = getattr(usage, 'total_tokens', None) if usage is not None else None
+        if total is not None:
+            with self._cond:
+                self.tokens.adjust(total - estimate)
+
+    def _backoff(self, attempt, retry_after):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            # 서버가 알려준 시간 동안은 모든 요청을 멈춘다
+            with self._cond:
+                self._paused_until = max(self._paused_until, self.clock() + retry_after)
+            delay = max(delay, retry_after)
+        return delay
+
+    # send() 를 차례에 맞춰 보내고, 다시 시도할 오류면 백오프 후 재시도
+    # stream=True 면 슬롯을 응답을 다 읽을 때까지 잡아 둔다
+    def _send(self, send, lane, cost, stream):
+        ticket = (LANES[lane], next(self._sequence))
+        for attempt in range(self.max_retries + 1):
+            queued = time.perf_counter()
+            self._acquire(ticket, cost)
+            waited = time.perf_counter() - queued
+            self.stats['queued_seconds'] += waited
+            instrumentation.observe('llm_queue_seconds', waited, lane=lane)
+            released = False
+            try:
+                self.stats['upstream'] += 1
+                response = send()
+                if stream:
+                    released = True
+                    return _SharedStream(response, lambda chunk: self._settle(getattr(chunk, 'usage', None), cost),
+                                         self._release)
+                self._settle(getattr(response, 'usage', None), cost)
+                return response
+            except Exception as e:
+                retry, retry_after = _retryable(e)
+                if not retry or attempt == self.max_retries:
+                    raise
+                self._release()
+                released = True
+                self.stats['retries'] += 1
+                instrumentation.inc('llm_retries_total', lane=lane, status=str(getattr(e, 'status_code', 'error')))
+                self.sleep(self._backoff(attempt, retry_after))
+            finally:
+                if not released:
+                    self._release()
+
+    # key 가 같은 요청이 이미 진행 중이면 그 결과를 함께 쓴다
+    def call(self, send, lane=INTERACTIVE, cost=1, key=None, stream=False):
+        self.stats['calls'] += 1
+        if key is None:
+            result = self._send(send, lane, cost, stream)
+            return result.reader() if stream else result
+
+        with self._cond:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                flight.followers += 1
+                self.stats['coalesced'] += 1
+        if not leader:
+            instrumentation.inc('llm_coalesced_total', lane=lane)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result.reader() if stream else flight.result
+
+        try:
+            flight.result = self._send(send, lane, cost, stream)
+            return flight.result.reader() if stream else flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            # 스트리밍은 시작된 뒤에 온 같은 요청도 쌓인 청크를 처음부터 읽을 수 있다 (원본이 끝날 때까지)
+            if stream and flight.error is None:
+                self._forget_when_finished(key, flight)
+            else:
+                with self._cond:
+                    self._flights.pop(key, None)
+            flight.done.set()
+
+    def _forget_when_finished(self, key, flight):
+        on_close = flight.result._on_close
+
+        def close():
+            with self._cond:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            on_close()
+        flight.result._on_close = close
+
+    def chat(self, client, lane, **kwargs):
+        stream = bool(kwargs.get('stream'))
+        key = llm_cache.make_key(kwargs.get('model'), kwargs.get('messages', []),
+                                 **{k: v for k, v in kwargs.items() if k not in ('model', 'messages')})
+        return self.call(lambda: client.chat.completions.create(**kwargs), lane, estimate_tokens(kwargs), key, stream)
+
+    def image(self, client, lane, **kwargs):
+        key = llm_cache.make_key(kwargs.get('model'), [{'role': 'user', 'content': kwargs.get('prompt', '')}],
+                                 **{k: v for k, v in kwargs.items() if k not in ('model', 'prompt')})
+        return self.call(lambda: client.images.generate(**kwargs), lane, 0, key)
+
+
+# OpenAI 클라이언트와 같은 모양(chat.completions.create, images.generate)으로 스케줄러를 거쳐 보낸다
+class ScheduledClient:
+    def __init__(self, client, scheduler, lane=INTERACTIVE):
+        self.client = client
+        self.scheduler = scheduler
+        self.lane = lane
+        self.chat = SimpleNamespace(completions=SimpleNamespace(
+            create=lambda **kwargs: scheduler.chat(client, lane, **kwargs)))
+        self.images = SimpleNamespace(generate=lambda **kwargs: scheduler.image(client, lane, **kwargs))
+
+    def with_lane(self, lane):
+        return ScheduledClient(self.client, self.scheduler, lane)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = Scheduler()
+    return _scheduler
+
+
+# 프로세스 스케줄러의 한도를 바꾼다 (batch_plans.py 워커는 한도를 워커 수로 나눠 쓴다)
+def configure(**limits):
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = Scheduler(**limits)
+    return _scheduler
+
+
+# 가짜 서버(429 를 섞어 돌려줌)로 재시도 / 동시 요청 합치기 / 우선순위 / 한도를 확인하고 시간을 잰다
+def main():
+    from concurrent.futures import ThreadPoolExecutor
+
+    from openai import OpenAI
+
+    from llm import FakeStreamingServer
+
+    def run(label, scheduler, jobs):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+            results = list(pool.map(lambda job: job(), jobs))
+        print(f'{label:44s} {time.perf_counter() - started:6.2f}s  {scheduler.stats}')
+        return results
+
+    def chat(client, content, stream=False):
+        def job():
+            response = client.chat.completions.create(
+                model='gpt-4o', messages=[{'role': 'user', 'content': content}], stream=stream)
+            if stream:
+                return ''.join(chunk.choices[0].delta.content or '' for chunk in response if chunk.choices)
+            return response.choices[0].message.content
+        return job
+
+    # 처음 3번은 429 (Retry-After 없음) → 백오프 후 성공
+    with FakeStreamingServer(first_token_delay=0.05, chunk_delay=0, statuses=[429, 429, 429]) as server:
+        scheduler = Scheduler(base_delay=0.05)
+        client = ScheduledClient(OpenAI(api_key='fake', base_url=server.base_url, max_retries=0), scheduler)
+        result = run('429 x3 후 성공', scheduler, [chat(client, 'hello')])
+        assert result == [server.reply] and scheduler.stats['retries'] == 3
+
+    # Retry-After: 1 이 붙은 429 → 그 사이 들어온 다른 요청도 함께 1초 쉰다
+    with FakeStreamingServer(first_token_delay=0, chunk_delay=0, statuses=[429], retry_after=1) as server:
+        scheduler = Scheduler()
+        client = ScheduledClient(OpenAI(api_key='fake', base_url=server.base_url, max_retries=0), scheduler)
+        started = time.perf_counter()
+        first = threading.Thread(target=chat(client, 'first'))
+        first.start()
+        time.sleep(0.1)
+        chat(client, 'second')()
+        first.join()
+        print(f'{"Retry-After: 1 (다른 요청도 대기)":44s} {time.perf_counter() - started:6.2f}s  {scheduler.stats}')
+        assert time.perf_counter() - started >= 1.0
+
+    # 같은 요청 20개 동시 → 원본 요청 1번 (스트리밍 포함)
+    with FakeStreamingServer(first_token_delay=0.2, chunk_delay=0.01) as server:
+        raw = OpenAI(api_key='fake', base_url=server.base_url, max_retries=0)
+        scheduler = Scheduler()
+        client = ScheduledClient(raw, scheduler)
+        results = run('같은 요청 20개 동시', scheduler, [chat(client, 'same') for _ in range(20)])
+        assert set(results) == {server.reply} and len(server.requests) == 1
+        scheduler = Scheduler()
+        client = ScheduledClient(raw, scheduler)
+        results = run('같은 스트리밍 요청 20개 동시', scheduler, [chat(client, 'same', stream=True) for _ in range(20)])
+        assert set(results) == {server.reply} and len(server.requests) == 2
+
+    # 동시 요청 2개 제한에서 ingest 10개가 먼저 줄을 서도 interactive 가 먼저 나간다
+    with FakeStreamingServer(first_token_delay=0.1, chunk_delay=0) as server:
+        raw = OpenAI(api_key='fake', base_url=server.base_url, max_retries=0)
+        scheduler = Scheduler(max_in_flight=2)
+        ingest = ScheduledClient(raw, scheduler, INGEST)
+        interactive = ScheduledClient(raw, scheduler, INTERACTIVE)
+        with ThreadPoolExecutor(max_workers=11) as pool:
+            futures = [pool.submit(chat(ingest, f'ingest {i}')) for i in range(10)]
+            time.sleep(0.05)
+            futures.append(pool.submit(chat(interactive, 'interactive')))
+            for future in futures:
+                future.result()
+        order = [body['messages'][0]['content'] for body in server.requests]
+        print(f'{"우선순위 (동시 2개)":44s} interactive 는 {order.index("interactive") + 1}번째로 전송')
+        assert order.index('interactive') <= 3
+
+    # 스트리밍 응답을 읽지 않고 버려도 슬롯과 singleflight 키가 풀린다 (동시 1개 제한에서 다음 요청이 바로 나감)
+    with FakeStreamingServer(first_token_delay=0, chunk_delay=0) as server:
+        scheduler = Scheduler(max_in_flight=1)
+        client = ScheduledClient(OpenAI(api_key='fake', base_url=server.base_url, max_retries=0), scheduler)
+        for i in range(3):
+            client.chat.completions.create(model='gpt-4o', messages=[{'role': 'user', 'content': 'unread'}],
+                                           stream=True)
+        result = run('읽지 않고 버린 스트리밍 3개 뒤 요청', scheduler, [chat(client, 'after', stream=True)])
+        assert result == [server.reply] and scheduler._in_flight == 0 and not scheduler._flights
+
+    # 분당 120 요청 → 버킷(1분치)을 비운 뒤에는 초당 2개
+    with FakeStreamingServer(first_token_delay=0, chunk_delay=0) as server:
+        scheduler = Scheduler(requests_per_minute=120)
+        scheduler.requests.level = 0
+        client = ScheduledClient(OpenAI(api_key='fake', base_url=server.base_url, max_retries=0), scheduler)
+        run('분당 120 요청 한도로 서로 다른 요청 6개', scheduler, [chat(client, f'q{i}') for i in range(6)])
+
+if __name__ == '__main__':
+    main()
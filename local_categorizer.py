@@ -0,0 +1,156 @@
+import csv
+import math
+import re
+import time
+from collections import Counter, defaultdict
+
+from categorizer import TAXONOMY_FILE, format_categories, load_taxonomy
+
+# home_training_categories.csv 와 이미 분류된 동영상 제목으로 만드는 로컬 분류기
+# 문자 n-gram TF-IDF 로 카테고리별 중심 벡터를 만들고, 제목과의 코사인 유사도로 고른다
+LABELLED_CSV_FILE = 'videos1.csv'
+THRESHOLD = 0.4
+SELECT_RATIO = 0.75
+MAX_CATEGORIES = 3
+
+# 카테고리 이름에 없는 자주 쓰이는 키워드 (마지막 단계 카테고리 이름 기준)
+KEYWORDS = {
+    '걷기': ['걷기', 'walk', '워킹'],
+    '뛰기/조깅': ['조깅', '러닝', 'running', 'jogging'],
+    '춤': ['댄스', 'dance', '줌바'],
+    '줄넘기': ['줄넘기', 'jump rope'],
+    '에어로빅': ['에어로빅', '유산소', 'cardio', '칼로리'],
+    '전신 운동': ['전신', 'full body', '덤벨', 'dumbbell', '스쿼트', 'squat', '버피'],
+    '상체 운동': ['상체', 'upper body'],
+    '팔 운동': ['팔뚝', '팔살', 'arm', '이두', '삼두'],
+    '어깨 운동': ['어깨', 'shoulder'],
+    '가슴 운동': ['가슴', 'chest', '푸쉬업', 'push up'],
+    '등 운동': ['등살', 'back'],
+    '하체 운동': ['하체', 'lower body', '런지', 'lunge'],
+    '다리 운동': ['다리', 'leg'],
+    '엉덩이 운동': ['엉덩이', '힙업', 'glute', 'hip'],
+    '허벅지 운동': ['허벅지', '안쪽살', 'thigh'],
+    '복근 운동': ['복근', '뱃살', 'abs', '크런치', 'crunch', '플랭크', 'plank'],
+    '허리 운동': ['허리', '옆구리'],
+    '전신 스트레칭': ['스트레칭', 'stretching', 'warm up', 'cool down'],
+    '목 스트레칭': ['거북목', '목'],
+    '전신 HIIT': ['hiit', '타바타', 'tabata', '인터벌'],
+    '회복 요가': ['요가', 'yoga'],
+    '매트 필라테스': ['필라테스', 'pilates'],
+}
+
+_WORD_RE = re.compile(r'[0-9a-z가-힣]+')
+
+
+# 한국어는 띄어쓰기가 불규칙하고 조사가 붙으므로 단어와 함께 단어 내부의 2·3글자 조각을 특징으로 쓴다
+def tokenize(text):
+    features = []
+    for word in _WORD_RE.findall(text.lower()):
+        features.append(word)
+        for n in (2, 3):
+            features.extend(word[i:i + n] for i in range(len(word) - n + 1))
+    return features
+
+
+# 동영상 category 문자열 ('a,b, c,d,e') → 카테고리 경로 목록
+def parse_categories(category):
+    return [path.strip() for path in re.split(r',\s+', category or '') if path.strip()]
+
+
+def load_labelled_rows(csv_file=LABELLED_CSV_FILE):
+    with open(csv_file, 'r', newline='', encoding='utf-8') as f:
+        return [(row['title'], row['category']) for row in csv.DictReader(f)]
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    return {f: w / norm for f, w in vector.items()} if norm else {}
+
+
+class LocalCategorizer:
+    def __init__(self, labelled_rows=(), taxonomy_file=TAXONOMY_FILE, threshold=THRESHOLD):
+        # 신뢰도가 threshold 이상일 때만 LLM 없이 결과를 쓴다
+        self.threshold = threshold
+        self.taxonomy = load_taxonomy(taxonomy_file)
+        known = set(self.taxonomy)
+
+        # 카테고리별 문서: 카테고리 이름 + 키워드 + 그 카테고리로 분류된 제목들
+        docs = {}
+        for path in self.taxonomy:
+            words = path.split(',') + KEYWORDS.get(path.split(',')[-1], [])
+            docs[path] = Counter(tokenize(' '.join(words)) * 2)
+        for title, category in labelled_rows:
+            for path in parse_categories(category):
+                if path in known:
+                    docs[path].update(tokenize(title))
+
+        df = Counter(f for doc in docs.values() for f in doc)
+        self.idf = {f: math.log((1 + len(docs)) / (1 + n)) + 1 for f, n in df.items()}
+
+        # 특징 → [(카테고리, 가중치)] 역색인으로 점수를 계산한다
+        self.postings = defaultdict(list)
+        for path, doc in docs.items():
+            for f, w in _normalize({f: tf * self.idf[f] for f, tf in doc.items()}).items():
+                self.postings[f].append((path, w))
+
+    # 제목 → (카테고리 경로 목록, 신뢰도 0~1)
+    def predict(self, title):
+        tf = Counter(f for f in tokenize(title) if f in self.idf)
+        vector = _normalize({f: n * self.idf[f] for f, n in tf.items()})
+
+        scores = defaultdict(float)
+        for f, w in vector.items():
+            for path, pw in self.postings[f]:
+                scores[path] += w * pw
+        if not scores:
+            return [], 0.0
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        top = ranked[0][1]
+        selected = [path for path, score in ranked[:MAX_CATEGORIES] if score >= top * SELECT_RATIO]
+        # 상위 카테고리와 하위 카테고리가 함께 뽑히면 더 구체적인 쪽만 남긴다
+        selected = [path for path in selected
+                    if not any(other != path and other.startswith(path + ',') for other in selected)]
+        return selected, top
+
+    def categorize(self, title):
+        categories, confidence = self.predict(title)
+        return format_categories(categories), confidence
+
+
+# 분류된 동영상으로 leave-one-out 정확도를 계산
+def evaluate(labelled_rows, threshold=THRESHOLD):
+    top1 = major = covered = covered_top1 = 0
+    elapsed = 0.0
+    for i, (title, category) in enumerate(labelled_rows):
+        model = LocalCategorizer(labelled_rows[:i] + labelled_rows[i + 1:])
+        gold = parse_categories(category)
+        start = time.perf_counter()
+        predicted, confidence = model.predict(title)
+        elapsed += time.perf_counter() - start
+
+        hit = bool(predicted) and predicted[0] in gold
+        top1 += hit
+        major += bool(predicted) and predicted[0].split(',')[0] in {path.split(',')[0] for path in gold}
+        if confidence >= threshold:
+            covered += 1
+            covered_top1 += hit
+
+    n = len(labelled_rows)
+    return {
+        'rows': n,
+        'top1_accuracy': top1 / n,
+        'major_category_accuracy': major / n,
+        'coverage_at_threshold': covered / n,
+        'top1_accuracy_above_threshold': covered_top1 / covered if covered else 0.0,
+        'mean_predict_us': elapsed / n * 1e6,
+    }
+
+
+def main():
+    report = evaluate(load_labelled_rows())
+    for key, value in report.items():
+        print(f'{key:32s} {value:.3f}' if isinstance(value, float) else f'{key:32s} {value}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+import bisect
+import random
+import time
+from datetime import date
+from itertools import accumulate
+
+import plan_prompt
+
+# exercises.csv 만으로 운동 계획을 만드는 규칙 기반 플래너 (LLM 없이 수 ms, 같은 seed 면 항상 같은 계획)
+#  - 후보는 사이드바 선호도(부위, 장비, 수준)에 맞는 운동, 부위와 장비 조건은 풀지 않는다
+#    (맞는 운동이 하루 운동 수보다 적을 때만 수준 조건을 풀고, 그래도 적으면 pool_notes() 로 알린다)
+#  - 수준별 주간 운동 요일 패턴과 분할(전신 / 상하체 / 밀기·당기기·하체)을 운동하는 날마다 돌려가며 배정
+#  - 4주 단위로 반복 수 → 세트 수를 늘리고, 4주째는 회복 주간으로 줄인다
+#  - 평점이 높은 운동일수록 자주 뽑히고, 최근 일주일 안에 한 운동은 덜 뽑힌다
+#  - 결과는 LLM 계획과 같은 'YYYY-MM-DD: [id] Title 3 x 10; ...' 형식이라 저장 / 달력 / 하루 고치기를 그대로 쓴다
+# LLM 은 선택 사항: polish_messages() 로 초안을 다듬어 달라고 보낼 수 있다
+SEED = 0
+RECENT_DAYS = 7
+# 최근에 한 운동이 다시 뽑혔을 때 그대로 쓸 확률
+RECENT_KEEP = 0.2
+PICK_ATTEMPTS = 8
+STRETCH = '2 x 30 sec'
+
+# 경험 수준 → 주간 패턴 (시작일부터 1 = 운동, 0 = 휴식), 분할, 기본 세트 / 반복, 하루 근력 운동 수, 운동 종류
+LEVEL_SETTINGS = {
+    'Beginner': {'week': (1, 0, 1, 0, 1, 0, 0), 'split': 'full', 'sets': 2, 'reps': 12, 'exercises': 4,
+                 'types': ('Strength',)},
+    'Intermediate': {'week': (1, 1, 0, 1, 1, 0, 0), 'split': 'upper_lower', 'sets': 3, 'reps': 10, 'exercises': 5,
+                     'types': ('Strength', 'Plyometrics')},
+    'Advanced': {'week': (1, 1, 1, 0, 1, 1, 0), 'split': 'push_pull_legs', 'sets': 4, 'reps': 8, 'exercises': 6,
+                 'types': ('Strength', 'Plyometrics', 'Powerlifting', 'Olympic Weightlifting', 'Strongman')},
+}
+
+# 분할에 쓰는 근육 그룹 → exercises.csv BodyPart
+MUSCLE_GROUPS = {
+    'push': ('Chest', 'Shoulders', 'Triceps'),
+    'pull': ('Lats', 'Middle Back', 'Biceps', 'Lower Back', 'Traps', 'Forearms'),
+    'legs': ('Quadriceps', 'Hamstrings', 'Glutes', 'Calves', 'Adductors', 'Abductors'),
+    'core': ('Abdominals', 'Neck'),
+}
+# 분할 → 운동하는 날마다 차례로 돌아가는 세션 (세션 = 근육 그룹 목록)
+SPLITS = {
+    'full': [('push', 'pull', 'legs', 'core')],
+    'upper_lower': [('push', 'pull'), ('legs', 'core')],
+    'push_pull_legs': [('push', 'core'), ('pull',), ('legs', 'core')],
+}
+
+
+class _Pool:
+    # rows: (id, title, rating) 목록, 평점이 높을수록 (1 + rating)^2 에 비례해서 뽑힌다
+    def __init__(self, rows):
+        self.ids = [row[0] for row in rows]
+        self.titles = [row[1].replace(';', ',') for row in rows]
+        self.cumulative = list(accumulate((1.0 + float(row[2])) ** 2 for row in rows))
+
+    def __len__(self):
+        return len(self.ids)
+
+    # chosen (오늘 이미 고른 id) 는 빼고, last_used 기준 최근 운동은 RECENT_KEEP 확률로만 받아들인다
+    def pick(self, rng, chosen, last_used, day_index):
+        if not self.ids:
+            return None
+        for attempt in range(PICK_ATTEMPTS):
+            i = bisect.bisect(self.cumulative, rng.random() * self.cumulative[-1])
+            exercise_id = self.ids[i]
+            if exercise_id in chosen:
+                continue
+            if day_index - last_used.get(exercise_id, -RECENT_DAYS) < RECENT_DAYS and rng.random() > RECENT_KEEP:
+                continue
+            return i
+        for i, exercise_id in enumerate(self.ids):
+            if exercise_id not in chosen:
+                return i
+        return None
+
+
+# 부위 → _Pool (types 에 드는 운동만, 그 부위에 하나도 없으면 모든 종류)
+# 부위마다 DataFrame 을 거르면 느리므로 컬럼을 한 번만 훑는다
+def _pools(df, types):
+    preferred = {}
+    fallback = {}
+    for row in zip(df.index.tolist(), df['Title'].tolist(), df['Rating'].tolist(),
+                   df['BodyPart'].astype(str).tolist(), df['Type'].astype(str).tolist()):
+        (preferred if row[4] in types else fallback).setdefault(row[3], []).append(row)
+    return {body_part: _Pool(preferred.get(body_part) or rows)
+            for body_part, rows in {**fallback, **preferred}.items()}
+
+
+# 세션 목록 (세션 = 부위 묶음 목록)
+# 부위를 고르면 근육 그룹별로 묶어서 세션을 나누고 (전신 분할이거나 그룹이 하나면 모두 한 세션), 아니면 수준별 분할
+def _sessions(target_body_parts, split):
+    if target_body_parts:
+        grouped = [tuple(part for part in parts if part in target_body_parts) for parts in MUSCLE_GROUPS.values()]
+        grouped = [parts for parts in grouped if parts]
+        other = tuple(part for part in target_body_parts
+                      if not any(part in parts for parts in MUSCLE_GROUPS.values()))
+        if other:
+            grouped.append(other)
+        if split == 'full' or len(grouped) <= 1:
+            return [grouped]
+        return [[parts] for parts in grouped]
+    return [[MUSCLE_GROUPS[group] for group in session] for session in SPLITS[split]]
+
+
+# 세션의 근력 운동 칸 → 부위 목록: 묶음을 번갈아 돌고, 같은 묶음 안에서는 rotation 마다 다른 부위부터
+def _slots(session, count, rotation, pools):
+    groups = [parts for parts in ([part for part in parts if len(pools.get(part, ()))] for parts in session) if parts]
+    if not groups:
+        return []
+    return [groups[k % len(groups)][(rotation + k // len(groups)) % len(groups[k % len(groups)])]
+            for k in range(count)]
+
+
+# week 번째 주의 (세트, 반복): 4주 단위로 반복 +2 씩, 다음 4주마다 세트 +1 (최대 +2), 4주째는 회복 주간
+def volume(settings, week):
+    block, position = divmod(week, 4)
+    sets = settings['sets'] + min(block, 2)
+    if position == 3:
+        return max(1, sets - 1), settings['reps']
+    return sets, settings['reps'] + 2 * position
+
+
+def cardio_minutes(week):
+    position = week % 4
+    return 10 if position == 3 else 15 + 5 * position
+
+
+# (부위별 근력 후보, 스트레칭 / 유산소 후보, 알림 목록)
+# 부위와 장비는 항상 지키고, 후보가 하루 운동 수보다 적을 때만 수준 조건을 푼다
+def _candidates(exercises, user_preferences, settings):
+    targets = list(user_preferences.get('target_body_part') or [])
+    equipment = list(user_preferences.get('equipment_available') or [])
+    levels = plan_prompt.LEVELS.get(user_preferences.get('experience_level'), [])
+    notes = []
+
+    matches = plan_prompt.filter_exercises(exercises, targets, equipment, levels)
+    widened = matches
+    if len(matches) < settings['exercises']:
+        widened = plan_prompt.filter_exercises(exercises, targets, equipment, [])
+    if len(widened) > len(matches):
+        matches = widened
+        notes.append(f"Few {user_preferences.get('experience_level')} exercises match the chosen body parts and "
+                     "equipment, so exercises of other levels are included.")
+    if len(matches) < settings['exercises']:
+        notes.append(f"Only {len(matches)} exercise(s) match the chosen body parts and equipment, "
+                     "so workout days are shorter. Add equipment or body parts for a fuller plan.")
+    missing = [part for part in targets if not (matches['BodyPart'] == part).any()]
+    if missing:
+        notes.append(f"No exercises for {', '.join(missing)} with the chosen equipment.")
+
+    # 스트레칭 / 유산소는 부위와 상관없이 장비와 수준만 맞으면 된다
+    general = plan_prompt.filter_exercises(exercises, [], equipment, levels)
+    if not (general['Type'] == 'Stretching').any() or not (general['Type'] == 'Cardio').any():
+        general = plan_prompt.filter_exercises(exercises, [], equipment, [])
+    return matches, general, notes
+
+
+# 선호도로 후보가 부족할 때 사용자에게 보여줄 알림 목록 (없으면 빈 목록)
+def pool_notes(exercises, user_preferences):
+    settings = LEVEL_SETTINGS.get(user_preferences.get('experience_level'), LEVEL_SETTINGS['Beginner'])
+    return _candidates(exercises, user_preferences, settings)[2]
+
+
+# dates ('YYYY-MM-DD' 목록) → {date: 그날 계획 텍스트}, 같은 (선호도, dates, seed) 면 같은 결과
+# 진행 주차와 주간 패턴은 dates 의 첫 날부터 센다
+def plan(exercises, user_preferences, dates, seed=SEED):
+    settings = LEVEL_SETTINGS.get(user_preferences.get('experience_level'), LEVEL_SETTINGS['Beginner'])
+    targets = list(user_preferences.get('target_body_part') or [])
+    matches, general, _ = _candidates(exercises, user_preferences, settings)
+    pools = _pools(matches, settings['types'])
+    stretches = general[general['Type'] == 'Stretching']
+    stretch_pools = _pools(stretches, ('Stretching',))
+    any_stretch = _Pool(list(zip(stretches.index, stretches['Title'], stretches['Rating'])))
+    cardio = general[general['Type'] == 'Cardio']
+    cardio_pool = _Pool(list(zip(cardio.index, cardio['Title'], cardio['Rating'])))
+
+    sessions = _sessions(targets, settings['split'])
+    last_training = max(i for i, on in enumerate(settings['week']) if on)
+    rng = random.Random(seed)
+    last_used = {}
+    session_number = 0
+    first = date.fromisoformat(dates[0]) if dates else None
+    days = {}
+    for day in dates:
+        day_index = (date.fromisoformat(day) - first).days
+        weekday = day_index % 7
+        if not settings['week'][weekday]:
+            days[day] = 'Rest'
+            continue
+        week = day_index // 7
+        sets, reps = volume(settings, week)
+        session = sessions[session_number % len(sessions)]
+        chosen = {}
+        items = []
+        for body_part in _slots(session, settings['exercises'], session_number // len(sessions), pools):
+            pool = pools[body_part]
+            i = pool.pick(rng, chosen, last_used, day_index)
+            if i is not None:
+                chosen[pool.ids[i]] = True
+                items.append(f'[{pool.ids[i]}] {pool.titles[i]} {sets} x {reps}')
+        if weekday == last_training and len(cardio_pool):
+            i = cardio_pool.pick(rng, chosen, last_used, day_index)
+            if i is not None:
+                chosen[cardio_pool.ids[i]] = True
+                items.append(f'[{cardio_pool.ids[i]}] {cardio_pool.titles[i]} {cardio_minutes(week)} min')
+        stretch_pool = next((stretch_pools[part] for parts in session for part in parts if part in stretch_pools),
+                            any_stretch)
+        i = stretch_pool.pick(rng, chosen, last_used, day_index)
+        if i is not None:
+            chosen[stretch_pool.ids[i]] = True
+            items.append(f'[{stretch_pool.ids[i]}] {stretch_pool.titles[i]} {STRETCH}')
+
+        for exercise_id in chosen:
+            last_used[exercise_id] = day_index
+        session_number += 1
+        days[day] = '; '.join(items) if items else 'Rest'
+    return days
+
+
+# 초안을 LLM 으로 다듬을 때의 요청 (날 / 휴식일 / 운동 수는 그대로 두고 운동 교체와 세트·반복 조정만)
+# draft_lines / context_lines 는 'Day N: ...' (plan_prompt.day_labels), 응답은 plan_prompt.relative_to_dates 로 날짜에 맞춘다
+def polish_messages(user_preferences, draft_lines, candidate_lines, context_lines=(), instruction=None):
+    extra = ''
+    if context_lines:
+        extra += ("Neighbouring days (already final, do not repeat their exercises):\n"
+                  + '\n'.join(context_lines) + '\n')
+    if instruction:
+        extra += f"Change request: {instruction}\n"
+    return [
+        {"role": "system", "content": (
+            "You are a fitness coach. You are given a draft plan built from an exercise catalog. "
+            "Keep every day, keep rest days as rest and keep about the same number of exercises per day. "
+            "You may swap an exercise for a better fitting one from the catalog (always keep the [id] prefix) "
+            "and adjust sets and reps. Reply with one line per day in the same form "
+            "'Day N: [id] Title sets x reps; ...' or 'Day N: Rest' and no extra commentary."
+        )},
+        {"role": "user", "content": (
+            f"Preferences: {user_preferences}\n"
+            f"{extra}"
+            f"Draft:\n" + '\n'.join(draft_lines) + '\n'
+            f"Catalog (id | title | body part | equipment | level | type | rating):\n" + '\n'.join(candidate_lines)
+        )},
+    ]
+
+
+# 수준 / 부위 / 장비 조합별 30일 계획 생성 시간과 재현성, 부위 / 장비 / 수준 조건, 주차별 볼륨 확인
+def main(days=30, repeat=20):
+    import exercise_catalog
+
+    exercises = exercise_catalog.load_exercises()
+    dates = plan_prompt.plan_dates(date(2026, 11, 2), days)
+    cases = [
+        {'experience_level': 'Beginner', 'target_body_part': [], 'equipment_available': []},
+        {'experience_level': 'Intermediate', 'target_body_part': ['Chest', 'Quadriceps', 'Abdominals'],
+         'equipment_available': ['Dumbbell', 'Cable']},
+        {'experience_level': 'Advanced', 'target_body_part': [], 'equipment_available': ['Barbell', 'Dumbbell']},
+        {'experience_level': 'Advanced', 'target_body_part': ['Biceps', 'Triceps'],
+         'equipment_available': ['Dumbbell']},
+        # 조건에 맞는 운동이 몇 개 없는 경우: 장비와 부위는 그대로 지키고 알림을 남긴다
+        {'experience_level': 'Beginner', 'target_body_part': ['Forearms'], 'equipment_available': ['Bands']},
+        {'experience_level': 'Advanced', 'target_body_part': ['Neck'], 'equipment_available': ['Kettlebells']},
+    ]
+    for preferences in cases:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = plan(exercises, preferences, dates)
+            samples.append(time.perf_counter() - start)
+        samples.sort()
+        assert result == plan(exercises, preferences, dates, seed=SEED)
+        assert result != plan(exercises, preferences, dates, seed=SEED + 1)
+
+        used = [exercise_id for content in result.values() for exercise_id in plan_prompt.exercise_ids(content)]
+        allowed = set(preferences['equipment_available']) | set(plan_prompt.ALWAYS_AVAILABLE_EQUIPMENT)
+        off_equipment = sum(1 for exercise_id in used
+                            if preferences['equipment_available'] and exercises.at[exercise_id, 'Equipment'] not in allowed)
+        strength = [exercise_id for exercise_id in used
+                    if exercises.at[exercise_id, 'Type'] not in ('Stretching', 'Cardio')]
+        off_body_part = sum(1 for exercise_id in strength
+                            if preferences['target_body_part']
+                            and exercises.at[exercise_id, 'BodyPart'] not in preferences['target_body_part'])
+        notes = pool_notes(exercises, preferences)
+        relaxed = any('other levels' in note for note in notes)
+        off_level = sum(1 for exercise_id in used if not relaxed
+                        and exercises.at[exercise_id, 'Level'] not in plan_prompt.LEVELS[preferences['experience_level']])
+        rest = sum(1 for content in result.values() if content == 'Rest')
+        rated = sum(1 for exercise_id in used if exercises.at[exercise_id, 'Rating'] > 0) / max(1, len(used))
+        weeks = ' '.join('{}x{}'.format(*volume(LEVEL_SETTINGS[preferences['experience_level']], week))
+                         for week in range((days + 6) // 7))
+        print(f"{preferences['experience_level']:12s} 부위 {len(preferences['target_body_part'])} "
+              f"장비 {len(preferences['equipment_available'])}  p50 {samples[len(samples) // 2] * 1000:5.1f}ms  "
+              f"휴식 {rest:2d}일  운동 {len(used):3d}개 (서로 다른 {len(set(used)):3d}, 평점 있음 {rated:.0%})  "
+              f"장비 밖 {off_equipment}  부위 밖 {off_body_part}  수준 밖 {off_level}  주차별 {weeks}")
+        for note in notes:
+            print(f'  알림: {note}')
+        assert off_equipment == 0 and off_body_part == 0 and off_level == 0
+    print(next(iter(result.items())))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import re
+from datetime import date, timedelta
+from itertools import zip_longest
+
+from llm import stream_chat
+
+# generate_workout_plan 용 후보 운동 검색 및 프롬프트 구성
+TOP_K = 40
+TOKEN_BUDGET = 1200
+TOKENS_PER_DAY = 70
+MODEL = 'gpt-4o'
+
+# 사이드바의 계획 기간 → 일수
+DURATION_DAYS = {'1 Week': 7, '2 Weeks': 14, '3 Weeks': 21, '1 Month': 30}
+
+# 사이드바의 경험 수준 → 사용할 수 있는 exercises.csv Level 값
+LEVELS = {
+    'Beginner': ['Beginner'],
+    'Intermediate': ['Beginner', 'Intermediate'],
+    'Advanced': ['Beginner', 'Intermediate', 'Expert'],
+}
+# 장비가 없어도 할 수 있는 운동은 항상 후보에 포함
+ALWAYS_AVAILABLE_EQUIPMENT = ['Body Only']
+# 프롬프트에는 나이를 이 단위로 묶어서 넣는다 (한두 살 차이로 응답 캐시가 갈리지 않도록)
+AGE_BUCKET = 10
+
+_PLAN_LINE_RE = re.compile(r'^\W*(\d{4}-\d{2}-\d{2})[*:\s-]*(.*)$')
+_RELATIVE_LINE_RE = re.compile(r'^\W*Day\s*(\d+)[*:\s-]*(.*)$', re.IGNORECASE)
+_EXERCISE_ID_RE = re.compile(r'^\[\d+\]\s*')
+_EXERCISE_REF_RE = re.compile(r'\[(\d+)\]')
+
+
+# start_date 부터 days 일의 'YYYY-MM-DD' 목록
+def plan_dates(start_date, days):
+    return [(start_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+
+
+# 대략적인 토큰 수 (영어 기준 4글자 ≈ 1토큰)
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+# 프롬프트에 넣는 선호도: 이름은 빼고 나이는 '30s' 처럼 묶는다 (같은 조건의 사용자끼리 응답 캐시를 나눠 쓰도록)
+def prompt_preferences(user_preferences):
+    preferences = {key: value for key, value in user_preferences.items() if key not in ('name', 'age')}
+    age = user_preferences.get('age') or 0
+    if age > 0:
+        preferences['age'] = f'{int(age) // AGE_BUCKET * AGE_BUCKET}s'
+    return preferences
+
+
+# 부위 / 장비 / 수준 조건에 모두 맞는 운동 (빈 조건은 거르지 않는다, 장비는 Body Only 를 항상 포함)
+def filter_exercises(df, body_parts, equipment, levels):
+    mask = df['Title'] != ''
+    if body_parts:
+        mask &= df['BodyPart'].isin(body_parts)
+    if equipment:
+        mask &= df['Equipment'].isin(list(equipment) + ALWAYS_AVAILABLE_EQUIPMENT)
+    if levels:
+        mask &= df['Level'].isin(levels)
+    return df[mask]
+
+
+# 선호도에 맞는 운동 전체 (조건에 맞는 운동이 너무 적으면 수준 → 장비 순서로 조건을 완화한다)
+def matching_exercises(df, user_preferences, k=TOP_K):
+    body_parts = user_preferences.get('target_body_part') or []
+    equipment = user_preferences.get('equipment_available') or []
+    levels = LEVELS.get(user_preferences.get('experience_level'), [])
+
+    for relaxed in ((equipment, levels), (equipment, []), ([], [])):
+        matches = filter_exercises(df, body_parts, *relaxed)
+        if len(matches) >= k // 2:
+            break
+    return matches
+
+
+# 선호도에 맞는 운동을 평점순으로 고르되, (부위, 종류) 그룹을 번갈아 뽑아 한쪽으로 치우치지 않게 한다
+def retrieve_candidates(df, user_preferences, k=TOP_K):
+    ranked = matching_exercises(df, user_preferences, k).sort_values('Rating', ascending=False, kind='stable')
+    groups = [group.index for _, group in ranked.groupby(['BodyPart', 'Type'], observed=True, sort=False)]
+    picked = [i for row in zip_longest(*groups) for i in row if i is not None][:k]
+    return ranked.loc[picked]
+
+
+def format_candidate(exercise_id, row):
+    rating = f' | {row["Rating"]:.1f}' if row['Rating'] > 0 else ''
+    return f'{exercise_id} | {row["Title"]} | {row["BodyPart"]} | {row["Equipment"]} | {row["Level"]} | {row["Type"]}{rating}'
+
+
+# 토큰 예산 안에 들어가는 만큼만 후보 운동을 한 줄씩 넣는다
+def pack_candidates(candidates, token_budget=TOKEN_BUDGET):
+    lines = []
+    used = 0
+    for exercise_id, row in candidates.iterrows():
+        line = format_candidate(exercise_id, row)
+        cost = estimate_tokens(line) + 1
+        if used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+    return lines
+
+
+# 이어지는 기간이면 'Dates: 시작 to 끝', 일부 날짜만 다시 만들 때는 날짜를 나열한다
+def _dates_line(dates):
+    if dates == plan_dates(date.fromisoformat(dates[0]), len(dates)):
+        return f"Dates: {dates[0]} to {dates[-1]} ({len(dates)} days)"
+    return f"Dates: {', '.join(dates)} ({len(dates)} days, reply only for these dates)"
+
+
+# 계획 전체 날짜 → {date: 'Day N'} (계획 첫날이 Day 1)
+def day_labels(plan_dates):
+    return {day: f'Day {i}' for i, day in enumerate(plan_dates, 1)}
+
+
+# 'Day N' 번호로 'Days: Day 1 to Day N', 일부 날만 다시 만들 때는 그 범위나 번호를 나열한다
+def _days_line(dates, plan_dates):
+    labels = day_labels(plan_dates)
+    numbers = [int(labels[day][4:]) for day in dates]
+    if numbers == list(range(numbers[0], numbers[0] + len(numbers))):
+        if numbers[0] == 1:
+            return f"Days: Day 1 to Day {numbers[-1]} ({len(numbers)} days)"
+        if len(numbers) > 1:
+            return f"Days: Day {numbers[0]} to Day {numbers[-1]} ({len(numbers)} days, reply only for these days)"
+    return f"Days: {', '.join(labels[day] for day in dates)} ({len(numbers)} days, reply only for these days)"
+
+
+# context_lines: 다시 만들지 않는 이웃 날짜의 계획 ('YYYY-MM-DD: ...'), instruction: 사용자가 요청한 수정 사항
+# relative_to: 계획 전체 날짜 목록을 주면 날짜 대신 그 안의 'Day N' 번호로 묻는다
+#   (시작 날짜가 달라도 같은 프롬프트라 응답 캐시를 나눠 쓴다, context_lines 도 'Day N: ...', 응답은 relative_to_dates 로)
+def build_messages(user_preferences, dates, candidate_lines, context_lines=(), instruction=None, relative_to=None):
+    catalog = '\n'.join(candidate_lines)
+    if relative_to is not None:
+        dates_line = _days_line(dates, relative_to)
+        line_form = "'Day N: [id] Title sets x reps; ...' or 'Day N: Rest'"
+    else:
+        dates_line = _dates_line(dates)
+        line_form = "'YYYY-MM-DD: [id] Title sets x reps; ...' or 'YYYY-MM-DD: Rest'"
+    extra = ''
+    if context_lines:
+        extra += ("Already planned days (keep them as they are and avoid repeating their exercises on "
+                  "neighbouring days):\n" + '\n'.join(context_lines) + '\n')
+    if instruction:
+        extra += f"Change request: {instruction}\n"
+    return [
+        {"role": "system", "content": (
+            "You are a fitness coach. Build plans only from the exercise catalog given by the user. "
+            f"Reply with one line per day in the form {line_form}. "
+            "Use at most 5 exercises per day and no extra commentary."
+        )},
+        {"role": "user", "content": (
+            f"Preferences: {user_preferences}\n"
+            f"{dates_line}\n"
+            f"{extra}"
+            f"Catalog (id | title | body part | equipment | level | type | rating):\n{catalog}"
+        )},
+    ]
+
+
+# 응답 길이 상한: 하루에 한 줄이면 충분하다
+def max_tokens_for(dates):
+    return TOKENS_PER_DAY * len(dates) + 100
+
+
+# 'YYYY-MM-DD: [id] Title sets x reps; ...' 형식의 응답 → 날짜별 항목 목록 (계획 기간 밖의 날짜는 무시)
+def parse_plan(plan, dates):
+    dates = set(dates)
+    entries = []
+    for line in plan.splitlines():
+        match = _PLAN_LINE_RE.match(line.strip())
+        if not match or match.group(1) not in dates:
+            continue
+        for item in match.group(2).split(';'):
+            item = item.strip()
+            if item:
+                entries.append({'date': match.group(1), 'title': _EXERCISE_ID_RE.sub('', item), 'detail': item})
+    return entries
+
+
+# 응답 → {날짜: 'YYYY-MM-DD: ' 뒤의 내용} (날짜마다 첫 줄만, 계획 기간 밖의 날짜는 무시)
+def parse_plan_days(plan, dates):
+    dates = set(dates)
+    days = {}
+    for line in plan.splitlines():
+        match = _PLAN_LINE_RE.match(line.strip())
+        if match and match.group(1) in dates and match.group(1) not in days and match.group(2).strip():
+            days[match.group(1)] = match.group(2).strip()
+    return days
+
+
+# 'Day N' 으로 물은 응답 → 'YYYY-MM-DD: ...' 줄 텍스트 (N 은 dates 의 N 번째 날, 범위 밖은 버린다)
+def relative_to_dates(plan, dates):
+    lines = []
+    for line in plan.splitlines():
+        match = _RELATIVE_LINE_RE.match(line.strip())
+        if match and 1 <= int(match.group(1)) <= len(dates):
+            lines.append(f'{dates[int(match.group(1)) - 1]}: {match.group(2).strip()}')
+    return '\n'.join(lines)
+
+
+# 하루 계획에 나온 운동 id 목록 ('[12] Squat 3 x 12; ...' → [12])
+def exercise_ids(content):
+    return sorted({int(exercise_id) for exercise_id in _EXERCISE_REF_RE.findall(content)})
+
+
+# 후보 검색 → 프롬프트 구성 → 스트리밍 요청 (batch_plans.py), 반환값은 'YYYY-MM-DD: ...' 줄 텍스트
+# 프롬프트에는 이름 / 정확한 나이 / 날짜가 없어서 같은 조건의 사용자끼리 응답 캐시를 나눠 쓴다
+def generate_plan(client, exercises, user_preferences, dates, container=None, cache=True, refresh=False):
+    candidates = retrieve_candidates(exercises, user_preferences)
+    messages = build_messages(prompt_preferences(user_preferences), dates, pack_candidates(candidates),
+                              relative_to=dates)
+    plan = stream_chat(client, messages, MODEL, container=container, cache=cache, refresh=refresh,
+                       max_tokens=max_tokens_for(dates))
+    return relative_to_dates(plan, dates)
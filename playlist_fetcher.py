@@ -0,0 +1,130 @@
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import instrumentation
+
+# 재생목록 동영상 메타데이터를 병렬로 가져오는 모듈
+MAX_WORKERS = 8
+RETRIES = 2
+TIMEOUT = 30
+BACKOFF = 0.5
+
+FetchResult = namedtuple('FetchResult', ['video_id', 'record', 'error'])
+
+
+# pytube YouTube 객체의 속성 접근은 각각 네트워크 요청을 일으키므로 작업 스레드 안에서 모두 읽는다
+def fetch_video_metadata(video):
+    return {
+        'video_id': video.video_id,
+        'title': video.title,
+        'url': video.watch_url,
+        'length': video.length,
+        'author': video.author,
+        'channel_url': video.channel_url,
+        'views': video.views,
+    }
+
+
+def _fetch_with_retry(video, started, retries, backoff):
+    started[video.video_id] = time.monotonic()
+    for attempt in range(retries + 1):
+        try:
+            with instrumentation.span('pytube_fetch_seconds'):
+                return fetch_video_metadata(video)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt))
+
+
+# 완료되는 순서대로 FetchResult 를 내보내는 제너레이터
+# 동시에 실행되는 요청은 max_workers 개로 제한되고, timeout 초를 넘긴 항목은 실패로 처리한다
+def iter_video_metadata(videos, max_workers=MAX_WORKERS, retries=RETRIES, timeout=TIMEOUT, backoff=BACKOFF):
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    started = {}
+    try:
+        pending = {pool.submit(_fetch_with_retry, video, started, retries, backoff): video.video_id
+                   for video in videos}
+        while pending:
+            done, _ = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                video_id = pending.pop(future)
+                try:
+                    yield FetchResult(video_id, future.result(), None)
+                except Exception as e:
+                    yield FetchResult(video_id, None, e)
+
+            # 재시도를 포함해 너무 오래 걸리는 항목은 기다리지 않는다
+            now = time.monotonic()
+            for future, video_id in list(pending.items()):
+                if video_id in started and now - started[video_id] > timeout:
+                    pending.pop(future)
+                    future.cancel()
+                    yield FetchResult(video_id, None, TimeoutError(f'{video_id}: {timeout}초 초과'))
+    finally:
+        # 멈춘 요청이 있어도 호출한 쪽(Streamlit 스크립트)은 바로 돌아간다
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# 로컬 벤치마크용 가짜 재생목록 (pytube Playlist 처럼 .videos 를 제공)
+class FakeVideo:
+    def __init__(self, index, latency, failure_rate, rng, id_prefix='fake'):
+        self.video_id = f'{id_prefix}{index:07d}'
+        self.watch_url = f'https://youtube.com/watch?v={self.video_id}'
+        self.channel_url = 'https://www.youtube.com/channel/fake'
+        self._index = index
+        self._latency = latency
+        self._fail = rng.random() < failure_rate
+
+    # pytube 처럼 속성마다 요청 지연이 생긴다
+    def _fetch(self, value):
+        time.sleep(self._latency)
+        if self._fail:
+            self._fail = False
+            raise ConnectionError(f'{self.video_id}: 일시적 오류')
+        return value
+
+    @property
+    def title(self):
+        return self._fetch(f'전신운동 {self._index} | 홈트')
+
+    @property
+    def length(self):
+        return self._fetch(300 + (self._index * 37) % 900)
+
+    @property
+    def author(self):
+        return self._fetch('Fake HomeFit')
+
+    @property
+    def views(self):
+        return self._fetch(1000 + self._index)
+
+
+class FakePlaylist:
+    def __init__(self, size=50, latency=0.05, failure_rate=0.0, seed=0, id_prefix='fake'):
+        rng = random.Random(seed)
+        self.videos = [FakeVideo(i, latency, failure_rate, rng, id_prefix) for i in range(size)]
+
+
+def main():
+    size, latency = 40, 0.02
+
+    start = time.perf_counter()
+    for video in FakePlaylist(size, latency).videos:
+        fetch_video_metadata(video)
+    serial = time.perf_counter() - start
+    print(f'직렬       {size / serial:7.1f} videos/s  ({serial:.2f}s)')
+
+    for workers in (4, 8, 16):
+        playlist = FakePlaylist(size, latency, failure_rate=0.1)
+        start = time.perf_counter()
+        results = list(iter_video_metadata(playlist.videos, max_workers=workers, backoff=0.01))
+        elapsed = time.perf_counter() - start
+        failed = sum(1 for r in results if r.error)
+        print(f'workers={workers:2d} {len(results) / elapsed:7.1f} videos/s  ({elapsed:.2f}s, 실패 {failed})')
+
+if __name__ == '__main__':
+    main()
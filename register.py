@@ -1,15 +1,12 @@
 import streamlit as st
-import csv
-import os
 
-# CSV 파일 경로 설정
-CSV_FILE = "users.csv"
+import instrumentation
+import user_store
 
-# CSV 파일이 없으면 빈 파일 생성 및 헤더 추가
-if not os.path.exists(CSV_FILE):
-    with open(CSV_FILE, mode='w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['user_id', 'password', 'name', 'age', 'gender', 'height', 'weight'])
+instrumentation.begin_rerun('register')
+
+# 사용자 DB 준비 (기존 users.csv 가 있으면 최초 한 번 가져옴)
+user_store.init_db()
 
 # 회원가입 폼
 def register_form():
@@ -29,19 +26,11 @@ def register_form():
         if not user_id or not name or not password:
             st.error("모든 필드를 입력하세요.")
         else:
-            # 사용자 ID가 이미 존재하는지 확인
-            with open(CSV_FILE, mode='r', newline='', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['user_id'] == user_id:
-                        st.error("이미 존재하는 사용자 ID입니다.")
-                        return
-            
-            # 사용자 ID가 존재하지 않으면 CSV 파일에 추가
-            with open(CSV_FILE, mode='a', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([user_id, password, name, "null", gender, "null", "null"])
-            
+            # 사용자 ID가 이미 존재하면 추가되지 않음
+            if not user_store.add_user(user_id, password, name, gender):
+                st.error("이미 존재하는 사용자 ID입니다.")
+                return
+
             st.success(f"환영합니다, {name}! 회원가입 성공!")
             st.write("로그인 페이지로 이동합니다...")
 
@@ -60,31 +49,21 @@ def login_form():
         login_button = st.form_submit_button(label="로그인")
 
     if login_button:
-        with open(CSV_FILE, mode='r', newline='', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['user_id'] == user_id and row['password'] == user_password:
-                    st.success(f"환영합니다, {row['name']}!")
-                    st.session_state['logged_in_user'] = user_id
-                    st.session_state['current_page'] = 'My Page'
-                    st.experimental_rerun()
-                    return
-            else:
-                st.error("잘못된 사용자 ID 또는 비밀번호입니다.")
+        user = user_store.check_login(user_id, user_password)
+        if user:
+            st.success(f"환영합니다, {user['name']}!")
+            st.session_state['logged_in_user'] = user_id
+            st.session_state['current_page'] = 'My Page'
+            st.experimental_rerun()
+        else:
+            st.error("잘못된 사용자 ID 또는 비밀번호입니다.")
 
 # 마이 페이지 폼
 def my_page_form():
     st.subheader("My Page")
 
     user_id = st.session_state['logged_in_user']
-    user_info = None
-
-    with open(CSV_FILE, mode='r', newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row['user_id'] == user_id:
-                user_info = row
-                break
+    user_info = user_store.get_user(user_id)
 
     if user_info:
         name = user_info['name']
@@ -108,24 +87,9 @@ def my_page_form():
             save_user_info(user_id, name, gender, age or "null", height or "null", weight or "null")
             st.success("정보가 성공적으로 저장되었습니다.")
 
-# 사용자 정보를 CSV 파일에 저장하는 함수
+# 사용자 정보를 DB에 저장하는 함수 (해당 사용자 한 행만 갱신)
 def save_user_info(user_id, name, gender, age, height, weight):
-    rows = []
-    with open(CSV_FILE, mode='r', newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row['user_id'] == user_id:
-                row['name'] = name
-                row['gender'] = gender
-                row['age'] = age
-                row['height'] = height
-                row['weight'] = weight
-            rows.append(row)
-    
-    with open(CSV_FILE, mode='w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=rows[0].keys())
-        writer.writeheader()
-        writer.writerows(rows)
+    user_store.update_user(user_id, name=name, gender=gender, age=age, height=height, weight=weight)
 
 def main():
     st.title("Membership System")
@@ -157,4 +121,5 @@ def main():
     
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
+    instrumentation.end_rerun()
\ No newline at end of file
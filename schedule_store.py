@@ -0,0 +1,114 @@
+import random
+import time
+from datetime import date, timedelta
+
+import instrumentation
+from db import connect, transaction
+
+# 날짜별 운동 계획 저장소 (user_id, date) 순서로 저장되어 한 달치를 범위 조회 한 번으로 가져온다
+DB_FILE = 'schedule.db'
+
+# 계획 출처
+PT_PLAN = 'pt_plan'          # cal.py 의 AI 운동 계획
+VIDEO_PLAN = 'video_plan'    # app_f.py 의 동영상 운동 계획
+
+
+def init_db(db_file=DB_FILE):
+    connect(db_file).execute(
+        "CREATE TABLE IF NOT EXISTS plan_entries ("
+        "user_id TEXT NOT NULL, date TEXT NOT NULL, source TEXT NOT NULL, position INTEGER NOT NULL, "
+        "title TEXT NOT NULL, detail TEXT, "
+        "PRIMARY KEY (user_id, date, source, position)) WITHOUT ROWID"
+    )
+
+
+# entries: [{'date': 'YYYY-MM-DD', 'title': ..., 'detail': ...}, ...]
+# 같은 출처의 기존 계획 중 새 계획 기간과 겹치는 날짜는 새 계획으로 바꾼다
+def save_plan(user_id, source, entries, db_file=DB_FILE):
+    if not entries:
+        return 0
+    conn = connect(db_file)
+    with transaction(conn):
+        return _replace_plan(conn, user_id, source, entries)
+
+
+# plans: [(user_id, source, entries), ...] 를 트랜잭션 하나로 저장 (batch_plans.py 의 일괄 쓰기)
+def save_plans(plans, db_file=DB_FILE):
+    conn = connect(db_file)
+    with transaction(conn):
+        return sum(_replace_plan(conn, user_id, source, entries) for user_id, source, entries in plans)
+
+
+def _replace_plan(conn, user_id, source, entries):
+    if not entries:
+        return 0
+    dates = sorted({entry['date'] for entry in entries})
+    positions = {}
+    rows = []
+    for entry in entries:
+        position = positions.get(entry['date'], 0)
+        positions[entry['date']] = position + 1
+        rows.append((user_id, entry['date'], source, position, entry['title'], entry.get('detail')))
+    conn.execute(
+        "DELETE FROM plan_entries WHERE user_id = ? AND date BETWEEN ? AND ? AND source = ?",
+        (user_id, dates[0], dates[-1], source),
+    )
+    conn.executemany(
+        "INSERT INTO plan_entries (user_id, date, source, position, title, detail) VALUES (?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    return len(rows)
+
+
+def get_entries(user_id, start, end, db_file=DB_FILE):
+    return [dict(row) for row in connect(db_file).execute(
+        "SELECT date, source, position, title, detail FROM plan_entries "
+        "WHERE user_id = ? AND date >= ? AND date < ? ORDER BY date, source, position",
+        (user_id, start, end),
+    )]
+
+
+def _month_range(year, month):
+    start = date(year, month, 1)
+    end = date(year + (month == 12), month % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+# 한 달치 계획 → {'YYYY-MM-DD': [제목, ...]} (calendar_view 의 annotations 형식)
+def get_month_annotations(user_id, year, month, db_file=DB_FILE):
+    annotations = {}
+    with instrumentation.span('db_query_seconds', query='get_month_annotations'):
+        entries = get_entries(user_id, *_month_range(year, month), db_file=db_file)
+    for entry in entries:
+        annotations.setdefault(entry['date'], []).append(entry['title'])
+    return annotations
+
+
+# 사용자 수 × 기간이 큰 경우의 월 조회 지연 시간 측정
+def main(db_file='schedule_bench.db', users=2000, years=3, per_day=3):
+    init_db(db_file)
+    conn = connect(db_file)
+    start_day = date(2024, 1, 1)
+    days = 365 * years
+    if conn.execute("SELECT COUNT(*) FROM plan_entries").fetchone()[0] == 0:
+        start = time.perf_counter()
+        with transaction(conn):
+            conn.executemany(
+                "INSERT INTO plan_entries (user_id, date, source, position, title, detail) VALUES (?, ?, ?, ?, ?, ?)",
+                ((f'user{u}', (start_day + timedelta(days=d)).isoformat(), PT_PLAN, p, f'Exercise {p}', None)
+                 for u in range(users) for d in range(days) for p in range(per_day)),
+            )
+        print(f'{users * days * per_day:,} entries 생성: {time.perf_counter() - start:.1f}s')
+
+    rng = random.Random(0)
+    samples = []
+    for _ in range(1000):
+        year = 2024 + rng.randrange(years)
+        started = time.perf_counter()
+        get_month_annotations(f'user{rng.randrange(users)}', year, rng.randint(1, 12), db_file=db_file)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    print(f'월 조회 p50 {samples[500] * 1000:.2f}ms  p99 {samples[990] * 1000:.2f}ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,300 @@
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+import exercise_catalog
+import video_store
+from local_categorizer import tokenize
+
+# "비슷한 동영상" / "이 동영상에 나오는 운동" 근사 최근접 이웃 색인 (네트워크 없이 로컬 계산)
+# 제목(운동은 Title/BodyPart/Equipment/Desc 첫 문장)을 단어 + 2·3글자 조각으로 나눠
+# DIM 차원으로 해싱한 TF-IDF 벡터로 만들고, 무작위 ±1 투영 LSH 로 후보를 고른 뒤 코사인 유사도로 정렬한다
+# 동영상은 처음에 한 번 색인하고, 이후에는 새로 저장된 동영상(videos.id 가 마지막 값보다 큰 것)만 추가한다
+DIM = 1 << 15
+TABLES = 10
+BITS = 10
+SEED = 0
+# 이보다 낮은 유사도는 결과에서 뺀다
+MIN_SCORE = 0.1
+
+# 한국어 제목과 영어 운동 데이터를 잇는 용어 (제목에 왼쪽 말이 들어 있으면 오른쪽 말을 덧붙여 특징을 만든다)
+TERMS = {
+    '스쿼트': 'squat', '런지': 'lunge', '플랭크': 'plank', '크런치': 'crunch', '버피': 'burpee',
+    '푸쉬업': 'push-up', '푸시업': 'push-up', '팔굽혀펴기': 'push-up', '브릿지': 'bridge', '점핑잭': 'jumping jack',
+    '마운틴클라이머': 'mountain climber', '데드리프트': 'deadlift', '레그레이즈': 'leg raise', '킥백': 'kickback',
+    '복근': 'abs abdominals', '뱃살': 'abdominals', '코어': 'core abdominals', '옆구리': 'obliques',
+    '허벅지': 'thigh quadriceps', '안쪽살': 'thigh adductors', '안벅지': 'thigh adductors',
+    '엉덩이': 'glutes', '힙': 'glutes hip', '골반': 'hip', '고관절': 'hip', '하체': 'legs quadriceps glutes',
+    '다리': 'legs', '종아리': 'calves', '팔뚝': 'arms triceps', '팔운동': 'arms biceps triceps',
+    '어깨': 'shoulders', '숄더': 'shoulders', '가슴': 'chest', '허리': 'lower back', '굽은등': 'back',
+    '거북목': 'neck', '스트레칭': 'stretch stretching', '덤벨': 'dumbbell', '케틀벨': 'kettlebell',
+    '밴드': 'band', '유산소': 'cardio', '필라테스': 'pilates', '요가': 'yoga', '타바타': 'tabata',
+}
+
+# 특징 차원별 ±1 투영 (TABLES*BITS, DIM)
+_SIGNS = np.where(np.random.default_rng(SEED).random((TABLES * BITS, DIM)) < 0.5, -1, 1).astype(np.float32)
+_BIT_WEIGHTS = 1 << np.arange(BITS)
+
+
+def expand(text):
+    text = (text or '').lower()
+    extra = [english for korean, english in TERMS.items() if korean in text]
+    return ' '.join([text] + extra)
+
+
+@lru_cache(maxsize=200000)
+def _feature_id(feature):
+    return zlib.crc32(feature.encode('utf-8')) & (DIM - 1)
+
+
+def features(text):
+    return Counter(_feature_id(f) for f in tokenize(expand(text)))
+
+
+def video_text(video):
+    return video['title']
+
+
+def exercise_texts(exercises):
+    return [
+        f"{title} {title} {body_part} {equipment} {desc.split('. ')[0]}"
+        for title, body_part, equipment, desc in zip(
+            exercises['Title'], exercises['BodyPart'], exercises['Equipment'], exercises['Desc'])
+    ]
+
+
+# 해싱한 특징 차원의 IDF (처음 색인할 때의 문서로 정하고, 이후 추가되는 동영상에도 같은 값을 쓴다)
+class Vectorizer:
+    def __init__(self, idf):
+        self.idf = idf
+
+    # documents: features() 결과 목록
+    @classmethod
+    def fit(cls, documents):
+        df = np.zeros(DIM, dtype=np.int64)
+        for counts in documents:
+            df[list(counts)] += 1
+        return cls((np.log((1 + len(documents)) / (1 + df)) + 1).astype(np.float32))
+
+    def transform(self, text):
+        return self.vector(features(text))
+
+    # 특징 개수 → 희소 벡터 (차원 번호 배열, 값 배열), L2 정규화
+    def vector(self, counts):
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        ids = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        values = (1 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))) * self.idf[ids]
+        return ids, values / np.linalg.norm(values)
+
+
+# 희소 벡터의 LSH 색인: 표마다 BITS 비트 서명 → 항목 위치 목록
+# 벡터는 CSR 배열(차원 번호/값을 이어 붙이고 항목별 시작 위치)로 들고 있어서 후보 점수를 한 번에 계산한다
+# 질의는 서명과 한 비트만 다른 칸까지 살펴보고(multi-probe), 후보가 k 보다 적으면 전체와 비교한다
+class VectorIndex:
+    def __init__(self):
+        self.keys = []
+        self.positions = {}
+        self.buckets = [{} for _ in range(TABLES)]
+        self._ids = np.zeros(1024, dtype=np.int64)
+        self._values = np.zeros(1024, dtype=np.float32)
+        self._offsets = np.zeros(1025, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def _signature(self, vector):
+        ids, values = vector
+        bits = (_SIGNS[:, ids] @ values > 0).reshape(TABLES, BITS)
+        return (bits @ _BIT_WEIGHTS).tolist()
+
+    def add(self, key, vector):
+        if key in self.positions:
+            return
+        ids, values = vector
+        position = len(self.keys)
+        start = self._offsets[position]
+        end = start + len(ids)
+        # 배열이 모자라면 두 배로 늘린다
+        if end > len(self._ids):
+            self._ids = np.resize(self._ids, max(end, 2 * len(self._ids)))
+            self._values = np.resize(self._values, len(self._ids))
+        if position + 2 > len(self._offsets):
+            self._offsets = np.resize(self._offsets, 2 * len(self._offsets))
+        self._ids[start:end] = ids
+        self._values[start:end] = values
+        self._offsets[position + 1] = end
+
+        self.keys.append(key)
+        self.positions[key] = position
+        if len(ids):
+            for table, signature in zip(self.buckets, self._signature(vector)):
+                table.setdefault(signature, []).append(position)
+
+    def vector(self, key):
+        position = self.positions[key]
+        start, end = self._offsets[position], self._offsets[position + 1]
+        return self._ids[start:end], self._values[start:end]
+
+    def _candidates(self, vector):
+        found = []
+        for table, signature in zip(self.buckets, self._signature(vector)):
+            for probe in [signature] + [signature ^ (1 << bit) for bit in range(BITS)]:
+                found.extend(table.get(probe, ()))
+        return np.unique(np.array(found, dtype=np.int64))
+
+    # positions 항목들과 vector 의 내적
+    def _scores(self, vector, positions):
+        ids, values = vector
+        dense = np.zeros(DIM, dtype=np.float32)
+        dense[ids] = values
+        starts = self._offsets[positions]
+        lengths = self._offsets[positions + 1] - starts
+        segment = np.repeat(np.arange(len(positions)), lengths)
+        flat = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return np.bincount(segment, weights=dense[self._ids[flat]] * self._values[flat], minlength=len(positions))
+
+    # [(키, 유사도)] 높은 순; exclude 의 키는 빼고, allow 가 있으면 그 키만
+    # exhaustive=True 면 LSH 없이 전체와 비교한다 (재현율 측정용)
+    def query(self, vector, k=10, exclude=(), allow=None, min_score=MIN_SCORE, exhaustive=False):
+        if not len(vector[0]) or not self.keys:
+            return []
+        allowed = None
+        if allow is not None:
+            allowed = np.array(sorted(self.positions[key] for key in allow if key in self.positions), dtype=np.int64)
+        positions = np.zeros(0, dtype=np.int64) if exhaustive else self._candidates(vector)
+        if allowed is not None:
+            positions = np.intersect1d(positions, allowed, assume_unique=True)
+        if len(positions) < k + len(exclude):
+            positions = np.arange(len(self.keys)) if allowed is None else allowed
+        if exclude:
+            positions = positions[~np.isin(positions, [self.positions[key] for key in exclude if key in self.positions])]
+
+        scores = self._scores(vector, positions)
+        keep = scores >= min_score
+        positions, scores = positions[keep], scores[keep]
+        if len(positions) > k:
+            top = np.argpartition(-scores, k)[:k]
+            positions, scores = positions[top], scores[top]
+        order = np.lexsort((positions, -scores))
+        return [(self.keys[positions[i]], float(scores[i])) for i in order]
+
+
+# 전체 동영상 + exercises.csv 색인
+class SimilarIndex:
+    def __init__(self, videos, exercises):
+        exercise_documents = [features(text) for text in exercise_texts(exercises)]
+        self.vectorizer = Vectorizer.fit([features(video_text(video)) for video in videos] + exercise_documents)
+        self.exercises = exercises
+        self.exercise_index = VectorIndex()
+        for label, counts in zip(exercises.index, exercise_documents):
+            self.exercise_index.add(label, self.vectorizer.vector(counts))
+        self.videos = {}
+        self.video_index = VectorIndex()
+        self.last_id = 0
+        self.add_videos(videos)
+
+    # videos: video_store.get_videos_since 형식 (id 포함), 이미 있는 video_id 는 건너뛴다
+    def add_videos(self, videos):
+        added = 0
+        for video in videos:
+            self.last_id = max(self.last_id, video.get('id', 0))
+            if video['video_id'] in self.video_index:
+                continue
+            self.videos[video['video_id']] = video
+            self.video_index.add(video['video_id'], self.vectorizer.transform(video_text(video)))
+            added += 1
+        return added
+
+    # 같은 사용자(user_id 가 없으면 전체)의 비슷한 동영상: [(동영상 dict, 유사도)]
+    def similar_videos(self, video_id, k=6, user_id=None):
+        if video_id not in self.video_index:
+            return []
+        allow = None
+        if user_id is not None:
+            allow = {vid for vid, video in self.videos.items() if video['user_id'] == user_id}
+        results = self.video_index.query(self.video_index.vector(video_id), k, exclude={video_id}, allow=allow)
+        return [(self.videos[key], score) for key, score in results]
+
+    # 동영상 제목과 가까운 exercises.csv 운동: [(exercises 인덱스, 유사도)]
+    def exercises_for_video(self, video_id, k=5):
+        if video_id not in self.video_index:
+            return []
+        return self.exercise_index.query(self.video_index.vector(video_id), k)
+
+    # 자유 텍스트 → 비슷한 운동
+    def exercises_for_text(self, text, k=5):
+        return self.exercise_index.query(self.vectorizer.transform(text), k)
+
+
+# (videos_db, exercises csv) → (csv 수정 시각, catalog_version, SimilarIndex)
+_indexes = {}
+_lock = threading.Lock()
+
+
+# 프로세스당 한 번 만들고, 동영상이 추가되어 catalog_version 이 바뀌면 새 동영상만 색인에 더한다
+def get_index(videos_db=video_store.DB_FILE, csv_file=exercise_catalog.CSV_FILE):
+    mtime = os.path.getmtime(csv_file)
+    version = video_store.catalog_version(videos_db)
+    with _lock:
+        entry = _indexes.get((videos_db, csv_file))
+        if entry is None or entry[0] != mtime:
+            index = SimilarIndex(video_store.get_videos_since(0, videos_db), exercise_catalog.load_exercises(csv_file))
+        else:
+            index = entry[2]
+            if entry[1] != version:
+                index.add_videos(video_store.get_videos_since(index.last_id, videos_db))
+        _indexes[(videos_db, csv_file)] = (mtime, version, index)
+    return index
+
+
+# 실제 제목을 조금씩 바꾼 합성 동영상으로 색인 생성 / 추가 / 질의 시간과 전체 비교 대비 재현율 측정
+def main(sizes=(1000, 10000, 50000), k=10, queries=200):
+    import random
+
+    exercises = exercise_catalog.load_exercises()
+    titles = [video['title'] for video in video_store.get_videos_since(0)] or list(TERMS)
+    rng = random.Random(SEED)
+
+    def variant(i):
+        words = rng.choice(titles).split()
+        words = rng.sample(words, max(1, len(words) - rng.randint(0, 3)))
+        return ' '.join(words + [rng.choice(list(TERMS)), f'#{i}'])
+
+    for size in sizes:
+        videos = [{'id': i + 1, 'user_id': 'bench', 'video_id': f'v{i}', 'title': variant(i)} for i in range(size)]
+        start = time.perf_counter()
+        index = SimilarIndex(videos[:-100], exercises)
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        index.add_videos(videos[-100:])
+        added = (time.perf_counter() - start) / 100
+
+        samples, exact_samples, recall = [], [], []
+        for video in rng.sample(videos, min(queries, size)):
+            vector = index.video_index.vector(video['video_id'])
+            started = time.perf_counter()
+            found = index.video_index.query(vector, k, exclude={video['video_id']})
+            samples.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            exact = index.video_index.query(vector, k, exclude={video['video_id']}, exhaustive=True)
+            exact_samples.append(time.perf_counter() - started)
+            if exact:
+                recall.append(len({key for key, _ in found} & {key for key, _ in exact}) / len(exact))
+        samples.sort()
+        exact_samples.sort()
+        print(f'{size:>7,} 동영상  생성 {built:.1f}s  추가 {added * 1000:.2f}ms/개  '
+              f'질의 p50 {samples[len(samples) // 2] * 1000:.2f}ms p95 {samples[len(samples) * 95 // 100] * 1000:.2f}ms  '
+              f'전체 비교 p50 {exact_samples[len(exact_samples) // 2] * 1000:.2f}ms  '
+              f'재현율@{k} {sum(recall) / max(1, len(recall)):.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
+from db import connect, transaction
+from image_store import ImageStore
+
+# 유튜브 썸네일 로컬 캐시 (작은 WebP 로 줄여서 내용 해시로 저장, 전체 크기 상한 + LRU 제거)
+THUMBNAIL_DIR = 'thumbnails'
+DB_FILE = 'thumbnails.db'
+WIDTH = 320
+MAX_BYTES = 200 * 1024 * 1024
+TIMEOUT = 10
+# 받지 못한 썸네일 (삭제된 동영상, 404 등) 은 이 시간 동안 다시 받지 않고 자리표시 이미지를 쓴다
+FAILURE_TTL = 10 * 60
+PLACEHOLDER_FILE = os.path.join(THUMBNAIL_DIR, 'placeholder.webp')
+THUMBNAIL_URL = 'https://img.youtube.com/vi/{video_id}/mqdefault.jpg'
+
+_store = ImageStore(root=THUMBNAIL_DIR, widths=(WIDTH,), keep_original=False)
+# 화면을 그리는 중에는 기다리지 않도록, 빠진 썸네일은 백그라운드에서 받는다
+_pool = ThreadPoolExecutor(max_workers=4)
+_in_flight = set()
+# video_id → 다시 받아 볼 수 있는 시각 (time.monotonic)
+_failed_until = {}
+
+
+def init_db(db_file=DB_FILE):
+    connect(db_file).executescript(
+        """
+        CREATE TABLE IF NOT EXISTS thumbnails (
+            video_id TEXT PRIMARY KEY,
+            digest TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            accessed REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_thumbnails_accessed ON thumbnails (accessed);
+        """
+    )
+
+
+def placeholder_path():
+    if not os.path.exists(PLACEHOLDER_FILE):
+        from PIL import Image
+
+        os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+        Image.new('RGB', (WIDTH, WIDTH * 9 // 16), (240, 248, 255)).save(PLACEHOLDER_FILE, format='WEBP')
+    return PLACEHOLDER_FILE
+
+
+# 썸네일 한 개를 내려받아 저장 (이미 있으면 건너뜀)
+def fetch_thumbnail(video_id, db_file=DB_FILE, max_bytes=MAX_BYTES):
+    conn = connect(db_file)
+    row = conn.execute("SELECT digest FROM thumbnails WHERE video_id = ?", (video_id,)).fetchone()
+    if row and _store.exists(row['digest'], WIDTH):
+        return row['digest']
+
+    import requests
+
+    response = requests.get(THUMBNAIL_URL.format(video_id=video_id), timeout=TIMEOUT)
+    response.raise_for_status()
+    digest = _store.put(response.content)
+    with transaction(conn):
+        conn.execute(
+            "INSERT OR REPLACE INTO thumbnails (video_id, digest, size, accessed) VALUES (?, ?, ?, ?)",
+            (video_id, digest, _store.size(digest), time.time()),
+        )
+        _evict(conn, max_bytes)
+    return digest
+
+
+def _fetch_quietly(video_id):
+    try:
+        fetch_thumbnail(video_id)
+        _failed_until.pop(video_id, None)
+    except Exception as e:
+        _failed_until[video_id] = time.monotonic() + FAILURE_TTL
+        instrumentation.inc('thumbnail_fetch_failures_total', error=type(e).__name__)
+    finally:
+        _in_flight.discard(video_id)
+
+
+# 동영상 저장 시 썸네일을 미리 받아둔다 (백그라운드, 최근에 받지 못한 썸네일은 FAILURE_TTL 이 지난 뒤에 다시 받는다)
+def prefetch(video_ids):
+    now = time.monotonic()
+    for video_id in video_ids:
+        if video_id not in _in_flight and _failed_until.get(video_id, 0) <= now:
+            _failed_until.pop(video_id, None)
+            _in_flight.add(video_id)
+            _pool.submit(_fetch_quietly, video_id)
+
+
+# video_id 목록 → {video_id: 로컬 파일 경로}; 없는 썸네일은 자리표시 이미지로 두고 백그라운드에서 받는다
+def thumbnail_paths(video_ids, db_file=DB_FILE):
+    conn = connect(db_file)
+    video_ids = list(dict.fromkeys(video_ids))
+    found = {}
+    for i in range(0, len(video_ids), 500):
+        chunk = video_ids[i:i + 500]
+        placeholders = ','.join('?' * len(chunk))
+        for row in conn.execute(f"SELECT video_id, digest FROM thumbnails WHERE video_id IN ({placeholders})", chunk):
+            if _store.exists(row['digest'], WIDTH):
+                found[row['video_id']] = _store.path(row['digest'], WIDTH)
+
+    if found:
+        now = time.time()
+        conn.executemany("UPDATE thumbnails SET accessed = ? WHERE video_id = ?", [(now, v) for v in found])
+
+    missing = [video_id for video_id in video_ids if video_id not in found]
+    if missing:
+        prefetch(missing)
+        placeholder = placeholder_path()
+        found.update((video_id, placeholder) for video_id in missing)
+    return found
+
+
+# 전체 크기가 max_bytes 를 넘으면 가장 오래 안 본 썸네일부터 지운다
+def _evict(conn, max_bytes):
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM thumbnails").fetchone()[0]
+    if total <= max_bytes:
+        return
+    for row in conn.execute("SELECT video_id, digest, size FROM thumbnails ORDER BY accessed").fetchall():
+        if total <= max_bytes:
+            break
+        conn.execute("DELETE FROM thumbnails WHERE video_id = ?", (row['video_id'],))
+        # 같은 이미지를 쓰는 다른 동영상이 없을 때만 파일을 지운다
+        if not conn.execute("SELECT 1 FROM thumbnails WHERE digest = ?", (row['digest'],)).fetchone():
+            _store.remove(row['digest'])
+        total -= row['size']
@@ -0,0 +1,86 @@
+import csv
+import os
+
+import instrumentation
+from db import connect, transaction
+
+# 회원 정보 저장소 (SQLite, user_id 기본키)
+DB_FILE = "users.db"
+LEGACY_CSV_FILE = "users.csv"
+FIELDS = ['user_id', 'password', 'name', 'age', 'gender', 'height', 'weight']
+PROFILE_FIELDS = ['name', 'gender', 'age', 'height', 'weight']
+
+
+def init_db(db_file=DB_FILE, csv_file=LEGACY_CSV_FILE):
+    conn = connect(db_file)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS users ("
+        "user_id TEXT PRIMARY KEY, password TEXT NOT NULL, name TEXT NOT NULL, "
+        "age TEXT DEFAULT 'null', gender TEXT, height TEXT DEFAULT 'null', weight TEXT DEFAULT 'null')"
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    # 기존 users.csv 는 최초 한 번만 가져온다
+    row = conn.execute("SELECT value FROM meta WHERE key = 'users_csv_imported'").fetchone()
+    if row is None and os.path.exists(csv_file):
+        import_users_csv(csv_file, db_file)
+
+
+# users.csv(user_id,password,name,age,gender,height,weight) 를 DB로 옮기는 함수
+def import_users_csv(csv_file=LEGACY_CSV_FILE, db_file=DB_FILE):
+    conn = connect(db_file)
+    with instrumentation.span('file_read_seconds', file=os.path.basename(csv_file)), \
+            open(csv_file, mode='r', newline='', encoding='utf-8') as f:
+        rows = [tuple(row.get(field) or 'null' for field in FIELDS) for row in csv.DictReader(f)]
+
+    with transaction(conn):
+        cur = conn.executemany(
+            "INSERT OR IGNORE INTO users (user_id, password, name, age, gender, height, weight) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('users_csv_imported', ?)", (csv_file,))
+    return cur.rowcount
+
+
+def get_user(user_id, db_file=DB_FILE):
+    row = connect(db_file).execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    return dict(row) if row else None
+
+
+# 전체 회원의 프로필 {user_id: {'name', 'gender', 'age', 'height', 'weight'}} (비밀번호 제외)
+def get_profiles(db_file=DB_FILE):
+    return {row['user_id']: dict(row) for row in connect(db_file).execute(
+        f"SELECT user_id, {', '.join(PROFILE_FIELDS)} FROM users ORDER BY user_id"
+    )}
+
+
+# 로그인 확인: 일치하면 사용자 정보, 아니면 None
+def check_login(user_id, password, db_file=DB_FILE):
+    user = get_user(user_id, db_file)
+    if user and user['password'] == password:
+        return user
+    return None
+
+
+# 새 사용자 추가: 이미 존재하는 ID면 False
+def add_user(user_id, password, name, gender, db_file=DB_FILE):
+    cur = connect(db_file).execute(
+        "INSERT OR IGNORE INTO users (user_id, password, name, age, gender, height, weight) "
+        "VALUES (?, ?, ?, 'null', ?, 'null', 'null')",
+        (user_id, password, name, gender),
+    )
+    return cur.rowcount == 1
+
+
+# 한 사용자의 프로필만 갱신 (파일 전체를 다시 쓰지 않음)
+def update_user(user_id, db_file=DB_FILE, **fields):
+    fields = {k: v for k, v in fields.items() if k in PROFILE_FIELDS}
+    if not fields:
+        return False
+    assignments = ", ".join(f"{k} = ?" for k in fields)
+    cur = connect(db_file).execute(
+        f"UPDATE users SET {assignments} WHERE user_id = ?",
+        (*fields.values(), user_id),
+    )
+    return cur.rowcount == 1
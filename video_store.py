@@ -0,0 +1,192 @@
+import csv
+import os
+
+import instrumentation
+from db import connect, transaction
+
+# 동영상 카탈로그 저장소 (SQLite)
+DB_FILE = 'videos.db'
+LEGACY_CSV_FILE = 'videos1.csv'
+FIELDS = ['user_id', 'video_id', 'title', 'url', 'length', 'author', 'channel_url', 'views', 'category']
+
+# SQLite 바인딩 변수 개수 제한보다 작게 나눠서 IN 조회
+_IN_CHUNK = 500
+
+
+def init_db(db_file=DB_FILE, csv_file=LEGACY_CSV_FILE):
+    conn = connect(db_file)
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS videos (
+            id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            video_id TEXT NOT NULL UNIQUE,
+            title TEXT,
+            url TEXT,
+            length INTEGER,
+            author TEXT,
+            channel_url TEXT,
+            views INTEGER,
+            category TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_videos_user ON videos (user_id);
+        CREATE TABLE IF NOT EXISTS video_categories (
+            video_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            PRIMARY KEY (category, video_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_video_categories_video ON video_categories (video_id);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """
+    )
+
+    # 기존 videos1.csv 는 최초 한 번만 가져온다
+    row = conn.execute("SELECT value FROM meta WHERE key = 'videos_csv_imported'").fetchone()
+    if row is None and os.path.exists(csv_file):
+        import_videos_csv(csv_file, db_file)
+
+
+# videos1.csv 를 DB로 옮기는 함수
+def import_videos_csv(csv_file=LEGACY_CSV_FILE, db_file=DB_FILE):
+    with instrumentation.span('file_read_seconds', file=os.path.basename(csv_file)), \
+            open(csv_file, 'r', newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    conn = connect(db_file)
+    with transaction(conn):
+        imported = _insert_rows(conn, rows)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('videos_csv_imported', ?)", (csv_file,))
+    return imported
+
+
+# 'a, b,c' → ['a', 'b', 'c'] (앞뒤 공백과 중복 공백을 정리해서 같은 카테고리가 하나의 키가 되도록)
+def split_categories(category):
+    categories = []
+    for c in (category or '').split(','):
+        c = ' '.join(c.split())
+        if c and c not in categories:
+            categories.append(c)
+    return categories
+
+
+# 동영상이 추가될 때마다 올라가는 번호 (카탈로그로 만든 캐시가 최신인지 확인용)
+def catalog_version(db_file=DB_FILE):
+    row = connect(db_file).execute("SELECT value FROM meta WHERE key = 'catalog_version'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def _insert_rows(conn, rows):
+    inserted = 0
+    for row in rows:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO videos (user_id, video_id, title, url, length, author, channel_url, views, category) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            tuple(row.get(field) for field in FIELDS),
+        )
+        if cur.rowcount == 1:
+            inserted += 1
+            conn.executemany(
+                "INSERT OR IGNORE INTO video_categories (video_id, category) VALUES (?, ?)",
+                [(row['video_id'], c) for c in split_categories(row.get('category'))],
+            )
+    if inserted:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('catalog_version', 1) "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+    return inserted
+
+
+# 여러 동영상을 하나의 트랜잭션으로 저장 (이미 있는 video_id 는 건너뜀)
+def insert_videos(rows, db_file=DB_FILE):
+    if not rows:
+        return 0
+    conn = connect(db_file)
+    with transaction(conn):
+        return _insert_rows(conn, rows)
+
+
+# 호출한 쪽이 연 트랜잭션 안에서 저장 (ingest_jobs 가 동영상과 진행 기록을 한 번에 커밋할 때)
+def insert_videos_in(conn, rows):
+    return _insert_rows(conn, rows)
+
+
+# 주어진 video_id 중 이미 저장된 것들의 집합 (재생목록 전체를 한 번에 확인)
+def existing_video_ids(video_ids, db_file=DB_FILE):
+    video_ids = list(dict.fromkeys(video_ids))
+    conn = connect(db_file)
+    found = set()
+    for i in range(0, len(video_ids), _IN_CHUNK):
+        chunk = video_ids[i:i + _IN_CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        found.update(
+            row[0] for row in conn.execute(f"SELECT video_id FROM videos WHERE video_id IN ({placeholders})", chunk)
+        )
+    return found
+
+
+def get_videos_by_user(user_id, db_file=DB_FILE):
+    videos = []
+    with instrumentation.span('db_query_seconds', query='get_videos_by_user'):
+        for row in connect(db_file).execute(
+            "SELECT user_id, video_id, title, url, length, author, channel_url, views, category "
+            "FROM videos WHERE user_id = ? ORDER BY id",
+            (user_id,),
+        ):
+            video = dict(row)
+            video['categories'] = split_categories(video['category'])
+            videos.append(video)
+    return videos
+
+
+# 동영상을 저장한 사용자 ID 목록 (정렬)
+def get_user_ids(db_file=DB_FILE):
+    return [row[0] for row in connect(db_file).execute("SELECT DISTINCT user_id FROM videos ORDER BY user_id")]
+
+
+# videos.id 가 last_id 보다 큰 동영상 (전체 사용자, 저장 순서) — 색인을 새 동영상만큼만 갱신할 때
+def get_videos_since(last_id, db_file=DB_FILE):
+    videos = []
+    with instrumentation.span('db_query_seconds', query='get_videos_since'):
+        for row in connect(db_file).execute(
+            "SELECT id, user_id, video_id, title, url, length, author, channel_url, views, category "
+            "FROM videos WHERE id > ? ORDER BY id",
+            (last_id,),
+        ):
+            video = dict(row)
+            video['categories'] = split_categories(video['category'])
+            videos.append(video)
+    return videos
+
+
+# DataFrame 이 필요한 곳(운동 계획)에서만 pandas 를 불러온다
+def load_videos(user_id, db_file=DB_FILE):
+    import pandas as pd
+
+    with instrumentation.span('db_query_seconds', query='load_videos'):
+        videos = pd.read_sql_query(
+            "SELECT user_id, video_id, title, url, length, author, channel_url, views, category "
+            "FROM videos WHERE user_id = ? ORDER BY id",
+            connect(db_file),
+            params=(user_id,),
+        )
+    videos['categories'] = videos['category'].apply(split_categories)
+    return videos
+
+
+# 이미 분류된 모든 동영상의 (제목, 카테고리) 목록 (로컬 분류기 학습용)
+def get_labelled_rows(db_file=DB_FILE):
+    return [(row['title'], row['category']) for row in connect(db_file).execute(
+        "SELECT title, category FROM videos WHERE category IS NOT NULL AND category != ''"
+    )]
+
+
+# 카테고리별 동영상 조회 (video_categories 인덱스 사용)
+def get_video_ids_by_category(category, user_id=None, db_file=DB_FILE):
+    query = "SELECT vc.video_id FROM video_categories vc"
+    params = [category.strip()]
+    if user_id is not None:
+        query += " JOIN videos v ON v.video_id = vc.video_id WHERE vc.category = ? AND v.user_id = ?"
+        params.append(user_id)
+    else:
+        query += " WHERE vc.category = ?"
+    return [row[0] for row in connect(db_file).execute(query, params)]